@@ -0,0 +1,609 @@
+"""
+ที่เก็บข้อมูลนักศึกษาและการเช็คชื่อแบบ SQLite (WAL) ใช้ร่วมกันระหว่างโปรแกรมกล้องและ web app
+
+- students / classes / enrollments : รายชื่อนักศึกษาและชั้นเรียน
+- face_embeddings                   : embedding ของรูปลงทะเบียน (คำนวณตอนนำเข้ารูป ระบุโมเดลและ hash ของรูปที่ใช้)
+- photos                            : hash ของรูปลงทะเบียนที่อัพโหลดแล้ว (ข้ามการอัพโหลดรูปเดิมซ้ำ)
+- attendance_events                 : เหตุการณ์เช็คชื่อ (หนึ่งแถวต่อการเช็คชื่อหนึ่งครั้ง)
+- meta                              : ตัวนับเวอร์ชันของข้อมูล (roster_version, attendance_version, attendance_epoch)
+
+WAL ทำให้อ่านพร้อมกับการเขียนได้ การเขียนจาก process อื่นจะรอกันด้วย busy_timeout แทนการเขียนทับไฟล์
+การย้ายข้อมูลเดิม: python attendance_store.py --import [--csv students.csv]
+"""
+import argparse
+import csv
+import datetime
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS classes (
+    class_id TEXT PRIMARY KEY,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS students (
+    student_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_students_name ON students(name);
+CREATE TABLE IF NOT EXISTS enrollments (
+    student_id TEXT NOT NULL REFERENCES students(student_id) ON DELETE CASCADE,
+    class_id TEXT NOT NULL REFERENCES classes(class_id),
+    PRIMARY KEY (student_id, class_id)
+);
+CREATE INDEX IF NOT EXISTS idx_enrollments_class ON enrollments(class_id, student_id);
+CREATE TABLE IF NOT EXISTS face_embeddings (
+    student_id TEXT PRIMARY KEY REFERENCES students(student_id) ON DELETE CASCADE,
+    model TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    photo_sha256 TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS photos (
+    student_id TEXT PRIMARY KEY REFERENCES students(student_id) ON DELETE CASCADE,
+    sha256 TEXT NOT NULL,
+    s3_key TEXT,
+    size INTEGER,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attendance_events (
+    event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    source TEXT,
+    UNIQUE (student_id, ts)
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance_events(date, student_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# ดัชนีค้นหารหัส/ชื่อนักศึกษาด้วยข้อความบางส่วน (FTS5 แบบ trigram ใช้ได้กับชื่อภาษาไทยที่ไม่มีการเว้นวรรคระหว่างคำ)
+# ข้อมูลตรงกับตาราง students เสมอผ่าน trigger
+SEARCH_SCHEMA = [
+    "CREATE VIRTUAL TABLE students_search USING fts5(student_id, name, tokenize='trigram')",
+    "CREATE TRIGGER students_search_insert AFTER INSERT ON students BEGIN "
+    "INSERT INTO students_search (student_id, name) VALUES (new.student_id, new.name); END",
+    "CREATE TRIGGER students_search_delete AFTER DELETE ON students BEGIN "
+    "DELETE FROM students_search WHERE student_id = old.student_id; END",
+    "CREATE TRIGGER students_search_update AFTER UPDATE OF name ON students WHEN old.name IS NOT new.name BEGIN "
+    "UPDATE students_search SET name = new.name WHERE student_id = old.student_id; END",
+    "INSERT INTO students_search (student_id, name) SELECT student_id, name FROM students",
+]
+SEARCH_MIN_LENGTH = 3  # trigram ค้นหาข้อความที่สั้นกว่า 3 ตัวอักษรไม่ได้
+
+# รายชื่อตัวอย่างเมื่อยังไม่มีข้อมูลนักศึกษาเลย
+SAMPLE_STUDENTS = [
+    {"id": "student_378", "name": "นายสมศรี มีใจ", "class": "10301203"},
+    {"id": "student_002", "name": "นางสาวอัศนีย์ ผิวดี", "class": "10301203"},
+    {"id": "student_402", "name": "นายใจดี มีไหม", "class": "10301203"},
+]
+
+
+def load_legacy_attendance(data_dir, date):
+    """
+    การเช็คชื่อของวันที่ date จากไฟล์รูปแบบเดิม {student_id: timestamp}
+
+    - attendance_YYYYMMDD.json  : snapshot {student_id: timestamp}
+    - attendance_YYYYMMDD.jsonl : journal ที่ต่อท้ายหลัง snapshot ({"id", "ts"} หรือ {"op": "reset"})
+
+    บรรทัดสุดท้ายของ journal ที่เขียนไม่เสร็จ (โปรแกรมหยุดกลางการเขียน) จะถูกข้าม
+    """
+    data_dir = Path(data_dir)
+    records = {}
+    snapshot_file = data_dir / f'attendance_{date}.json'
+    if snapshot_file.exists():
+        try:
+            with open(snapshot_file, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        except Exception as e:
+            logger.error(f"ไม่สามารถอ่าน snapshot การเช็คชื่อ {snapshot_file}: {e}")
+
+    journal_file = data_dir / f'attendance_{date}.jsonl'
+    if journal_file.exists():
+        with open(journal_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if entry.get('op') == 'reset':
+                    records.clear()
+                elif 'id' in entry:
+                    records[entry['id']] = entry['ts']
+    return records
+
+
+def attendance_date(timestamp):
+    """วันที่ (YYYYMMDD ตามเวลาเครื่อง) ของ timestamp ใช้แบ่งข้อมูลการเช็คชื่อรายวันเหมือนไฟล์เดิม"""
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y%m%d")
+
+
+class AttendanceStore:
+    """
+    ที่เก็บข้อมูลแบบ SQLite ใช้ได้จากหลาย thread (แต่ละ thread มี connection ของตัวเอง) และหลาย process
+
+    student ถูกคืนค่าในรูปแบบเดิม {'id', 'name', 'class'} เพื่อให้ template และโค้ดเดิมใช้ต่อได้
+    """
+
+    def __init__(self, db_file, busy_timeout=5.0):
+        self.db_file = Path(db_file)
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.search_index = self._create_search_index()
+
+    def _migrate(self):
+        """เพิ่มคอลัมน์ที่ฐานข้อมูลจากรุ่นก่อนยังไม่มี"""
+        with self.transaction() as conn:
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(face_embeddings)")}
+            if 'photo_sha256' not in columns:
+                # embedding เดิมไม่รู้ว่ามาจากรูปไหน (NULL) จะถูกคำนวณใหม่จากรูปลงทะเบียนครั้งเดียว
+                conn.execute("ALTER TABLE face_embeddings ADD COLUMN photo_sha256 TEXT")
+
+    def _create_search_index(self):
+        """สร้างตารางค้นหา FTS5 (ครั้งแรกเท่านั้น) คืนค่า False ถ้า SQLite ที่ใช้ไม่รองรับ trigram"""
+        try:
+            with self.transaction() as conn:
+                if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'students_search'").fetchone() is None:
+                    for statement in SEARCH_SCHEMA:
+                        conn.execute(statement)
+            return True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite ไม่รองรับ FTS5 trigram ค้นหารหัส/ชื่อได้เฉพาะแบบขึ้นต้นด้วย: {e}")
+            return False
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: จัดการ transaction เองด้วย BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """transaction สำหรับเขียน (จอง write lock ตั้งแต่ต้นเพื่อไม่ให้ชนกับ process อื่นกลางทาง)"""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @contextmanager
+    def read_transaction(self):
+        """อ่านหลายคำสั่งจาก snapshot เดียวกันของฐานข้อมูล (การเขียนจาก process อื่นระหว่างนั้นจะไม่ปรากฏ)"""
+        conn = self.conn
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+    def release(self):
+        """ปิด connection ของ thread ปัจจุบัน (เช่นเมื่อจบ request ของ web app ที่ใช้ thread ใหม่ทุกครั้ง)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            with self._lock:
+                if conn in self._connections:
+                    self._connections.remove(conn)
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    pass  # connection ของ thread อื่นที่จบไปแล้ว
+            self._connections = []
+        self._local = threading.local()
+
+    # ---------- meta ----------
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def _set_meta(self, conn, key, value):
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) "
+                     "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, str(value)))
+
+    def _bump_version(self, conn, name):
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, '1') "
+                     "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1", (name,))
+
+    def version(self, name):
+        """
+        เวอร์ชันของข้อมูล เพิ่มขึ้นทุกครั้งที่มีการเขียน: 'roster_version', 'attendance_version'
+        และ 'attendance_epoch' (เพิ่มเมื่อล้างข้อมูลการเช็คชื่อ)
+        """
+        return int(self.get_meta(name, 0))
+
+    # ---------- รายชื่อนักศึกษา ----------
+
+    def _upsert(self, conn, students):
+        now = time.time()
+        count = 0
+        for student in students:
+            student_id = student['id'].strip()
+            if not student_id:
+                continue
+            class_id = (student.get('class') or '').strip()
+            conn.execute("INSERT INTO students (student_id, name, updated_at) VALUES (?, ?, ?) "
+                         "ON CONFLICT(student_id) DO UPDATE SET name = excluded.name, updated_at = excluded.updated_at",
+                         (student_id, student.get('name', ''), now))
+            if class_id:
+                conn.execute("INSERT OR IGNORE INTO classes (class_id, name) VALUES (?, ?)", (class_id, class_id))
+                conn.execute("INSERT OR IGNORE INTO enrollments (student_id, class_id) VALUES (?, ?)", (student_id, class_id))
+            count += 1
+        return count
+
+    def upsert_students(self, students):
+        """เพิ่มหรือแก้ไขนักศึกษาหลายคนใน transaction เดียว คืนค่าจำนวนที่บันทึก"""
+        with self.transaction() as conn:
+            count = self._upsert(conn, students)
+            if count:
+                self._bump_version(conn, 'roster_version')
+        return count
+
+    def add_student(self, student_id, name, class_id):
+        return self.upsert_students([{'id': student_id, 'name': name, 'class': class_id}]) == 1
+
+    def replace_students(self, students):
+        """แทนที่รายชื่อทั้งหมดด้วย students (ใช้ตอนนำเข้าจาก CSV ที่แก้ไขเอง)"""
+        students = list(students)
+        with self.transaction() as conn:
+            keep = {student['id'].strip() for student in students}
+            existing = [row['student_id'] for row in conn.execute("SELECT student_id FROM students")]
+            removed = [student_id for student_id in existing if student_id not in keep]
+            conn.executemany("DELETE FROM students WHERE student_id = ?", [(student_id,) for student_id in removed])
+            conn.execute("DELETE FROM enrollments")
+            count = self._upsert(conn, students)
+            self._bump_version(conn, 'roster_version')
+        return count
+
+    def delete_student(self, student_id):
+        """ลบนักศึกษา (ประวัติการเช็คชื่อยังเก็บไว้) คืนค่า False ถ้าไม่พบ"""
+        with self.transaction() as conn:
+            deleted = conn.execute("DELETE FROM students WHERE student_id = ?", (student_id,)).rowcount
+            if deleted:
+                self._bump_version(conn, 'roster_version')
+        return deleted > 0
+
+    def get_student(self, student_id):
+        row = self.conn.execute(
+            "SELECT s.student_id AS id, s.name AS name, MIN(e.class_id) AS class "
+            "FROM students s LEFT JOIN enrollments e ON e.student_id = s.student_id "
+            "WHERE s.student_id = ? GROUP BY s.student_id", (student_id,)).fetchone()
+        return self._student_dict(row) if row else None
+
+    @staticmethod
+    def _student_dict(row):
+        return {'id': row['id'], 'name': row['name'], 'class': row['class'] or ''}
+
+    def list_students(self, class_id=None):
+        """รายชื่อนักศึกษา (เรียงตามรหัส) กรองตามชั้นเรียนได้"""
+        if class_id:
+            rows = self.conn.execute(
+                "SELECT s.student_id AS id, s.name AS name, e.class_id AS class "
+                "FROM enrollments e JOIN students s ON s.student_id = e.student_id "
+                "WHERE e.class_id = ? ORDER BY s.student_id", (class_id,))
+        else:
+            rows = self.conn.execute(
+                "SELECT s.student_id AS id, s.name AS name, MIN(e.class_id) AS class "
+                "FROM students s LEFT JOIN enrollments e ON e.student_id = s.student_id "
+                "GROUP BY s.student_id ORDER BY s.student_id")
+        return [self._student_dict(row) for row in rows]
+
+    def query_students(self, class_id=None, status=None, search=None, date=None, page=1, per_page=50):
+        """
+        รายชื่อนักศึกษาทีละหน้าพร้อมเวลาเช็คชื่อของวันที่กำหนด คืนค่า (students, จำนวนทั้งหมดที่ตรงเงื่อนไข)
+
+        - class_id : กรองตามชั้นเรียน (ใช้ index ของ enrollments)
+        - status   : 'checked' หรือ 'unchecked'
+        - search   : บางส่วนของรหัสหรือชื่อ (ผ่านดัชนี FTS5 trigram) ถ้าสั้นกว่า SEARCH_MIN_LENGTH ตัวอักษร
+                     หรือไม่มีดัชนี FTS5 จะค้นหาแบบขึ้นต้นด้วยผ่าน index ของรหัสและชื่อแทน
+        """
+        date = date or attendance_date(time.time())
+        joins = ["LEFT JOIN (SELECT student_id, MAX(ts) AS ts FROM attendance_events WHERE date = ? "
+                 "GROUP BY student_id) a ON a.student_id = s.student_id"]
+        params = [date]
+        if class_id:
+            joins.append("JOIN enrollments e ON e.student_id = s.student_id AND e.class_id = ?")
+            params.append(class_id)
+            class_column = "e.class_id"
+        else:
+            joins.append("LEFT JOIN enrollments e ON e.student_id = s.student_id")
+            class_column = "MIN(e.class_id)"
+
+        conditions = []
+        if status == 'checked':
+            conditions.append("a.ts IS NOT NULL")
+        elif status == 'unchecked':
+            conditions.append("a.ts IS NULL")
+        search = (search or '').strip()
+        if search and self.search_index and len(search) >= SEARCH_MIN_LENGTH:
+            conditions.append("s.student_id IN (SELECT student_id FROM students_search WHERE students_search MATCH ?)")
+            params.append('"' + search.replace('"', '""') + '"')
+        elif search:
+            # ช่วงของ index ที่ขึ้นต้นด้วย search ('\uffff' มากกว่าตัวอักษรทุกตัวที่ใช้ในรหัสและชื่อ)
+            conditions.append("((s.student_id >= ? AND s.student_id < ?) OR (s.name >= ? AND s.name < ?))")
+            params += [search, search + '\uffff'] * 2
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        base = f"FROM students s {' '.join(joins)} {where} GROUP BY s.student_id"
+        total = self.conn.execute(f"SELECT COUNT(*) FROM (SELECT s.student_id {base})", params).fetchone()[0]
+        page = max(1, int(page))
+        per_page = max(1, int(per_page))
+        rows = self.conn.execute(
+            f"SELECT s.student_id AS id, s.name AS name, {class_column} AS class, a.ts AS ts {base} "
+            "ORDER BY s.student_id LIMIT ? OFFSET ?", params + [per_page, (page - 1) * per_page])
+        students = []
+        for row in rows:
+            student = self._student_dict(row)
+            student['checked_in_at'] = row['ts']
+            students.append(student)
+        return students, total
+
+    def attendance_summary(self, class_id=None, date=None):
+        """จำนวนนักศึกษาทั้งหมดและที่เช็คชื่อแล้วในวันที่กำหนด (กรองตามชั้นเรียนได้)"""
+        date = date or attendance_date(time.time())
+        checked = ("SELECT COUNT(DISTINCT student_id) FROM attendance_events WHERE date = ? "
+                   "AND student_id IN (SELECT student_id FROM {})")
+        if class_id:
+            total = self.conn.execute("SELECT COUNT(*) FROM enrollments WHERE class_id = ?", (class_id,)).fetchone()[0]
+            source = "enrollments WHERE class_id = ?"
+            checked_count = self.conn.execute(checked.format(source), (date, class_id)).fetchone()[0]
+        else:
+            total = self.count_students()
+            checked_count = self.conn.execute(checked.format("students"), (date,)).fetchone()[0]
+        return {'total': total, 'checked': checked_count, 'unchecked': total - checked_count}
+
+    def student_ids(self):
+        return [row[0] for row in self.conn.execute("SELECT student_id FROM students ORDER BY student_id")]
+
+    def count_students(self):
+        return self.conn.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+
+    def list_classes(self):
+        return [row[0] for row in self.conn.execute("SELECT class_id FROM classes ORDER BY class_id")]
+
+    def enroll(self, students, embeddings=None, model=None, photos=None):
+        """
+        เพิ่ม/แก้ไขนักศึกษาพร้อม embedding ของรูปลงทะเบียนใน transaction เดียว คืนค่าจำนวนนักศึกษาที่บันทึก
+
+        embeddings เป็น {student_id: bytes ของเวกเตอร์ float32} ที่คำนวณด้วยโมเดลชื่อ model
+        photos เป็น {student_id: {'sha256', 'key', 'size'}} ของรูปที่อัพโหลด (embedding ถูกบันทึกคู่กับ sha256 ของรูปนี้)
+        """
+        embeddings = embeddings or {}
+        photos = photos or {}
+        now = time.time()
+        with self.transaction() as conn:
+            count = self._upsert(conn, students)
+            conn.executemany(
+                "INSERT INTO face_embeddings (student_id, model, vector, photo_sha256, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(student_id) DO UPDATE SET model = excluded.model, vector = excluded.vector, "
+                "photo_sha256 = excluded.photo_sha256, updated_at = excluded.updated_at",
+                [(student_id, model, vector, photos.get(student_id, {}).get('sha256'), now)
+                 for student_id, vector in embeddings.items()])
+            conn.executemany(
+                "INSERT INTO photos (student_id, sha256, s3_key, size, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(student_id) DO UPDATE SET sha256 = excluded.sha256, s3_key = excluded.s3_key, "
+                "size = excluded.size, updated_at = excluded.updated_at",
+                [(student_id, photo['sha256'], photo.get('key'), photo.get('size'), now)
+                 for student_id, photo in photos.items()])
+            if count or embeddings or photos:
+                self._bump_version(conn, 'roster_version')
+        return count
+
+    def load_embeddings(self, model, versions=None):
+        """
+        embedding ที่บันทึกไว้ของโมเดล model คืนค่า {student_id: bytes}
+
+        versions เป็น {student_id: sha256 ของรูปลงทะเบียน} (AttendanceStore.enrollment_versions) คืนค่าเฉพาะนักศึกษา
+        ใน versions ที่ embedding คำนวณจากรูปนั้นพอดี embedding ของรูปเก่าหรือที่ไม่รู้ว่ามาจากรูปไหนจะไม่ถูกคืน
+        """
+        if versions is None:
+            rows = self.conn.execute("SELECT student_id, vector FROM face_embeddings WHERE model = ?", (model,))
+            return {student_id: vector for student_id, vector in rows}
+        student_ids = [student_id for student_id, version in versions.items() if version]
+        embeddings = {}
+        # แบ่งเป็นชุดเพื่อไม่ให้เกินจำนวนพารามิเตอร์สูงสุดของ SQLite
+        for start in range(0, len(student_ids), 500):
+            chunk = student_ids[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT student_id, vector, photo_sha256 FROM face_embeddings WHERE model = ? "
+                f"AND student_id IN ({', '.join('?' * len(chunk))})", [model] + chunk)
+            embeddings.update({student_id: vector for student_id, vector, photo_sha256 in rows
+                               if photo_sha256 == versions[student_id]})
+        return embeddings
+
+    def photo_hashes(self, student_ids=None):
+        """
+        sha256 ของรูปลงทะเบียนล่าสุดที่อัพโหลดขึ้น S3 สำเร็จแล้ว {student_id: sha256}
+
+        รูปที่บันทึกไว้โดยไม่ได้อัพโหลด (ไม่ได้เชื่อมต่อ AWS หรือ --no-upload) ไม่นับ
+        การนำเข้ารูปเดิมซ้ำครั้งถัดไปจึงยังอัพโหลดรูปนั้น
+        """
+        rows = self.conn.execute("SELECT student_id, sha256 FROM photos WHERE s3_key IS NOT NULL")
+        hashes = {student_id: sha256 for student_id, sha256 in rows}
+        if student_ids is None:
+            return hashes
+        return {student_id: hashes[student_id] for student_id in student_ids if student_id in hashes}
+
+    def enrollment_versions(self):
+        """
+        เวอร์ชันของรูปลงทะเบียนของนักศึกษาทุกคน {student_id: sha256 ของรูปล่าสุด หรือ None ถ้ายังไม่มีรูป}
+        เรียงตามรหัส ใช้ตรวจว่านักศึกษาคนใดลงทะเบียนรูปใหม่และต้องแทนที่ใบหน้าใน matcher
+        """
+        rows = self.conn.execute(
+            "SELECT s.student_id, p.sha256 FROM students s LEFT JOIN photos p ON p.student_id = s.student_id "
+            "ORDER BY s.student_id")
+        return {student_id: sha256 for student_id, sha256 in rows}
+
+    def seed_sample_students(self):
+        """ใส่รายชื่อตัวอย่างถ้ายังไม่มีนักศึกษาเลย"""
+        if self.count_students() == 0:
+            self.upsert_students(SAMPLE_STUDENTS)
+            logger.info("สร้างข้อมูลนักศึกษาตัวอย่างสำเร็จ")
+
+    # ---------- การเช็คชื่อ ----------
+
+    def record_check_in(self, student_id, timestamp, source=None):
+        """บันทึกการเช็คชื่อหนึ่งครั้ง คืนค่า event_id (None ถ้ามีรายการเดียวกันอยู่แล้ว)"""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO attendance_events (student_id, ts, date, source) VALUES (?, ?, ?, ?)",
+                (student_id, int(timestamp), attendance_date(timestamp), source))
+            if not cursor.rowcount:
+                return None
+            self._bump_version(conn, 'attendance_version')
+            return cursor.lastrowid
+
+    def last_check_in(self, student_id, date=None):
+        """เวลาเช็คชื่อล่าสุดของนักศึกษาในวันที่กำหนด (ค่าเริ่มต้นคือวันนี้)"""
+        date = date or attendance_date(time.time())
+        row = self.conn.execute("SELECT MAX(ts) FROM attendance_events WHERE date = ? AND student_id = ?",
+                                (date, student_id)).fetchone()
+        return row[0]
+
+    def attendance_for_date(self, date=None):
+        """ข้อมูลการเช็คชื่อของวันที่กำหนดในรูปแบบเดิม {student_id: timestamp ล่าสุด}"""
+        date = date or attendance_date(time.time())
+        rows = self.conn.execute("SELECT student_id, MAX(ts) FROM attendance_events WHERE date = ? "
+                                 "GROUP BY student_id", (date,))
+        return {student_id: ts for student_id, ts in rows}
+
+    def reset_attendance(self, date=None):
+        """ล้างข้อมูลการเช็คชื่อของวันที่กำหนด"""
+        date = date or attendance_date(time.time())
+        with self.transaction() as conn:
+            deleted = conn.execute("DELETE FROM attendance_events WHERE date = ?", (date,)).rowcount
+            self._bump_version(conn, 'attendance_version')
+            self._bump_version(conn, 'attendance_epoch')
+        return deleted
+
+    def latest_event_id(self):
+        """event_id ล่าสุด ใช้เป็น cursor เริ่มต้นของการติดตามการเช็คชื่อใหม่ (event_id ไม่ถูกใช้ซ้ำแม้ถูกลบ)"""
+        return self.conn.execute("SELECT COALESCE(MAX(event_id), 0) FROM attendance_events").fetchone()[0]
+
+    def events_since(self, cursor, date=None, limit=500):
+        """
+        การเช็คชื่อที่มี event_id มากกว่า cursor ของวันที่กำหนด เรียงตามลำดับที่เกิด
+
+        first คือเป็นการเช็คชื่อครั้งแรกของวันของนักศึกษาคนนั้น และ classes คือชั้นเรียนของนักศึกษา
+        (None ถ้าไม่อยู่ในรายชื่อ) หน้าเว็บจึงปรับตัวเลขสรุป (attendance_summary) ได้เองโดยไม่ต้องโหลดใหม่
+        """
+        date = date or attendance_date(time.time())
+        rows = self.conn.execute(
+            "SELECT a.event_id, a.student_id, a.ts, "
+            "NOT EXISTS (SELECT 1 FROM attendance_events p WHERE p.date = a.date AND p.student_id = a.student_id "
+            "AND p.event_id < a.event_id) AS first, "
+            "EXISTS (SELECT 1 FROM students s WHERE s.student_id = a.student_id) AS enrolled, "
+            "(SELECT group_concat(class_id, char(31)) FROM enrollments e WHERE e.student_id = a.student_id) AS classes "
+            "FROM attendance_events a WHERE a.event_id > ? AND a.date = ? ORDER BY a.event_id LIMIT ?",
+            (int(cursor), date, limit))
+        return [{
+            'event_id': row['event_id'],
+            'student_id': row['student_id'],
+            'ts': row['ts'],
+            'first': bool(row['first']),
+            'classes': (row['classes'].split('\x1f') if row['classes'] else []) if row['enrolled'] else None,
+        } for row in rows]
+
+    # ---------- ย้ายข้อมูลจากไฟล์เดิม ----------
+
+    def import_legacy(self, csv_file='students.csv', json_file=None, data_dir='local_data', force=False):
+        """
+        นำเข้า students.csv (หรือ local_data/students.json ถ้าไม่มี CSV) และไฟล์การเช็คชื่อรายวันเดิม
+        ทำครั้งเดียวต่อฐานข้อมูล (ยกเว้น force=True) และนำเข้าซ้ำได้โดยไม่เกิดข้อมูลซ้ำ
+        """
+        data_dir = Path(data_dir)
+        csv_file = Path(csv_file)
+        json_file = Path(json_file) if json_file else data_dir / 'students.json'
+
+        students = []
+        if csv_file.exists():
+            with open(csv_file, 'r', encoding='utf-8') as f:
+                students = list(csv.DictReader(f))
+        elif json_file.exists():
+            with open(json_file, 'r', encoding='utf-8') as f:
+                students = json.load(f)
+
+        dates = sorted({path.name.split('_', 1)[1].split('.', 1)[0] for path in data_dir.glob('attendance_*.json*')})
+        events = []
+        for date in dates:
+            for student_id, timestamp in load_legacy_attendance(data_dir, date).items():
+                events.append((student_id, int(timestamp), date, 'import'))
+
+        with self.transaction() as conn:
+            if not force and self.get_meta('legacy_imported'):
+                return None
+            imported_students = self._upsert(conn, students)
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO attendance_events (student_id, ts, date, source) "
+                             "VALUES (?, ?, ?, ?)", events)
+            imported_events = conn.total_changes - before
+            self._set_meta(conn, 'legacy_imported', int(time.time()))
+            self._bump_version(conn, 'roster_version')
+            self._bump_version(conn, 'attendance_version')
+
+        logger.info(f"นำเข้าข้อมูลเดิมสำเร็จ: นักศึกษา {imported_students} คน การเช็คชื่อ {imported_events} รายการ")
+        return {'students': imported_students, 'attendance_events': imported_events}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="จัดการฐานข้อมูลการเช็คชื่อ (SQLite)")
+    parser.add_argument('--db', default='local_data/attendance.db', help="ไฟล์ฐานข้อมูล")
+    parser.add_argument('--import', dest='do_import', action='store_true',
+                        help="นำเข้า students.csv/students.json และไฟล์การเช็คชื่อเดิม")
+    parser.add_argument('--csv', default='students.csv', help="ไฟล์ CSV รายชื่อนักศึกษา")
+    parser.add_argument('--data-dir', default='local_data', help="โฟลเดอร์ไฟล์ JSON เดิม")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    store = AttendanceStore(args.db)
+    if args.do_import:
+        result = store.import_legacy(args.csv, data_dir=args.data_dir, force=True)
+        print(json.dumps(result, ensure_ascii=False))
+    print(json.dumps({
+        'students': store.count_students(),
+        'classes': store.list_classes(),
+        'today': len(store.attendance_for_date()),
+        'roster_version': store.version('roster_version'),
+        'attendance_version': store.version('attendance_version'),
+    }, ensure_ascii=False))
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
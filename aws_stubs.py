@@ -0,0 +1,253 @@
+"""
+client จำลองของ AWS สำหรับทดสอบระบบแบบออฟไลน์ (ไม่ต้องมีบัญชี AWS จริง)
+"""
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+
+class _StubClientError(Exception):
+    """ข้อผิดพลาดพื้นฐานของ client จำลอง"""
+
+
+class _StubExceptions:
+    """เลียนแบบ client.exceptions ของ boto3"""
+    InvalidS3ObjectException = type('InvalidS3ObjectException', (_StubClientError,), {})
+    InvalidParameterException = type('InvalidParameterException', (_StubClientError,), {})
+    ResourceAlreadyExistsException = type('ResourceAlreadyExistsException', (_StubClientError,), {})
+    ResourceNotFoundException = type('ResourceNotFoundException', (_StubClientError,), {})
+
+
+class StubServiceError(_StubClientError):
+    """ข้อผิดพลาดที่ client จำลองสุ่มใส่ให้ (เลียนแบบ throttling/เครือข่ายล่ม)"""
+
+
+class _StubService:
+    """
+    ส่วนกลางของ client จำลอง: นับจำนวนการเรียก หน่วงเวลา latency วินาที
+    และสุ่มให้เกิดข้อผิดพลาดด้วยความน่าจะเป็น error_rate (available=False = ล่มทั้งหมด)
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.available = True
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _count(self, operation):
+        with self._lock:
+            self.calls[operation] += 1
+            fail = not self.available or (self.error_rate and self._random.random() < self.error_rate)
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise StubServiceError(f"{operation} ล้มเหลว (จำลอง)")
+
+
+class StubRekognitionClient(_StubService):
+    """
+    Rekognition จำลอง
+
+    resolver(img_bytes) คืนค่า student_id ของใบหน้าในภาพ (หรือ None ถ้าไม่รู้จัก)
+    ใช้ตัดสินผลของทั้ง compare_faces และ search_faces_by_image (เทียบกับส่วน student_id ของ ExternalImageId
+    ที่อยู่ในรูปแบบ student_id หรือ student_id:เวอร์ชัน)
+    """
+    exceptions = _StubExceptions
+
+    def __init__(self, resolver=None, similarity=99.0, latency=0.0, error_rate=0.0, seed=None):
+        super().__init__(latency, error_rate, seed)
+        self.resolver = resolver or (lambda img_bytes: None)
+        self.similarity = similarity
+        self.collections = {}  # collection_id -> {face_id: external_image_id}
+
+    @staticmethod
+    def _student_id_from_key(key):
+        # students/student_378.jpg -> student_378
+        return key.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+
+    def compare_faces(self, SourceImage, TargetImage, SimilarityThreshold=80.0):
+        self._count('compare_faces')
+        if 'Bytes' not in SourceImage:
+            raise self.exceptions.InvalidParameterException("SourceImage ต้องเป็น Bytes")
+        target_id = self._student_id_from_key(TargetImage['S3Object']['Name'])
+        matched = self.resolver(SourceImage['Bytes']) == target_id and self.similarity >= SimilarityThreshold
+        matches = [{'Similarity': self.similarity, 'Face': {}}] if matched else []
+        return {'FaceMatches': matches, 'UnmatchedFaces': []}
+
+    def create_collection(self, CollectionId):
+        self._count('create_collection')
+        with self._lock:
+            if CollectionId in self.collections:
+                raise self.exceptions.ResourceAlreadyExistsException(CollectionId)
+            self.collections[CollectionId] = {}
+        return {'StatusCode': 200}
+
+    def _collection(self, collection_id):
+        if collection_id not in self.collections:
+            raise self.exceptions.ResourceNotFoundException(collection_id)
+        return self.collections[collection_id]
+
+    def list_faces(self, CollectionId, MaxResults=1000, NextToken=None):
+        self._count('list_faces')
+        with self._lock:
+            faces = list(self._collection(CollectionId).items())
+        start = int(NextToken or 0)
+        page = faces[start:start + MaxResults]
+        response = {'Faces': [{'FaceId': face_id, 'ExternalImageId': ext_id} for face_id, ext_id in page]}
+        if start + MaxResults < len(faces):
+            response['NextToken'] = str(start + MaxResults)
+        return response
+
+    def index_faces(self, CollectionId, Image, ExternalImageId=None, MaxFaces=1, **kwargs):
+        self._count('index_faces')
+        face_id = str(uuid.uuid4())
+        with self._lock:
+            self._collection(CollectionId)[face_id] = ExternalImageId
+        return {'FaceRecords': [{'Face': {'FaceId': face_id, 'ExternalImageId': ExternalImageId}}]}
+
+    def delete_faces(self, CollectionId, FaceIds):
+        self._count('delete_faces')
+        with self._lock:
+            collection = self._collection(CollectionId)
+            deleted = [face_id for face_id in FaceIds if collection.pop(face_id, None) is not None]
+        return {'DeletedFaces': deleted}
+
+    def search_faces_by_image(self, CollectionId, Image, FaceMatchThreshold=80.0, MaxFaces=1):
+        self._count('search_faces_by_image')
+        student_id = self.resolver(Image['Bytes'])
+        with self._lock:
+            collection = self._collection(CollectionId)
+            matches = [
+                {'Similarity': self.similarity, 'Face': {'FaceId': face_id, 'ExternalImageId': ext_id}}
+                for face_id, ext_id in collection.items()
+                if (ext_id or '').partition(':')[0] == student_id and self.similarity >= FaceMatchThreshold
+            ]
+        return {'FaceMatches': matches[:MaxFaces]}
+
+
+class _StubBatchWriter:
+    def __init__(self, table):
+        self.table = table
+        self.items = []
+
+    def __enter__(self):
+        return self
+
+    def put_item(self, Item):
+        self.items.append(Item)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            # DynamoDB รับได้ครั้งละไม่เกิน 25 รายการต่อ BatchWriteItem
+            for start in range(0, len(self.items), 25):
+                self.table._count('batch_write_item')
+                self.table._store(self.items[start:start + 25])
+        return False
+
+
+class StubDynamoTable(_StubService):
+    """ตาราง DynamoDB จำลอง (รองรับ put_item และ batch_writer)"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        super().__init__(latency, error_rate, seed)
+        self.items = []
+
+    def _store(self, items):
+        with self._lock:
+            self.items.extend(items)
+
+    def put_item(self, Item):
+        self._count('put_item')
+        self._store([Item])
+        return {}
+
+    def batch_writer(self):
+        return _StubBatchWriter(self)
+
+
+class _StubPaginator:
+    def __init__(self, method):
+        self.method = method
+
+    def paginate(self, **kwargs):
+        while True:
+            response = self.method(**kwargs)
+            yield response
+            if not response.get('IsTruncated'):
+                break
+            kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+
+class _StubBody:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+class StubS3Client(_StubService):
+    """S3 จำลองในหน่วยความจำ (เฉพาะคำสั่งที่ระบบใช้)"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        super().__init__(latency, error_rate, seed)
+        self.objects = {}  # (bucket, key) -> bytes
+
+    def put_object(self, Bucket, Key, Body=b'', **kwargs):
+        self._count('put_object')
+        body = Body.read() if hasattr(Body, 'read') else Body
+        with self._lock:
+            self.objects[(Bucket, Key)] = bytes(body)
+        return {}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Config=None, **kwargs):
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj)
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Config=None, **kwargs):
+        with open(Filename, 'rb') as f:
+            self.put_object(Bucket=Bucket, Key=Key, Body=f)
+
+    def get_object(self, Bucket, Key):
+        self._count('get_object')
+        with self._lock:
+            if (Bucket, Key) not in self.objects:
+                raise _StubExceptions.ResourceNotFoundException(Key)
+            body = self.objects[(Bucket, Key)]
+        return {'Body': _StubBody(body), 'ContentLength': len(body)}
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        body = self.get_object(Bucket=Bucket, Key=Key)['Body'].read()
+        with open(Filename, 'wb') as f:
+            f.write(body)
+
+    def delete_object(self, Bucket, Key):
+        self._count('delete_object')
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000, ContinuationToken=None):
+        self._count('list_objects_v2')
+        with self._lock:
+            keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        response = {'KeyCount': len(page), 'IsTruncated': start + MaxKeys < len(keys)}
+        if page:
+            response['Contents'] = [{'Key': key, 'Size': len(self.objects.get((Bucket, key), b''))} for key in page]
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+    def get_paginator(self, operation_name):
+        return _StubPaginator(getattr(self, operation_name))
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600):
+        # boto3 ลงลายเซ็น URL ในเครื่องโดยไม่เรียกเครือข่าย จึงไม่หน่วงเวลา
+        with self._lock:
+            self.calls['generate_presigned_url'] += 1
+        return f"https://{Params['Bucket']}.s3.stub/{Params['Key']}?Expires={int(time.time()) + ExpiresIn}"
@@ -0,0 +1,156 @@
+"""
+วัดจำนวน request ต่อวินาทีของหน้าแสดงผลการเช็คชื่อภายใต้การ polling จากหลาย client
+
+python bench_web.py --students 2000 --clients 8 --duration 10
+
+เปรียบเทียบ: ไม่มี cache (แบบเดิม), มี cache, cache + gzip และ cache + client ส่ง If-None-Match (ได้ 304)
+ใช้ฐานข้อมูลชั่วคราวและ S3 จำลอง (--route / วัดหน้าแรกที่มีรูปนักศึกษาทุกคน) จึงไม่กระทบข้อมูลจริง
+ผลลัพธ์เป็น JSON
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 2)
+
+
+def run_clients(port, route, clients, duration, use_etag, use_gzip):
+    """ยิง GET วนซ้ำจาก client หลาย thread จนครบ duration วินาที"""
+    latencies = []
+    statuses = {}
+    total_bytes = [0]
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def client():
+        etag = None
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        local_latencies = []
+        local_statuses = {}
+        local_bytes = 0
+        while time.time() < deadline:
+            headers = {'X-Requested-With': 'XMLHttpRequest'}
+            if use_gzip:
+                headers['Accept-Encoding'] = 'gzip'
+            if use_etag and etag:
+                headers['If-None-Match'] = etag
+            started = time.perf_counter()
+            try:
+                conn.request('GET', route, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+                local_statuses['error'] = local_statuses.get('error', 0) + 1
+                continue
+            local_latencies.append(time.perf_counter() - started)
+            local_statuses[response.status] = local_statuses.get(response.status, 0) + 1
+            local_bytes += len(body)
+            etag = response.getheader('ETag') or etag
+            if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+            total_bytes[0] += local_bytes
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': percentile(latencies, 0.5),
+        'p95_ms': percentile(latencies, 0.95),
+        'bytes_per_request': round(total_bytes[0] / len(latencies)) if latencies else 0,
+        'statuses': {str(status): count for status, count in statuses.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark หน้าแสดงผลการเช็คชื่อภายใต้การ polling")
+    parser.add_argument('--students', type=int, default=2000, help="จำนวนนักศึกษาในฐานข้อมูลทดสอบ")
+    parser.add_argument('--clients', type=int, default=8, help="จำนวน client ที่ polling พร้อมกัน")
+    parser.add_argument('--duration', type=float, default=10, help="วินาทีต่อการวัดแต่ละแบบ")
+    parser.add_argument('--route', default='/api/attendance', help="route ที่วัด (/api/attendance หรือ /api/students)")
+    parser.add_argument('--checkin-rate', type=float, default=1.0,
+                        help="จำนวนการเช็คชื่อใหม่ต่อวินาทีระหว่างวัด (ทำให้ cache ถูกล้างเป็นระยะ)")
+    parser.add_argument('--s3-latency', type=float, default=0.02, help="วินาทีที่ S3 จำลองหน่วงต่อการเรียกหนึ่งครั้ง")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_web_')
+    os.environ['ATTENDANCE_DB'] = str(Path(tmp_dir) / 'attendance.db')
+    import student_web_app as web
+    from werkzeug.serving import make_server
+    from aws_stubs import StubS3Client
+
+    # S3 จำลองที่มีรูปของนักศึกษาทุกคน (หน่วงเวลาเหมือนเรียกผ่านเครือข่าย)
+    s3 = StubS3Client(latency=args.s3_latency)
+    for i in range(args.students):
+        s3.objects[(web.s3_bucket, f'students/student_{i:05d}.jpg')] = b''
+    web.s3_client, web.aws_connected = s3, True
+    web.init_s3_caches()
+
+    web.store.replace_students(
+        {'id': f'student_{i:05d}', 'name': f'นักศึกษา {i}', 'class': f'C{i % 10}'} for i in range(args.students)
+    )
+    now = int(time.time())
+    for i in range(0, args.students, 2):
+        web.store.record_check_in(f'student_{i:05d}', now - i)
+
+    server = make_server('127.0.0.1', 0, web.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    stop = threading.Event()
+
+    def check_in_writer():
+        i = 1
+        while args.checkin_rate > 0 and not stop.wait(1.0 / args.checkin_rate):
+            web.store.record_check_in(f'student_{i % args.students:05d}', int(time.time()) + i)
+            i += 2
+
+    writer = threading.Thread(target=check_in_writer, daemon=True)
+    writer.start()
+
+    results = {'students': args.students, 'clients': args.clients, 'route': args.route}
+    s3.calls.clear()
+    for name, cache, etag, use_gzip in (('no_cache', False, False, False),
+                                        ('cache', True, False, False),
+                                        ('cache_gzip', True, False, True),
+                                        ('cache_etag', True, True, True)):
+        web.CACHE_ENABLED = cache
+        web._snapshot = None
+        # แบบเดิม: อ่านรายการไฟล์และสร้าง presigned URL ใหม่ทุก request
+        web.s3_inventory.ttl = 300 if cache else 0
+        web.presigned_urls.refresh_margin = 300 if cache else web.presigned_urls.expiration
+        web.s3_inventory.invalidate()
+        web.presigned_urls.invalidate()
+        results[name] = run_clients(server.server_port, args.route, args.clients, args.duration, etag, use_gzip)
+
+    stop.set()
+    server.shutdown()
+    results['s3_calls'] = dict(s3.calls)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
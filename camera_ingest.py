@@ -0,0 +1,257 @@
+"""
+อ่านภาพจากกล้อง IP (RTSP) / กล้อง USB แบบหน่วงต่ำ
+
+VideoCapture เก็บเฟรมไว้ใน buffer ถ้าอ่านช้ากว่ากล้อง read() จะได้ภาพที่เก่าไปหลายวินาที
+CameraIngest จึงมี thread ของตัวเองที่ grab() ทุกเฟรมตลอดเวลา (buffer ว่างเสมอ) และ retrieve()
+เฉพาะเมื่อมีผู้ขอภาพ ผู้อ่านจึงได้ภาพล่าสุดเสมอ ภาพที่เก่ากว่า max_frame_age จะถูกข้าม
+
+เมื่อสตรีมหลุด (grab ไม่สำเร็จหรือไม่มีเฟรมเกิน read_timeout) จะเชื่อมต่อใหม่โดยรอนานขึ้นทีละเท่า
+(reconnect_backoff ... reconnect_backoff_max) แทนการหยุดโปรแกรม
+
+ไฟล์วิดีโอไม่ใช่สตรีมสด: อ่านทีละเฟรมตามลำดับโดยไม่มี thread และจบเมื่อหมดไฟล์
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+LIVE_SCHEMES = ('rtsp://', 'rtsps://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://')
+
+
+def is_live_source(source):
+    """กล้อง USB (เลข index) หรือ URL ของสตรีม"""
+    return isinstance(source, int) or str(source).lower().startswith(LIVE_SCHEMES)
+
+
+def redact_source(source):
+    """ตัด user:password ออกจาก URL ก่อนเขียน log หรือแสดงในสถิติ"""
+    if isinstance(source, int):
+        return source
+    scheme, sep, rest = str(source).partition('://')
+    if not sep or '@' not in rest.split('/', 1)[0]:
+        return str(source)
+    return f"{scheme}://{rest.split('@', 1)[1]}"
+
+
+def open_capture(source, buffer_size=1):
+    """เปิด VideoCapture (สตรีม RTSP ใช้ FFMPEG) และลดขนาด buffer ของ backend ที่รองรับ"""
+    if isinstance(source, str) and source.lower().startswith(LIVE_SCHEMES):
+        cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG)
+    else:
+        cap = cv2.VideoCapture(source)
+    if cap.isOpened() and buffer_size:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+    return cap
+
+
+class CameraIngest:
+    """
+    ตัวอ่านภาพล่าสุดจากแหล่งภาพหนึ่งแหล่ง
+
+    read(last_seq) รอเฟรมที่ใหม่กว่า last_seq คืนค่า (ok, seq, frame, age)
+    ok=False คือแหล่งภาพจบแล้ว (ไฟล์หมดหรือถูก stop) frame=None คือยังไม่มีเฟรมใหม่ภายใน timeout
+    (เช่นกำลังเชื่อมต่อใหม่) age คือวินาทีตั้งแต่ grab เฟรมนั้นจนถึงตอนที่คืนค่า
+    """
+
+    def __init__(self, source, name=None, buffer_size=1, read_timeout=5.0, reconnect_backoff=1.0,
+                 reconnect_backoff_max=30.0, max_frame_age=1.0, capture_factory=open_capture):
+        self.source = source
+        self.name = name or str(redact_source(source))
+        self.buffer_size = buffer_size
+        self.read_timeout = read_timeout
+        self.reconnect_backoff = reconnect_backoff
+        self.reconnect_backoff_max = reconnect_backoff_max
+        self.max_frame_age = max_frame_age
+        self.capture_factory = capture_factory
+        self.live = is_live_source(source)
+
+        self.cap = None
+        self.connected = False
+        self.grabbed = 0
+        self.retrieved = 0
+        self.stale_dropped = 0
+        self.reconnects = 0
+        self.failures = 0
+        self.last_error = None
+        self.disconnected_at = None
+        self.downtime = 0.0
+        self._ages = deque(maxlen=500)
+        self._frame = None
+        self._frame_at = None
+        self._seq = 0
+        self._requests = 0
+        self._ended = False
+        self._stop = threading.Event()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    # ---------- การเชื่อมต่อ ----------
+
+    def _connect(self):
+        cap = self.capture_factory(self.source, self.buffer_size)
+        if not cap.isOpened():
+            cap.release()
+            return False
+        self.cap = cap
+        self.connected = True
+        if self.disconnected_at is not None:
+            self.downtime += time.time() - self.disconnected_at
+            self.disconnected_at = None
+        return True
+
+    def _disconnect(self, reason):
+        self.last_error = reason
+        self.failures += 1
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+        if self.connected:
+            self.connected = False
+            self.disconnected_at = time.time()
+            logger.warning(f"สตรีมของกล้อง {self.name} หลุด: {reason}")
+
+    def start(self):
+        """เชื่อมต่อครั้งแรก คืนค่า False ถ้าเปิดแหล่งภาพไม่ได้ (สำหรับสตรีมสดจะเริ่ม thread grab ด้วย)"""
+        if not self._connect():
+            self.last_error = "ไม่สามารถเปิดแหล่งภาพ"
+            return False
+        if self.live:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f'ingest-{self.name}', daemon=True)
+            self._thread.start()
+        return True
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        with self._condition:
+            self._ended = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+        self.connected = False
+
+    def _reconnect(self):
+        """เชื่อมต่อใหม่โดยรอ reconnect_backoff * 2^n วินาที (มี jitter) จนสำเร็จหรือถูก stop"""
+        delay = self.reconnect_backoff
+        while not self._stop.is_set():
+            if self._stop.wait(delay * random.uniform(0.8, 1.2)):
+                return False
+            self.reconnects += 1
+            if self._connect():
+                logger.info(f"เชื่อมต่อกล้อง {self.name} ใหม่สำเร็จ (ครั้งที่ {self.reconnects})")
+                return True
+            logger.warning(f"เชื่อมต่อกล้อง {self.name} ใหม่ไม่สำเร็จ จะลองอีกครั้งใน {min(delay * 2, self.reconnect_backoff_max):.1f} วินาที")
+            delay = min(delay * 2, self.reconnect_backoff_max)
+        return False
+
+    # ---------- thread grab ----------
+
+    def _run(self):
+        last_frame_at = time.time()
+        while not self._stop.is_set():
+            if self.cap is None and not self._reconnect():
+                break
+            ok = self.cap.grab()
+            now = time.time()
+            if not ok:
+                # grab ล้มเหลวครั้งเดียวอาจเป็นแค่แพ็กเก็ตหาย ถือว่าหลุดเมื่อไม่มีเฟรมเกิน read_timeout
+                if now - last_frame_at >= self.read_timeout:
+                    self._disconnect("ไม่ได้รับเฟรมเกิน read_timeout")
+                    last_frame_at = time.time()
+                else:
+                    self._stop.wait(0.01)
+                continue
+            last_frame_at = now
+            self.grabbed += 1
+
+            with self._condition:
+                wanted = self._requests > 0
+            if not wanted:
+                continue
+            ok, frame = self.cap.retrieve()
+            if not ok:
+                continue
+            with self._condition:
+                self._frame = frame
+                self._frame_at = now
+                self._seq += 1
+                self.retrieved += 1
+                self._condition.notify_all()
+
+        with self._condition:
+            self._ended = True
+            self._condition.notify_all()
+
+    # ---------- การอ่านภาพ ----------
+
+    def read(self, last_seq=0, timeout=None):
+        timeout = self.read_timeout if timeout is None else timeout
+        if not self.live:
+            return self._read_file(last_seq)
+
+        deadline = time.time() + timeout
+        with self._condition:
+            self._requests += 1
+            try:
+                while True:
+                    remaining = deadline - time.time()
+                    if not self._condition.wait_for(lambda: self._seq != last_seq or self._ended, max(0, remaining)):
+                        return True, last_seq, None, None
+                    if self._seq == last_seq:
+                        return False, last_seq, None, None
+                    age = time.time() - self._frame_at
+                    last_seq = self._seq
+                    if self.max_frame_age and age > self.max_frame_age:
+                        # เฟรมค้าง (เช่นเครือข่ายสะดุด) ข้ามไปรอเฟรมถัดไป
+                        self.stale_dropped += 1
+                        continue
+                    self._ages.append(age)
+                    return True, self._seq, self._frame, age
+            finally:
+                self._requests -= 1
+
+    def _read_file(self, last_seq):
+        if self.cap is None:
+            return False, last_seq, None, None
+        started = time.time()
+        ok, frame = self.cap.read()
+        if not ok:
+            return False, last_seq, None, None
+        self.grabbed += 1
+        self.retrieved += 1
+        self._seq += 1
+        age = time.time() - started
+        self._ages.append(age)
+        return True, self._seq, frame, age
+
+    def latest(self, timeout=0.2):
+        """เฟรมถัดไปที่ grab ได้ (ใช้กับสตรีมหลักที่ retrieve เฉพาะตอนต้องการภาพความละเอียดสูง)"""
+        with self._condition:
+            seq = self._seq
+        ok, _, frame, _ = self.read(seq, timeout)
+        return frame if ok else None
+
+    def stats(self):
+        ages = sorted(self._ages)
+        downtime = self.downtime + (time.time() - self.disconnected_at if self.disconnected_at else 0)
+        return {
+            'connected': self.connected,
+            'frames_grabbed': self.grabbed,
+            'frames_retrieved': self.retrieved,
+            'stale_dropped': self.stale_dropped,
+            'frame_age_p50_ms': round(ages[len(ages) // 2] * 1000, 1) if ages else None,
+            'frame_age_p95_ms': round(ages[min(len(ages) - 1, int(len(ages) * 0.95))] * 1000, 1) if ages else None,
+            'reconnects': self.reconnects,
+            'failures': self.failures,
+            'downtime_s': round(downtime, 1),
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,88 @@
+"""
+แจ้งเตือนการเปลี่ยนแปลงของข้อมูลให้ client ที่รออยู่ทั้งหมดพร้อมกัน (ใช้กับ SSE / long-poll ของ web app)
+
+ข้อมูลถูกเขียนจาก process อื่น (โปรแกรมกล้อง) จึงต้องตรวจฐานข้อมูลเป็นระยะ ChangeNotifier ตรวจเพียง thread เดียว
+ไม่ว่าจะมี client เชื่อมต่ออยู่กี่ราย แต่ละ client รอบน threading.Condition และ query ข้อมูลเฉพาะเมื่อถูกปลุก
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeNotifier:
+    """
+    เรียก read_state() ทุก interval วินาทีบน thread ของตัวเอง เมื่อค่าที่ได้ต่างจากครั้งก่อน
+    จะเพิ่ม generation แล้วปลุกทุก client ที่รออยู่ใน wait()
+
+    thread เริ่มทำงานเมื่อมี client เรียก current()/wait() ครั้งแรก
+    """
+
+    def __init__(self, read_state, interval=0.5):
+        self.read_state = read_state
+        self.interval = interval
+        self.generation = 0
+        self.state = None
+        self.polls = 0
+        self.changes = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._condition:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='change-notifier', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        with self._condition:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                state = self.read_state()
+            except Exception as e:
+                logger.error(f"ไม่สามารถตรวจสอบการเปลี่ยนแปลงของข้อมูล: {e}")
+            else:
+                with self._condition:
+                    self.polls += 1
+                    if state != self.state:
+                        self.state = state
+                        self.generation += 1
+                        self.changes += 1
+                        self._condition.notify_all()
+            self._stop.wait(self.interval)
+
+    def current(self):
+        """generation ปัจจุบัน (อ่านก่อน query ข้อมูล แล้วส่งให้ wait() เพื่อไม่ให้พลาดการเปลี่ยนแปลงระหว่างนั้น)"""
+        self.start()
+        with self._condition:
+            return self.generation
+
+    def wait(self, generation, timeout):
+        """รอจน generation เปลี่ยนจากค่าที่ให้หรือครบ timeout วินาที คืนค่า generation ล่าสุด"""
+        self.start()
+        with self._condition:
+            self.waiting += 1
+            try:
+                self._condition.wait_for(lambda: self.generation != generation, timeout)
+            finally:
+                self.waiting -= 1
+            return self.generation
+
+    def stats(self):
+        with self._condition:
+            return {
+                'generation': self.generation,
+                'polls': self.polls,
+                'changes': self.changes,
+                'waiting': self.waiting,
+            }
@@ -0,0 +1,203 @@
+"""
+เขียนข้อมูลการเช็คชื่อลง DynamoDB แบบ background และเป็น batch
+
+- เหตุการณ์ถูกเข้าคิว แล้ว thread เบื้องหลังส่งด้วย batch_writer เมื่อครบ batch_size หรือครบ flush_interval วินาที
+- ถ้าส่งไม่สำเร็จจะลองใหม่แบบ exponential backoff ถ้ายังไม่สำเร็จจะเก็บลงไฟล์ spool (JSON Lines)
+- ไฟล์ spool จะถูกส่งซ้ำเป็นระยะเมื่อเชื่อมต่อได้อีกครั้ง
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from prometheus_client import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+WRITE_SECONDS = Histogram('attendance_dynamodb_write_seconds', 'เวลาที่ใช้เขียนหนึ่ง batch ลง DynamoDB (วินาที)',
+                          ['outcome'])
+ITEMS_WRITTEN = Counter('attendance_dynamodb_items_written_total', 'จำนวนรายการที่เขียนลง DynamoDB สำเร็จ')
+RETRIES = Counter('attendance_dynamodb_retries_total', 'จำนวนครั้งที่ลองเขียน DynamoDB ใหม่')
+FAILED_BATCHES = Counter('attendance_dynamodb_failed_batches_total', 'จำนวน batch ที่เขียนไม่สำเร็จหลังลองครบ')
+SPOOLED_ITEMS = Counter('attendance_dynamodb_spooled_items_total', 'จำนวนรายการที่ถูกเก็บลงไฟล์ spool')
+
+
+class AttendanceWriter:
+    """ตัวเขียน DynamoDB แบบ asynchronous พร้อม spool ลงดิสก์"""
+
+    def __init__(self, table, spool_file, batch_size=25, flush_interval=2.0, max_retries=3,
+                 backoff_base=0.5, backoff_max=30.0, replay_interval=30.0):
+        self.table = table
+        self.spool_file = Path(spool_file)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.replay_interval = replay_interval
+        self.sent = 0
+        self.failed_batches = 0
+        self.retries = 0
+        self.spooled = 0
+        self.last_batch_ms = None
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_replay = 0.0
+        self._lock = threading.Lock()
+        self.spool_backlog = self._count_spool()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='dynamo-writer', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10.0):
+        """หยุด thread โดยส่งข้อมูลที่ค้างในคิว (ถ้าส่งไม่ได้จะเก็บลง spool)"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def put(self, item):
+        """เพิ่มรายการที่จะเขียนลง DynamoDB (ไม่รอผล)"""
+        self._queue.put(item)
+
+    def backlog(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'sent': self.sent,
+                'retries': self.retries,
+                'failed_batches': self.failed_batches,
+                'spooled': self.spooled,
+                'spool_backlog': self.spool_backlog,
+                'last_batch_ms': self.last_batch_ms,
+            }
+
+    def _next_batch(self):
+        """รอรายการจากคิวจนครบ batch_size หรือครบ flush_interval"""
+        batch = []
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0 or (self._stop.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.2)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._next_batch()
+            if batch and not self._send_with_retry(batch):
+                self._spool(batch)
+            if not self._stop.is_set() and time.time() - self._last_replay >= self.replay_interval:
+                self._last_replay = time.time()
+                self._replay_spool()
+
+    def _send(self, items):
+        if self.table is None:
+            raise Exception("ไม่ได้เชื่อมต่อ DynamoDB")
+        started = time.perf_counter()
+        try:
+            with self.table.batch_writer() as writer:
+                for item in items:
+                    writer.put_item(Item=item)
+        except Exception:
+            WRITE_SECONDS.labels('error').observe(time.perf_counter() - started)
+            raise
+        elapsed = time.perf_counter() - started
+        WRITE_SECONDS.labels('ok').observe(elapsed)
+        ITEMS_WRITTEN.inc(len(items))
+        with self._lock:
+            self.sent += len(items)
+            self.last_batch_ms = round(elapsed * 1000, 2)
+
+    def _send_with_retry(self, items):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._send(items)
+                logger.info(f"บันทึกการเช็คชื่อลง DynamoDB สำเร็จ: {len(items)} รายการ")
+                return True
+            except Exception as e:
+                if attempt == self.max_retries or self._stop.is_set():
+                    logger.error(f"ไม่สามารถบันทึกลง DynamoDB: {e}")
+                    break
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                with self._lock:
+                    self.retries += 1
+                RETRIES.inc()
+                logger.warning(f"บันทึกลง DynamoDB ไม่สำเร็จ ลองใหม่ใน {delay:.1f} วินาที: {e}")
+                self._stop.wait(delay)
+        with self._lock:
+            self.failed_batches += 1
+        FAILED_BATCHES.inc()
+        return False
+
+    def _count_spool(self):
+        try:
+            with open(self.spool_file, 'rb') as f:
+                return sum(1 for line in f if line.strip())
+        except FileNotFoundError:
+            return 0
+
+    def _spool(self, items):
+        """เก็บรายการที่ส่งไม่สำเร็จลงไฟล์ spool"""
+        try:
+            with open(self.spool_file, 'a', encoding='utf-8') as f:
+                for item in items:
+                    f.write(json.dumps(item, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            with self._lock:
+                self.spooled += len(items)
+                self.spool_backlog += len(items)
+            SPOOLED_ITEMS.inc(len(items))
+            logger.warning(f"เก็บการเช็คชื่อ {len(items)} รายการลงไฟล์ spool เพื่อส่งภายหลัง")
+        except Exception as e:
+            logger.error(f"ไม่สามารถเขียนไฟล์ spool: {e}")
+
+    def _replay_spool(self):
+        """ส่งรายการใน spool ซ้ำทีละ batch รายการที่ยังส่งไม่ได้จะถูกเก็บไว้ในไฟล์ต่อ"""
+        if self.table is None or not self.spool_file.exists():
+            return
+        try:
+            with open(self.spool_file, 'r', encoding='utf-8') as f:
+                items = [json.loads(line) for line in f if line.strip()]
+        except Exception as e:
+            logger.error(f"ไม่สามารถอ่านไฟล์ spool: {e}")
+            return
+
+        sent = 0
+        for start in range(0, len(items), self.batch_size):
+            if self._stop.is_set():
+                break
+            try:
+                self._send(items[start:start + self.batch_size])
+            except Exception as e:
+                logger.warning(f"ยังส่งข้อมูลใน spool ไม่ได้: {e}")
+                break
+            sent = start + self.batch_size
+
+        if sent == 0:
+            return
+        remaining = items[sent:]
+        tmp_file = self.spool_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for item in remaining:
+                f.write(json.dumps(item, ensure_ascii=False) + '\n')
+        os.replace(tmp_file, self.spool_file)
+        with self._lock:
+            self.spool_backlog = len(remaining)
+        logger.info(f"ส่งข้อมูลจาก spool ลง DynamoDB สำเร็จ {min(sent, len(items))} รายการ เหลือ {len(remaining)} รายการ")
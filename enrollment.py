@@ -0,0 +1,385 @@
+"""
+นำเข้านักศึกษาจำนวนมากพร้อมรูปลงทะเบียนในครั้งเดียว
+
+python enrollment.py photos.zip [--csv students.csv] [--workers 8]
+python enrollment.py photos/ --dry-run
+
+ต้นทางเป็นไฟล์ ZIP หรือโฟลเดอร์ของรูป (ชื่อไฟล์คือรหัสนักศึกษา เช่น 378.jpg หรือ student_378.jpg)
+และไฟล์ CSV รายชื่อ (id,name,class) ที่ระบุแยกหรือวางไว้ใน ZIP/โฟลเดอร์ในชื่อ students.csv
+
+- อ่านรูปทีละไฟล์จาก ZIP (ไม่แตกไฟล์หรือโหลดทั้งไฟล์เข้าหน่วยความจำ) และจำกัดจำนวนรูปที่รอประมวลผล
+- ตรวจว่าแต่ละรูปมีใบหน้าเดียวพอดี แล้วคำนวณ embedding จากใบหน้านั้นเลย
+- ตัดรูปรอบใบหน้า ย่อเป็นขนาดมาตรฐานและบีบอัด JPEG ใหม่ (รูปจากมือถือหลาย MB เหลือไม่กี่สิบ KB
+  ทำให้ Rekognition อ่าน TargetImage จาก S3 เร็วขึ้น) รูปที่ได้ hash ตรงกับรูปเดิมจะไม่อัพโหลดซ้ำ
+- อัพโหลดขึ้น S3 แบบขนานผ่าน client เดียวที่มี connection pool (TransferConfig แบ่ง multipart เมื่อไฟล์ใหญ่)
+- บันทึกรายชื่อและ embedding ลงฐานข้อมูลใน transaction เดียวหลังประมวลผลครบ
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import boto3
+import cv2
+import numpy as np
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
+
+from attendance_store import AttendanceStore
+from face_detector import create_detector
+from face_matcher import FaceEmbedder, configured_embedding_model, encode_embedding
+
+logger = logging.getLogger(__name__)
+
+PHOTO_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+ROSTER_FILE = 'students.csv'
+S3_PREFIX = 'students/'
+PHOTO_SIZE = 480      # ด้านยาวสูงสุดของรูปลงทะเบียน (พิกเซล)
+PHOTO_MARGIN = 0.5    # ขอบรอบใบหน้าแต่ละด้าน (เท่าของขนาดใบหน้า)
+JPEG_QUALITY = 90
+
+
+class EnrollmentError(Exception):
+    """รูปที่นำเข้าไม่ได้ (reason เป็นรหัสสาเหตุสำหรับรายงาน)"""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def normalize_student_id(value):
+    """378 -> student_378 (รูปแบบเดียวกับฟอร์มในหน้าเว็บ)"""
+    value = (value or '').strip()
+    if not value:
+        return ''
+    return value if value.startswith('student_') else f'student_{value}'
+
+
+def normalize_photo(image, box, size=PHOTO_SIZE, margin=PHOTO_MARGIN, quality=JPEG_QUALITY):
+    """
+    ตัดรูปสี่เหลี่ยมจัตุรัสรอบใบหน้า box (x, y, w, h) ย่อให้ไม่เกิน size x size แล้วเข้ารหัส JPEG คืนค่า bytes
+
+    ผลลัพธ์ขึ้นกับภาพต้นฉบับเท่านั้น รูปเดิมที่อัพโหลดซ้ำจึงได้ bytes (และ hash) เดิม
+    """
+    x, y, w, h = box
+    height, width = image.shape[:2]
+    side = min(int(max(w, h) * (1 + 2 * margin)), width, height)
+    left = min(max(0, x + w // 2 - side // 2), width - side)
+    top = min(max(0, y + h // 2 - side // 2), height - side)
+    photo = image[top:top + side, left:left + side]
+    if side > size:
+        photo = cv2.resize(photo, (size, size), interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.jpg', photo, [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1])
+    if not ok:
+        raise EnrollmentError('encode_failed', "ไม่สามารถเข้ารหัสรูปเป็น JPEG")
+    return encoded.tobytes()
+
+
+def create_s3_client(max_pool_connections=16):
+    """S3 client ที่มี connection pool พอสำหรับอัพโหลดพร้อมกันหลาย thread (client ของ boto3 ใช้ร่วมกันได้)"""
+    session = boto3.Session(
+        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+        region_name=os.getenv('AWS_REGION_NAME', 'ap-southeast-2')
+    )
+    return session.client('s3', config=BotoConfig(max_pool_connections=max_pool_connections,
+                                                  retries={'max_attempts': 5, 'mode': 'adaptive'}))
+
+
+class PhotoSource:
+    """
+    รูปและไฟล์รายชื่อจาก ZIP (path หรือ file object ที่ seek ได้) หรือโฟลเดอร์
+
+    entries() คืนค่า (ชื่อไฟล์, ฟังก์ชันอ่าน bytes) ทีละรูป ตัวไฟล์จะถูกอ่านเมื่อเรียกฟังก์ชันเท่านั้น
+    """
+
+    def __init__(self, source):
+        self.directory = None
+        self.archive = None
+        if isinstance(source, (str, Path)) and Path(source).is_dir():
+            self.directory = Path(source)
+        else:
+            self.archive = zipfile.ZipFile(source)
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _members(self):
+        if self.directory is not None:
+            return sorted(path for path in self.directory.rglob('*') if path.is_file())
+        # ข้ามโฟลเดอร์และไฟล์ที่ macOS ใส่มาใน ZIP
+        return [info for info in self.archive.infolist()
+                if not info.is_dir() and not info.filename.startswith('__MACOSX/')]
+
+    @staticmethod
+    def _name(member):
+        return member.name if isinstance(member, Path) else member.filename.rsplit('/', 1)[-1]
+
+    def _reader(self, member):
+        if isinstance(member, Path):
+            return member.read_bytes
+        return lambda: self.archive.read(member)
+
+    def photos(self):
+        return [member for member in self._members()
+                if Path(self._name(member)).suffix.lower() in PHOTO_EXTENSIONS and not self._name(member).startswith('.')]
+
+    def entries(self):
+        for member in self.photos():
+            yield self._name(member), self._reader(member)
+
+    def roster(self):
+        """ไฟล์ students.csv ที่อยู่ใน ZIP/โฟลเดอร์ (text stream) หรือ None"""
+        for member in self._members():
+            if self._name(member) == ROSTER_FILE:
+                if isinstance(member, Path):
+                    return open(member, 'r', encoding='utf-8-sig', newline='')
+                return io.TextIOWrapper(self.archive.open(member), encoding='utf-8-sig', newline='')
+        return None
+
+
+def read_roster(stream):
+    """อ่าน CSV รายชื่อ (id,name,class) ทีละแถว คืนค่า {student_id: student}"""
+    students = {}
+    for row in csv.DictReader(stream):
+        student_id = normalize_student_id(row.get('id'))
+        if student_id:
+            students[student_id] = {'id': student_id, 'name': (row.get('name') or '').strip(),
+                                    'class': (row.get('class') or '').strip()}
+    return students
+
+
+class BulkEnroller:
+    """
+    นำเข้ารูปลงทะเบียนและรายชื่อนักศึกษาจาก PhotoSource
+
+    รูปถูกตรวจสอบ คำนวณ embedding และอัพโหลดบน thread pool ขนาด workers โดยมีรูปที่อ่านแล้วแต่ยังไม่เสร็จ
+    ไม่เกิน max_pending รูป progress(report) ถูกเรียกทุกครั้งที่รูปหนึ่งประมวลผลเสร็จ (จาก thread ของ pool)
+    s3=None หรือ dry_run=True คือไม่อัพโหลด และ dry_run=True ไม่บันทึกลงฐานข้อมูล
+    รูปที่อัพโหลดเป็นรูปมาตรฐานจาก normalize_photo(photo_size, photo_margin, jpeg_quality)
+    """
+
+    def __init__(self, store, s3=None, s3_bucket=None, detector=None, embedder=None, workers=8,
+                 max_pending=None, transfer_config=None, progress=None, dry_run=False,
+                 photo_size=PHOTO_SIZE, photo_margin=PHOTO_MARGIN, jpeg_quality=JPEG_QUALITY):
+        self.store = store
+        self.s3 = s3
+        self.s3_bucket = s3_bucket
+        self.detector = detector or create_detector('haar', detect_width=640, min_size=40)
+        self.embedder = embedder or FaceEmbedder()
+        self.workers = max(1, workers)
+        self.max_pending = max_pending or self.workers * 2
+        self.transfer_config = transfer_config or TransferConfig(
+            multipart_threshold=8 * 1024 * 1024, multipart_chunksize=8 * 1024 * 1024,
+            max_concurrency=4, use_threads=True)
+        self.progress = progress
+        self.dry_run = dry_run
+        self.photo_size = photo_size
+        self.photo_margin = photo_margin
+        self.jpeg_quality = jpeg_quality
+        self._lock = threading.Lock()
+
+    def validate(self, data):
+        """ถอดรหัสรูปและตรวจว่ามีใบหน้าเดียว คืนค่า (ภาพ, กรอบใบหน้า)"""
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise EnrollmentError('decode_failed', "ไม่สามารถอ่านไฟล์รูปภาพ")
+        boxes = self.detector.detect(image)
+        if not boxes:
+            raise EnrollmentError('no_face', "ไม่พบใบหน้าในรูป")
+        if len(boxes) > 1:
+            raise EnrollmentError('multiple_faces', f"พบใบหน้า {len(boxes)} ใบในรูป")
+        return image, boxes[0]
+
+    def upload(self, student_id, data):
+        key = f'{S3_PREFIX}{student_id}.jpg'
+        self.s3.upload_fileobj(io.BytesIO(data), self.s3_bucket, key,
+                               ExtraArgs={'ContentType': 'image/jpeg'}, Config=self.transfer_config)
+        return key
+
+    def process(self, student_id, data, known_hash=None):
+        """
+        ประมวลผลรูปหนึ่งรูป: ถอดรหัสครั้งเดียว ตรวจใบหน้า ทำรูปมาตรฐาน คำนวณ embedding และอัพโหลด
+
+        คืนค่า dict (embedding, sha256, key, size) หรือ None ถ้ารูปมาตรฐานตรงกับ known_hash (รูปเดิม)
+        """
+        image, (x, y, w, h) = self.validate(data)
+        photo = normalize_photo(image, (x, y, w, h), self.photo_size, self.photo_margin, self.jpeg_quality)
+        digest = hashlib.sha256(photo).hexdigest()
+        if digest == known_hash:
+            return None
+        result = {
+            'embedding': self.embedder.embed(image[y:y + h, x:x + w]),
+            'sha256': digest,
+            'key': None,
+            'size': len(photo),
+        }
+        if self.s3 is not None and not self.dry_run:
+            try:
+                result['key'] = self.upload(student_id, photo)
+            except Exception as e:
+                raise EnrollmentError('upload_failed', f"อัพโหลดไป S3 ไม่สำเร็จ: {e}") from e
+        return result
+
+    def enroll_photo(self, student_id, data):
+        """
+        ลงทะเบียนรูปของนักศึกษาหนึ่งคน (ต้องมีในฐานข้อมูลแล้ว) คืนค่า dict ผลลัพธ์ของ process()
+        หรือ None ถ้าเป็นรูปเดิม ข้อผิดพลาดของรูปเป็น EnrollmentError
+        """
+        result = self.process(student_id, data, self.store.photo_hashes([student_id]).get(student_id))
+        if result is not None and not self.dry_run:
+            self.store.enroll([], {student_id: encode_embedding(result['embedding'])}, model=self.embedder.name,
+                              photos={student_id: result})
+        return result
+
+    def run(self, source, roster=None):
+        """
+        นำเข้าจาก source (PhotoSource) และ roster ({student_id: student} จาก read_roster หรือ None
+        เพื่ออ่าน students.csv ใน source) คืนค่ารายงานผล
+        """
+        started = time.perf_counter()
+        if roster is None:
+            stream = source.roster()
+            roster = {}
+            if stream is not None:
+                with stream:
+                    roster = read_roster(stream)
+        known = set(self.store.student_ids()) | set(roster)
+        hashes = self.store.photo_hashes()
+
+        report = {
+            'total': len(source.photos()),
+            'processed': 0,
+            'enrolled': 0,
+            'uploaded': 0,
+            'unchanged': 0,
+            'uploaded_bytes': 0,
+            'roster_rows': len(roster),
+            'skipped': [],
+            'dry_run': self.dry_run,
+        }
+        embeddings = {}
+        photos = {}
+        uploaded = {}
+        unchanged = set()
+        pending = threading.BoundedSemaphore(self.max_pending)
+        seen = set()
+
+        def finish(filename, student_id, result=None, error=None):
+            with self._lock:
+                report['processed'] += 1
+                if error is not None:
+                    report['skipped'].append({'file': filename, 'student_id': student_id,
+                                              'reason': error.reason, 'message': str(error)})
+                elif result is None:
+                    unchanged.add(student_id)
+                    report['unchanged'] += 1
+                else:
+                    embeddings[student_id] = encode_embedding(result['embedding'])
+                    photos[student_id] = result
+                    if result['key']:
+                        uploaded[student_id] = result['key']
+                        report['uploaded'] += 1
+                        report['uploaded_bytes'] += result['size']
+                snapshot = dict(report, skipped=len(report['skipped']))
+            if self.progress is not None:
+                self.progress(snapshot)
+
+        def task(filename, student_id, read):
+            try:
+                finish(filename, student_id, result=self.process(student_id, read(), hashes.get(student_id)))
+            except EnrollmentError as e:
+                finish(filename, student_id, error=e)
+            except Exception as e:
+                logger.error(f"ไม่สามารถประมวลผลรูป {filename}: {e}")
+                finish(filename, student_id, error=EnrollmentError('error', str(e)))
+            finally:
+                pending.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='enroll') as executor:
+            for filename, read in source.entries():
+                student_id = normalize_student_id(Path(filename).stem)
+                if student_id in seen:
+                    finish(filename, student_id, error=EnrollmentError('duplicate', "มีรูปของนักศึกษาคนนี้แล้ว"))
+                    continue
+                seen.add(student_id)
+                if student_id not in known:
+                    finish(filename, student_id,
+                           error=EnrollmentError('not_in_roster', "ไม่พบรหัสนักศึกษาใน CSV หรือฐานข้อมูล"))
+                    continue
+                # รอเมื่อมีรูปค้างครบ max_pending เพื่อไม่ให้อ่าน ZIP ล่วงหน้าจนเต็มหน่วยความจำ
+                pending.acquire()
+                executor.submit(task, filename, student_id, read)
+
+        if not self.dry_run and (roster or embeddings):
+            self.store.enroll(roster.values(), embeddings, model=self.embedder.name, photos=photos)
+        report['enrolled'] = len(embeddings)
+        report['missing_photo'] = sorted(set(roster) - set(embeddings) - unchanged)
+        report['uploaded_keys'] = uploaded
+        report['model'] = self.embedder.name
+        report['elapsed_s'] = round(time.perf_counter() - started, 3)
+        report['photos_per_s'] = round(report['processed'] / report['elapsed_s'], 1) if report['elapsed_s'] else None
+        logger.info(f"นำเข้ารูปลงทะเบียนสำเร็จ {report['enrolled']}/{report['total']} รูป "
+                    f"ข้าม {len(report['skipped'])} รูป ({report['elapsed_s']} วินาที)")
+        return report
+
+
+def main():
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="นำเข้ารูปลงทะเบียนและรายชื่อนักศึกษาจำนวนมากจาก ZIP หรือโฟลเดอร์")
+    parser.add_argument('source', help="ไฟล์ ZIP หรือโฟลเดอร์ของรูป (ชื่อไฟล์คือรหัสนักศึกษา)")
+    parser.add_argument('--csv', help="ไฟล์ CSV รายชื่อ (id,name,class) ถ้าไม่ระบุจะใช้ students.csv ใน source")
+    parser.add_argument('--db', default=os.getenv('ATTENDANCE_DB', 'local_data/attendance.db'), help="ไฟล์ฐานข้อมูล")
+    parser.add_argument('--bucket', default=os.getenv('S3_BUCKET', 'face-recognition-classroom'), help="S3 bucket")
+    parser.add_argument('--workers', type=int, default=8, help="จำนวน thread ที่ตรวจสอบและอัพโหลดรูปพร้อมกัน")
+    parser.add_argument('--config', default='config.ini', help="config.ini ของโปรแกรมกล้อง (อ่าน embedding_model)")
+    parser.add_argument('--embedding-model', help="ไฟล์โมเดล SFace (ค่าเริ่มต้น: embedding_model ใน config.ini)")
+    parser.add_argument('--no-upload', action='store_true', help="ไม่อัพโหลดรูปขึ้น S3")
+    parser.add_argument('--dry-run', action='store_true', help="ตรวจสอบรูปอย่างเดียว ไม่อัพโหลดและไม่บันทึก")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    s3 = None
+    if not args.no_upload and not args.dry_run:
+        s3 = create_s3_client(max_pool_connections=args.workers * 2)
+
+    def progress(report):
+        sys.stderr.write(f"\r{report['processed']}/{report['total']} รูป "
+                         f"(อัพโหลด {report['uploaded']}, รูปเดิม {report['unchanged']}, ข้าม {report['skipped']})")
+        sys.stderr.flush()
+
+    store = AttendanceStore(args.db)
+    enroller = BulkEnroller(store, s3, args.bucket, embedder=FaceEmbedder(args.embedding_model or configured_embedding_model(args.config)),
+                            workers=args.workers, progress=progress, dry_run=args.dry_run)
+    roster = None
+    if args.csv:
+        with open(args.csv, 'r', encoding='utf-8-sig', newline='') as f:
+            roster = read_roster(f)
+    with PhotoSource(args.source) as source:
+        report = enroller.run(source, roster)
+    sys.stderr.write("\n")
+    store.close()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+cache ผลการจับคู่ใบหน้าโดยใช้ perceptual hash (dHash) ของภาพใบหน้าเป็น key
+
+ภาพใบหน้าจากการสแกนรอบติด ๆ กันแทบเหมือนเดิม จึงใช้ผลเดิมได้โดยไม่ต้องเรียก Rekognition ซ้ำ
+"""
+import threading
+import time
+import cv2
+from collections import OrderedDict
+
+from face_tracker import box_iou
+
+
+def dhash(image, hash_size=8):
+    """คำนวณ difference hash ขนาด hash_size * hash_size บิตของภาพ"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    resized = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (resized[:, 1:] > resized[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def same_region(a, b, min_iou=0.3):
+    """
+    ภาพใบหน้าสองภาพมาจากตำแหน่งเดียวกันหรือไม่ region คือ (กล้อง, track_id, กรอบ x,y,w,h)
+    ถ้าทั้งคู่มี track ต้องเป็น track เดียวกัน นอกนั้นใช้ IoU ของกรอบ (region=None คือไม่ทราบตำแหน่ง)
+    """
+    if a is None or b is None:
+        return a is None and b is None
+    if a[0] != b[0]:
+        return False
+    if a[1] is not None and b[1] is not None:
+        return a[1] == b[1]
+    return box_iou(a[2], b[2]) >= min_iou
+
+
+class PerceptualHashCache:
+    """
+    cache แบบ LRU ที่ค้นหาด้วย Hamming distance ของ hash
+
+    - hit เมื่อมี key ที่ต่างกันไม่เกิน max_distance บิต ยังไม่หมดอายุ และมาจากตำแหน่งเดียวกัน
+      (track เดียวกัน หรือกรอบใบหน้าซ้อนกันอย่างน้อย min_iou ในกล้องเดียวกัน) เพื่อไม่ให้ใบหน้าที่ hash
+      คล้ายกันของอีกคนได้ผลของคนเดิม รายการที่หมดอายุถูกข้ามและลบทิ้งระหว่างค้นหา
+    - ผลที่จับคู่ได้อยู่ได้ ttl วินาที ผลที่จับคู่ไม่ได้ (None) อยู่ได้ negative_ttl วินาที
+    """
+
+    def __init__(self, max_entries=256, ttl=30.0, negative_ttl=5.0, max_distance=2, min_iou=0.3):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_distance = max_distance
+        self.min_iou = min_iou
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (hash, region) -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, region=None, now=None):
+        """คืนค่า (found, value) ของรายการที่ใกล้ที่สุดที่ยังไม่หมดอายุในตำแหน่งเดียวกัน"""
+        now = time.time() if now is None else now
+        with self._lock:
+            best_entry, best_distance = None, self.max_distance + 1
+            expired = []
+            for entry, (expires_at, _) in self._entries.items():
+                if expires_at < now:
+                    expired.append(entry)
+                    continue
+                distance = (key ^ entry[0]).bit_count()
+                if distance < best_distance and same_region(region, entry[1], self.min_iou):
+                    best_entry, best_distance = entry, distance
+            for entry in expired:
+                del self._entries[entry]
+
+            if best_entry is not None:
+                self._entries.move_to_end(best_entry)
+                self.hits += 1
+                return True, self._entries[best_entry][1]
+
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value, region=None, now=None):
+        now = time.time() if now is None else now
+        ttl = self.ttl if value is not None else self.negative_ttl
+        with self._lock:
+            self._entries[(key, region)] = (now + ttl, value)
+            self._entries.move_to_end((key, region))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'size': len(self._entries),
+            }
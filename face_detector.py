@@ -0,0 +1,233 @@
+"""
+ตัวตรวจจับใบหน้าแบบเลือก backend ได้ พร้อมการตรวจจับบนภาพย่อขนาด
+
+- haar: Haar cascade ของ OpenCV (แบบเดิม)
+- lbp: LBP cascade (เร็วกว่า Haar แต่แม่นยำน้อยกว่าเล็กน้อย)
+- yunet: OpenCV DNN FaceDetectorYN (ต้องมีไฟล์โมเดล .onnx)
+- ssd: OpenCV DNN ResNet-10 SSD (ต้องมีไฟล์ prototxt และ caffemodel)
+
+ภาพจะถูกย่อให้กว้างไม่เกิน detect_width ก่อนตรวจจับ แล้วแปลงกรอบกลับเป็นพิกัดของภาพเต็ม
+
+รัน benchmark บนชุดภาพ:
+    python face_detector.py --benchmark ภาพ/ --labels labels.json --backends haar,lbp,yunet
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+import cv2
+import numpy as np
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class CascadeBackend:
+    """ตรวจจับด้วย cascade classifier (Haar หรือ LBP)"""
+
+    def __init__(self, cascade_path, scale_factor=1.1, min_neighbors=4):
+        self.cascade = cv2.CascadeClassifier(str(cascade_path))
+        if self.cascade.empty():
+            raise Exception(f"ไม่สามารถโหลด cascade: {cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def detect(self, image, min_size):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        return self.cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors,
+                                             minSize=(min_size, min_size))
+
+
+class YuNetBackend:
+    """ตรวจจับด้วย OpenCV FaceDetectorYN (YuNet)"""
+
+    def __init__(self, model_path, score_threshold=0.6):
+        if not Path(model_path).exists():
+            raise Exception(f"ไม่พบไฟล์โมเดล YuNet: {model_path}")
+        self.net = cv2.FaceDetectorYN.create(str(model_path), "", (320, 320), score_threshold)
+        self.input_size = None
+
+    def detect(self, image, min_size):
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        size = (image.shape[1], image.shape[0])
+        if size != self.input_size:
+            self.net.setInputSize(size)
+            self.input_size = size
+        _, faces = self.net.detect(image)
+        if faces is None:
+            return []
+        width, height = size
+        boxes = []
+        # YuNet คืนกรอบของใบหน้าที่ชิดขอบภาพเกินออกนอกภาพได้ (x, y ติดลบ) จึงตัดให้อยู่ในภาพเหมือน SSD
+        for x, y, w, h in faces[:, :4].astype(int):
+            x1, y1 = max(0, x), max(0, y)
+            w, h = min(width, x + w) - x1, min(height, y + h) - y1
+            if w > 0 and h > 0 and w >= min_size and h >= min_size:
+                boxes.append((int(x1), int(y1), int(w), int(h)))
+        return boxes
+
+
+class SSDBackend:
+    """ตรวจจับด้วย OpenCV DNN ResNet-10 SSD (res10_300x300)"""
+
+    def __init__(self, prototxt_path, model_path, confidence=0.6):
+        if not Path(prototxt_path).exists() or not Path(model_path).exists():
+            raise Exception(f"ไม่พบไฟล์โมเดล SSD: {prototxt_path}, {model_path}")
+        self.net = cv2.dnn.readNetFromCaffe(str(prototxt_path), str(model_path))
+        self.confidence = confidence
+
+    def detect(self, image, min_size):
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        height, width = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+        boxes = []
+        for detection in detections:
+            if detection[2] < self.confidence:
+                continue
+            x1, y1, x2, y2 = (detection[3:7] * np.array([width, height, width, height])).astype(int)
+            x1, y1 = max(0, x1), max(0, y1)
+            w, h = min(width, x2) - x1, min(height, y2) - y1
+            if w >= min_size and h >= min_size:
+                boxes.append((x1, y1, w, h))
+        return boxes
+
+
+class FaceDetector:
+    """
+    ตัวตรวจจับใบหน้าที่ย่อภาพก่อนตรวจจับ
+
+    สร้าง backend แยกต่อ thread เพราะ cascade และ DNN ของ OpenCV ไม่ปลอดภัยเมื่อใช้ร่วมกันหลาย thread
+    min_size เป็นขนาดใบหน้าเล็กที่สุด (พิกเซลของภาพเต็ม)
+    """
+
+    def __init__(self, name, backend_factory, detect_width=640, min_size=40):
+        self.name = name
+        self.backend_factory = backend_factory
+        self.detect_width = detect_width
+        self.min_size = min_size
+        self._local = threading.local()
+        # สร้าง backend ของ thread นี้ทันที เพื่อให้ error จากไฟล์โมเดลเกิดตอนเริ่มระบบ
+        self._backend()
+
+    def _backend(self):
+        backend = getattr(self._local, 'backend', None)
+        if backend is None:
+            backend = self._local.backend = self.backend_factory()
+        return backend
+
+    def detect(self, frame):
+        """คืนค่ารายการกรอบใบหน้า (x, y, w, h) ในพิกัดของภาพเต็ม"""
+        height, width = frame.shape[:2]
+        scale = 1.0
+        image = frame
+        if self.detect_width and width > self.detect_width:
+            scale = self.detect_width / width
+            image = cv2.resize(frame, (self.detect_width, int(height * scale)), interpolation=cv2.INTER_AREA)
+
+        boxes = self._backend().detect(image, max(1, int(self.min_size * scale)))
+        return [tuple(int(round(v / scale)) for v in box) for box in boxes]
+
+
+def create_detector(backend='haar', detect_width=640, min_size=40, scale_factor=1.1, min_neighbors=4,
+                    haar_cascade=None, lbp_cascade=None, yunet_model=None,
+                    ssd_prototxt=None, ssd_model=None, confidence=0.6):
+    """สร้างตัวตรวจจับใบหน้าตามชื่อ backend"""
+    if backend == 'lbp':
+        factory = lambda: CascadeBackend(lbp_cascade, scale_factor, min_neighbors)
+    elif backend == 'yunet':
+        factory = lambda: YuNetBackend(yunet_model, confidence)
+    elif backend == 'ssd':
+        factory = lambda: SSDBackend(ssd_prototxt, ssd_model, confidence)
+    else:
+        if backend != 'haar':
+            logger.warning(f"ไม่รู้จัก detector '{backend}' ใช้ haar แทน")
+            backend = 'haar'
+        cascade = haar_cascade or cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        factory = lambda: CascadeBackend(cascade, scale_factor, min_neighbors)
+    return FaceDetector(backend, factory, detect_width, min_size)
+
+
+def _box_iou(a, b):
+    ix = max(0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    intersection = ix * iy
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def benchmark(image_dir, labels=None, detectors=()):
+    """
+    วัดความเร็ว (ภาพต่อวินาที) และ recall ของแต่ละ detector บนชุดภาพ
+
+    labels: dict ชื่อไฟล์ -> รายการกรอบ [x, y, w, h] ที่ถูกต้อง (IoU >= 0.5 ถือว่าตรวจพบ)
+    ถ้าไม่มี labels จะถือว่าทุกภาพมีใบหน้าอย่างน้อย 1 ใบ และวัด recall เป็นสัดส่วนภาพที่ตรวจพบใบหน้า
+    """
+    paths = sorted(p for p in Path(image_dir).iterdir() if p.suffix.lower() in ('.jpg', '.jpeg', '.png'))
+    images = [(p.name, cv2.imread(str(p))) for p in paths]
+    images = [(name, image) for name, image in images if image is not None]
+
+    results = []
+    for detector in detectors:
+        found = expected = detections = 0
+        started = time.perf_counter()
+        for name, image in images:
+            boxes = detector.detect(image)
+            detections += len(boxes)
+            if labels is not None:
+                truth = labels.get(name, [])
+                expected += len(truth)
+                found += sum(any(_box_iou(t, b) >= 0.5 for b in boxes) for t in truth)
+            else:
+                expected += 1
+                found += 1 if len(boxes) else 0
+        elapsed = time.perf_counter() - started
+        results.append({
+            'backend': detector.name,
+            'detect_width': detector.detect_width,
+            'images': len(images),
+            'images_per_sec': round(len(images) / elapsed, 2) if elapsed else None,
+            'detections': detections,
+            'recall': round(found / expected, 4) if expected else None,
+        })
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Face detector benchmark')
+    parser.add_argument('--benchmark', metavar='IMAGE_DIR')
+    parser.add_argument('--labels', help='ไฟล์ JSON: ชื่อไฟล์ -> [[x, y, w, h], ...]')
+    parser.add_argument('--backends', default='haar,lbp,yunet,ssd')
+    parser.add_argument('--detect-width', type=int, default=640)
+    parser.add_argument('--min-size', type=int, default=40)
+    parser.add_argument('--lbp-cascade', default='models/lbpcascade_frontalface_improved.xml')
+    parser.add_argument('--yunet-model', default='models/face_detection_yunet_2023mar.onnx')
+    parser.add_argument('--ssd-prototxt', default='models/deploy.prototxt')
+    parser.add_argument('--ssd-model', default='models/res10_300x300_ssd_iter_140000.caffemodel')
+    args = parser.parse_args()
+
+    if not args.benchmark:
+        parser.print_help()
+    else:
+        labels = None
+        if args.labels:
+            with open(args.labels, 'r', encoding='utf-8') as f:
+                labels = json.load(f)
+
+        detectors = []
+        for backend in args.backends.split(','):
+            try:
+                detectors.append(create_detector(
+                    backend.strip(), args.detect_width, args.min_size,
+                    lbp_cascade=args.lbp_cascade, yunet_model=args.yunet_model,
+                    ssd_prototxt=args.ssd_prototxt, ssd_model=args.ssd_model
+                ))
+            except Exception as e:
+                print(json.dumps({'backend': backend, 'error': str(e)}, ensure_ascii=False))
+
+        for row in benchmark(args.benchmark, labels, detectors):
+            print(json.dumps(row))
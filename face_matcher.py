@@ -0,0 +1,454 @@
+"""
+ตัวจับคู่ใบหน้า (matcher) ที่ AttendanceSystem ใช้ระบุตัวนักศึกษาจากภาพใบหน้า
+
+- CompareFacesMatcher: วิธีเดิม เรียก compare_faces ทีละนักศึกษา
+- CollectionMatcher: index ใบหน้าลง Rekognition collection ครั้งเดียว แล้วค้นหา 1:N ด้วย search_faces_by_image
+- LocalEmbeddingMatcher: เทียบ embedding ของใบหน้ากับทุกคนในเครื่อง ไม่ต้องใช้เครือข่าย
+"""
+import configparser
+import cv2
+import hashlib
+import logging
+import threading
+import numpy as np
+from pathlib import Path
+from vector_index import FlatIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = 'models/face_recognition_sface_2021dec.onnx'
+
+
+def configured_embedding_model(config_file='config.ini'):
+    """
+    ไฟล์โมเดล embedding ตาม embedding_model ใน [SETTINGS] ของ config.ini ของโปรแกรมกล้อง
+
+    web app และ enrollment.py อ่านค่าจากที่เดียวกัน embedding ที่คำนวณตอนลงทะเบียนรูปจึงมาจากโมเดลเดียวกับ
+    ที่ LocalEmbeddingMatcher ใช้
+    """
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return config.get('SETTINGS', 'embedding_model', fallback=DEFAULT_EMBEDDING_MODEL)
+
+
+def file_sha256(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def encode_face_image(frame, max_width=640):
+    """ลดขนาดภาพและแปลงเป็น JPEG bytes สำหรับส่งไปยัง Rekognition"""
+    height, width = frame.shape[:2]
+    if width > max_width:
+        scale = max_width / width
+        frame = cv2.resize(frame, (int(width * scale), int(height * scale)))
+
+    _, img_encoded = cv2.imencode('.jpg', frame)
+    return img_encoded.tobytes()
+
+
+class FaceMatcher:
+    """คลาสพื้นฐานของ matcher ทุกแบบ"""
+
+    def match(self, roi):
+        """คืนค่า student_id ของใบหน้าใน roi หรือ None ถ้าไม่พบ"""
+        raise NotImplementedError
+
+    def sync(self, student_ids, versions=None):
+        """
+        ปรับข้อมูลภายใน matcher ให้ตรงกับรายชื่อนักศึกษาปัจจุบัน
+        versions คือ {student_id: เวอร์ชันของรูปลงทะเบียน} (AttendanceStore.enrollment_versions)
+        นักศึกษาที่เวอร์ชันต่างจากที่ index ไว้จะถูกแทนที่ด้วยรูปใหม่
+        """
+
+    def update(self, added, removed, changed=(), versions=None):
+        """ปรับข้อมูลภายใน matcher เฉพาะนักศึกษาที่ถูกเพิ่ม ลบ หรือลงทะเบียนรูปใหม่ (changed)"""
+
+
+class CompareFacesMatcher(FaceMatcher):
+    """จับคู่แบบเดิม: เรียก compare_face กับนักศึกษาทีละคนจนกว่าจะพบ"""
+
+    def __init__(self, compare_face, get_student_ids):
+        self.compare_face = compare_face
+        self.get_student_ids = get_student_ids
+
+    def match(self, roi):
+        for student_id in self.get_student_ids():
+            if self.compare_face(student_id, roi):
+                return student_id
+        return None
+
+
+def short_version(version):
+    """เวอร์ชันของรูปลงทะเบียนแบบสั้น (16 ตัวแรกของ sha256) ที่เก็บไว้ใน ExternalImageId ของ collection"""
+    return version[:16] if version else None
+
+
+class CollectionMatcher(FaceMatcher):
+    """
+    จับคู่ด้วย Rekognition collection: ค้นหาใบหน้า 1 ครั้งต่อ 1 ใบหน้า ไม่ว่าจะมีนักศึกษากี่คน
+
+    ExternalImageId ของแต่ละใบหน้าคือ student_id:เวอร์ชันของรูป (เช่น student_378:9f86d081884c7d65)
+    collection ที่อยู่ข้ามการเริ่มระบบใหม่จึงรู้ว่าใบหน้าไหน index จากรูปเก่าและต้องแทนที่
+    """
+
+    def __init__(self, rekognition, collection_id, s3_bucket, similarity_threshold):
+        self.rekognition = rekognition
+        self.collection_id = collection_id
+        self.s3_bucket = s3_bucket
+        self.similarity_threshold = similarity_threshold
+        self.face_ids = {}  # student_id -> [face_id, ...]
+        self.versions = {}  # student_id -> เวอร์ชันแบบสั้นของรูปที่ index ไว้
+
+    def ensure_collection(self):
+        """สร้าง collection ถ้ายังไม่มี แล้วโหลดรายการใบหน้าที่ index ไว้แล้ว"""
+        try:
+            self.rekognition.create_collection(CollectionId=self.collection_id)
+            logger.info(f"สร้าง Rekognition collection ใหม่: {self.collection_id}")
+        except self.rekognition.exceptions.ResourceAlreadyExistsException:
+            pass
+
+        self.face_ids = {}
+        self.versions = {}
+        kwargs = {'CollectionId': self.collection_id, 'MaxResults': 1000}
+        while True:
+            response = self.rekognition.list_faces(**kwargs)
+            for face in response.get('Faces', []):
+                student_id, _, version = (face.get('ExternalImageId') or '').partition(':')
+                self.face_ids.setdefault(student_id, []).append(face['FaceId'])
+                self.versions[student_id] = version or None
+            if 'NextToken' not in response:
+                break
+            kwargs['NextToken'] = response['NextToken']
+        logger.info(f"พบใบหน้าใน collection {self.collection_id}: {len(self.face_ids)} คน")
+
+    def add_student(self, student_id, version=None):
+        """index รูปนักศึกษาจาก S3 ลงใน collection (แทนที่รายการ face_ids เดิมของนักศึกษาคนนี้)"""
+        version = short_version(version)
+        try:
+            response = self.rekognition.index_faces(
+                CollectionId=self.collection_id,
+                Image={'S3Object': {'Bucket': self.s3_bucket, 'Name': f'students/{student_id}.jpg'}},
+                ExternalImageId=f'{student_id}:{version}' if version else student_id,
+                MaxFaces=1,
+                QualityFilter='AUTO'
+            )
+        except self.rekognition.exceptions.InvalidS3ObjectException as e:
+            logger.error(f"Error accessing S3 object for {student_id}: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"ไม่สามารถ index ใบหน้าของ {student_id}: {e}")
+            return False
+
+        records = response.get('FaceRecords', [])
+        if not records:
+            logger.warning(f"ไม่พบใบหน้าในรูปของ {student_id}")
+            return False
+        self.face_ids[student_id] = [record['Face']['FaceId'] for record in records]
+        self.versions[student_id] = version
+        logger.info(f"index ใบหน้าของ {student_id} ลง collection สำเร็จ")
+        return True
+
+    def _delete_faces(self, student_id, face_ids):
+        if not face_ids:
+            return
+        try:
+            self.rekognition.delete_faces(CollectionId=self.collection_id, FaceIds=face_ids)
+            logger.info(f"ลบใบหน้าของ {student_id} ออกจาก collection สำเร็จ")
+        except Exception as e:
+            logger.error(f"ไม่สามารถลบใบหน้าของ {student_id} ออกจาก collection: {e}")
+
+    def remove_student(self, student_id):
+        """ลบใบหน้าของนักศึกษาออกจาก collection"""
+        self.versions.pop(student_id, None)
+        self._delete_faces(student_id, self.face_ids.pop(student_id, []))
+
+    def replace_student(self, student_id, version=None):
+        """index รูปใหม่ก่อนแล้วจึงลบใบหน้าจากรูปเดิม (ระหว่างนั้นยังจับคู่ด้วยใบหน้าเดิมได้)"""
+        old_face_ids = self.face_ids.get(student_id, [])
+        if self.add_student(student_id, version):
+            self._delete_faces(student_id, old_face_ids)
+
+    def update(self, added, removed, changed=(), versions=None):
+        versions = versions or {}
+        for student_id in removed:
+            self.remove_student(student_id)
+        for student_id in added:
+            if student_id not in self.face_ids:
+                self.add_student(student_id, versions.get(student_id))
+        for student_id in changed:
+            self.replace_student(student_id, versions.get(student_id))
+
+    def sync(self, student_ids, versions=None):
+        wanted = set(student_ids)
+        for student_id in list(self.face_ids):
+            if student_id not in wanted:
+                self.remove_student(student_id)
+        for student_id in student_ids:
+            if student_id not in self.face_ids:
+                self.add_student(student_id, (versions or {}).get(student_id))
+            elif versions is not None and self.versions.get(student_id) != short_version(versions.get(student_id)):
+                self.replace_student(student_id, versions.get(student_id))
+
+    def match(self, roi):
+        try:
+            response = self.rekognition.search_faces_by_image(
+                CollectionId=self.collection_id,
+                Image={'Bytes': encode_face_image(roi)},
+                FaceMatchThreshold=self.similarity_threshold,
+                MaxFaces=1
+            )
+        except self.rekognition.exceptions.InvalidParameterException as e:
+            # Rekognition ไม่พบใบหน้าในภาพที่ส่งไป
+            logger.debug(f"ค้นหาใบหน้าใน collection ไม่ได้: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"ไม่สามารถค้นหาใบหน้าใน collection: {e}")
+            return None
+
+        matches = response.get('FaceMatches', [])
+        if not matches:
+            return None
+        return (matches[0]['Face'].get('ExternalImageId') or '').partition(':')[0] or None
+
+
+class FaceEmbedder:
+    """
+    คำนวณ embedding ของใบหน้า (เวกเตอร์ที่ normalize แล้ว)
+
+    ใช้โมเดล SFace ของ OpenCV ถ้ามีไฟล์โมเดล ไม่เช่นนั้นใช้ภาพ grayscale ขนาด 32x32
+    ซึ่งแม่นยำน้อยกว่าแต่ไม่ต้องพึ่งไฟล์เพิ่ม
+
+    name ระบุโมเดลที่ใช้ (รวม hash ของไฟล์โมเดล) และถูกเก็บคู่กับ embedding ทุกชุด
+    embedding ที่คำนวณด้วยโมเดลอื่นจึงไม่ถูกนำมาใช้ปนกัน
+    """
+
+    def __init__(self, model_path=None):
+        self.recognizer = None
+        self.name = 'pixel32'
+        if model_path and Path(model_path).exists():
+            try:
+                self.recognizer = cv2.FaceRecognizerSF.create(str(model_path), "")
+                self.name = f'sface:{Path(model_path).name}:{file_sha256(model_path)[:12]}'
+            except Exception as e:
+                logger.error(f"ไม่สามารถโหลดโมเดล embedding {model_path}: {e}")
+        elif model_path:
+            logger.warning(f"ไม่พบไฟล์โมเดล embedding {model_path} ใช้ embedding แบบ pixel แทน")
+
+    def embed(self, face):
+        """คืนค่า embedding (float32, ความยาว 1) ของภาพใบหน้า BGR"""
+        if self.recognizer is not None:
+            feature = self.recognizer.feature(cv2.resize(face, (112, 112))).flatten().astype(np.float32)
+        else:
+            gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY) if face.ndim == 3 else face
+            gray = cv2.equalizeHist(cv2.resize(gray, (32, 32)))
+            feature = gray.astype(np.float32).flatten()
+            feature -= feature.mean()
+
+        norm = np.linalg.norm(feature)
+        return feature / norm if norm > 0 else feature
+
+
+def encode_embedding(embedding):
+    """แปลง embedding เป็น bytes (float32) สำหรับเก็บในฐานข้อมูล"""
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+
+def decode_embedding(data):
+    return np.frombuffer(data, dtype=np.float32).copy()
+
+
+def crop_largest_face(image, detector):
+    """ตัดเฉพาะใบหน้าที่ใหญ่ที่สุดในภาพด้วย detector (face_detector.FaceDetector) ถ้าไม่พบใบหน้าจะคืนภาพเดิม"""
+    faces = detector.detect(image)
+    if len(faces) == 0:
+        return image
+    x, y, w, h = max(faces, key=lambda box: box[2] * box[3])
+    return image[y:y + h, x:x + w]
+
+
+def make_photo_loader(photo_dir, s3=None, s3_bucket=None):
+    """
+    สร้างฟังก์ชันโหลดรูปนักศึกษา: อ่านจาก photo_dir ก่อน ถ้าไม่มีจะดาวน์โหลดจาก S3 มาเก็บไว้
+    load_photo(student_id, refresh=True) ดาวน์โหลดใหม่แทนการใช้รูปที่เก็บไว้
+    load_photo(student_id, version=sha256) ดาวน์โหลดใหม่ถ้ารูปที่เก็บไว้ไม่ใช่รูปเวอร์ชันนั้น (ลงทะเบียนรูปใหม่แล้ว)
+    """
+    photo_dir = Path(photo_dir)
+    photo_dir.mkdir(parents=True, exist_ok=True)
+
+    def load_photo(student_id, refresh=False, version=None):
+        photo_file = photo_dir / f'{student_id}.jpg'
+        if version and photo_file.exists() and file_sha256(photo_file) != version:
+            refresh = True
+        if refresh:
+            # ลงทะเบียนรูปใหม่: รูปที่เก็บไว้ในเครื่องเป็นรูปเก่า ไม่นำมาคำนวณ embedding แม้จะดาวน์โหลดรูปใหม่ไม่ได้
+            if s3 is None:
+                logger.warning(f"รูปของ {student_id} ในเครื่องไม่ใช่รูปลงทะเบียนล่าสุด และไม่ได้เชื่อมต่อ S3")
+                return None
+            photo_file.unlink(missing_ok=True)
+        if not photo_file.exists() and s3 is not None:
+            try:
+                s3.download_file(s3_bucket, f'students/{student_id}.jpg', str(photo_file))
+            except Exception as e:
+                logger.error(f"ไม่สามารถดาวน์โหลดรูปของ {student_id} จาก S3: {e}")
+                return None
+        if not photo_file.exists():
+            return None
+        return cv2.imread(str(photo_file))
+
+    return load_photo
+
+
+class LocalEmbeddingMatcher(FaceMatcher):
+    """
+    จับคู่ใบหน้าในเครื่องด้วย embedding
+
+    เก็บ embedding ของนักศึกษาทุกคนไว้ใน vector index (FlatIndex = เมทริกซ์ NumPy เดียว,
+    IVFIndex = สำหรับรายชื่อหลักหมื่นคน) แล้วค้นหาคนที่ใกล้ที่สุดในครั้งเดียว
+    ค่าความเหมือนแปลงจาก cosine เป็นเปอร์เซ็นต์ (1 + cos) * 50 เพื่อใช้ similarity_threshold
+    ตัวเดียวกับ Rekognition
+
+    stored_embeddings(model_name, versions) คืนค่า {student_id: embedding} ที่คำนวณไว้แล้วตอนลงทะเบียน
+    เฉพาะที่คำนวณด้วยโมเดล model_name จากรูปเวอร์ชัน versions[student_id] นักศึกษาที่มี embedding อยู่แล้ว
+    จึงไม่ต้องโหลดรูปมาคำนวณใหม่ ส่วน embedding จากโมเดลอื่นหรือรูปเก่าจะถูกคำนวณใหม่จากรูปลงทะเบียน
+
+    ไฟล์ cache เก็บเวอร์ชันของรูปลงทะเบียนคู่กับ embedding แต่ละแถว sync() จึงแทนที่แถวที่มาจากรูปเก่าได้
+    แม้รูปจะถูกเปลี่ยนระหว่างที่ระบบปิดอยู่
+    """
+
+    def __init__(self, embedder, load_photo, detector, similarity_threshold, cache_file, index=None,
+                 stored_embeddings=None):
+        self.embedder = embedder
+        self.load_photo = load_photo
+        self.stored_embeddings = stored_embeddings
+        self.detector = detector
+        self.similarity_threshold = similarity_threshold
+        self.cache_file = Path(cache_file)
+        self.index = index if index is not None else FlatIndex()
+        self.versions = {}  # student_id -> เวอร์ชันของรูปที่ใช้คำนวณ embedding ใน index
+        self._lock = threading.Lock()
+        self.load()
+
+    @property
+    def ids(self):
+        return list(self.index.ids)
+
+    def load(self):
+        """โหลด embedding ที่บันทึกไว้ (ถ้าสร้างจากโมเดลเดียวกัน) เข้า index"""
+        if not self.cache_file.exists():
+            return
+        try:
+            with np.load(self.cache_file, allow_pickle=False) as data:
+                if str(data['model']) != self.embedder.name:
+                    logger.info("โมเดล embedding เปลี่ยนไป จะคำนวณ embedding ใหม่")
+                    return
+                ids = [str(student_id) for student_id in data['ids']]
+                # ไฟล์รุ่นก่อนไม่มี versions: ถือว่าไม่รู้เวอร์ชัน sync() จะอ่าน embedding ใหม่ให้ครั้งเดียว
+                versions = [str(version) for version in data['versions']] if 'versions' in data else [''] * len(ids)
+                if ids:
+                    self.index.add(ids, data['embeddings'].astype(np.float32))
+                self.versions = {student_id: version or None for student_id, version in zip(ids, versions)}
+            logger.info(f"โหลด embedding ของนักศึกษาจากไฟล์สำเร็จ: {len(ids)} คน")
+        except Exception as e:
+            logger.error(f"ไม่สามารถโหลดไฟล์ embedding: {e}")
+
+    def save(self):
+        """บันทึก embedding ลงไฟล์ เพื่อไม่ต้องคำนวณใหม่ตอนเริ่มระบบ"""
+        try:
+            with self._lock:
+                ids, matrix = list(self.index.ids), self.index.vectors().copy()
+                versions = [self.versions.get(student_id) or '' for student_id in ids]
+            tmp_file = self.cache_file.with_suffix('.tmp.npz')
+            np.savez(tmp_file, ids=np.array(ids, dtype=str), embeddings=matrix,
+                     versions=np.array(versions, dtype=str), model=np.array(self.embedder.name))
+            tmp_file.replace(self.cache_file)
+        except Exception as e:
+            logger.error(f"ไม่สามารถบันทึกไฟล์ embedding: {e}")
+
+    def compute_embedding(self, student_id, refresh=False, version=None):
+        """
+        คำนวณ embedding จากรูปลงทะเบียนของนักศึกษา (refresh=True คือโหลดรูปใหม่ ไม่ใช้รูปที่เก็บไว้
+        version คือเวอร์ชันของรูปที่ต้องการ รูปที่เก็บไว้ที่ไม่ใช่เวอร์ชันนี้จะถูกโหลดใหม่)
+        """
+        image = self.load_photo(student_id, refresh=refresh, version=version)
+        if image is None:
+            logger.warning(f"ไม่พบรูปลงทะเบียนของ {student_id}")
+            return None
+        return self.embedder.embed(crop_largest_face(image, self.detector))
+
+    def add_students(self, student_ids, versions=None, refresh=False):
+        """
+        คำนวณ embedding แล้วเพิ่มเข้า index ทีละส่วน (ไม่สร้าง index ใหม่ทั้งหมด)
+        นักศึกษาที่มีอยู่แล้วจะถูกแทนที่ (refresh=True เมื่อลงทะเบียนรูปใหม่ เพื่อไม่ใช้รูปเก่าที่เก็บไว้)
+        """
+        versions = versions or {}
+        added = {}
+        stored = {}
+        if self.stored_embeddings is not None and student_ids:
+            try:
+                stored = self.stored_embeddings(self.embedder.name,
+                                                {student_id: versions.get(student_id) for student_id in student_ids})
+            except Exception as e:
+                logger.error(f"ไม่สามารถอ่าน embedding ที่บันทึกไว้: {e}")
+        for student_id in student_ids:
+            embedding = stored.get(student_id)
+            if embedding is None:
+                embedding = self.compute_embedding(student_id, refresh=refresh, version=versions.get(student_id))
+            if embedding is not None:
+                added[student_id] = embedding
+        if added:
+            with self._lock:
+                # FlatIndex.add แทนที่เวกเตอร์เดิมของ id ที่มีอยู่แล้ว
+                self.index.add(list(added), np.vstack(list(added.values())))
+                self.versions.update({student_id: versions.get(student_id) for student_id in added})
+        return list(added)
+
+    def remove_students(self, student_ids):
+        """ลบ embedding ของนักศึกษาออกจาก index"""
+        with self._lock:
+            self.index.remove(student_ids)
+            for student_id in student_ids:
+                self.versions.pop(student_id, None)
+
+    def update(self, added, removed, changed=(), versions=None):
+        with self._lock:
+            known = set(self.index.ids)
+        removed = [student_id for student_id in removed if student_id in known]
+        if removed:
+            self.remove_students(removed)
+        added = self.add_students([student_id for student_id in added if student_id not in known], versions)
+        # รวมนักศึกษาที่เพิ่งมีรูปครั้งแรก (ยังไม่อยู่ใน index) ด้วย
+        replaced = self.add_students(list(changed), versions, refresh=True)
+        if added or removed or replaced:
+            self.save()
+
+    def sync(self, student_ids, versions=None):
+        wanted = set(student_ids)
+        with self._lock:
+            known = set(self.index.ids)
+            current = dict(self.versions)
+        removed = list(known - wanted)
+        added = self.add_students(list(dict.fromkeys(sid for sid in student_ids if sid not in known)), versions)
+        replaced = []
+        if versions is not None:
+            replaced = self.add_students([sid for sid in dict.fromkeys(student_ids)
+                                          if sid in known and current.get(sid) != versions.get(sid)],
+                                         versions, refresh=True)
+
+        if not removed and not added and not replaced:
+            return
+        if removed:
+            self.remove_students(removed)
+        logger.info(f"อัพเดท embedding: เพิ่ม {len(added)} คน แทนที่ {len(replaced)} คน ลบ {len(removed)} คน")
+        self.save()
+
+    def match(self, roi):
+        query = self.embedder.embed(roi)
+        with self._lock:
+            results = self.index.search(query, 1)
+        if not results:
+            return None
+
+        student_id, cosine = results[0]
+        if (cosine + 1.0) * 50.0 >= self.similarity_threshold:
+            return student_id
+        return None
@@ -0,0 +1,114 @@
+"""
+คัดกรองคุณภาพภาพใบหน้าก่อนส่งไประบุตัว เพื่อไม่เสียการเรียก API กับภาพที่ไม่มีทางจับคู่ได้
+"""
+import logging
+import threading
+import time
+import cv2
+import numpy as np
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+def measure_quality(roi):
+    """วัดคุณภาพภาพใบหน้า: ขนาด ความคมชัด (Laplacian variance) ความสว่าง คอนทราสต์ และความไม่สมมาตร (มุมหน้า)"""
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+    small = cv2.resize(gray, (64, 64), interpolation=cv2.INTER_AREA)
+    # หน้าตรงจะเกือบสมมาตรซ้าย-ขวา หน้าหันข้างจะต่างกันมาก
+    mirrored = cv2.flip(small, 1)
+    asymmetry = float(np.mean(cv2.absdiff(small, mirrored))) / 255.0
+    return {
+        'size': min(gray.shape[:2]),
+        'sharpness': float(cv2.Laplacian(small, cv2.CV_64F).var()),
+        'brightness': float(small.mean()),
+        'contrast': float(small.std()),
+        'asymmetry': asymmetry,
+    }
+
+
+class FaceQualityGate:
+    """
+    ตัวกรองคุณภาพใบหน้า
+
+    - ภาพที่ไม่ผ่านเกณฑ์จะถูกนับตามเหตุผล (too_small, blurry, too_dark, too_bright, low_contrast, pose)
+    - เก็บภาพที่คุณภาพดีที่สุดของแต่ละ track ภายในช่วง window วินาที และใช้ภาพนั้นในการระบุตัว
+    """
+
+    def __init__(self, min_size=60, min_sharpness=30.0, min_brightness=40.0, max_brightness=220.0,
+                 min_contrast=20.0, max_asymmetry=0.25, window=3.0, log_interval=60.0):
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_contrast = min_contrast
+        self.max_asymmetry = max_asymmetry
+        self.window = window
+        self.log_interval = log_interval
+        self.passed = 0
+        self.rejections = Counter()
+        self._best = {}  # track_id -> (score, roi, window_started_at)
+        self._last_log = time.time()
+        self._lock = threading.Lock()
+
+    def check(self, roi):
+        """คืนค่า (score, reasons) โดย reasons ว่างถ้าผ่านทุกเกณฑ์"""
+        quality = measure_quality(roi)
+        reasons = []
+        if quality['size'] < self.min_size:
+            reasons.append('too_small')
+        if quality['sharpness'] < self.min_sharpness:
+            reasons.append('blurry')
+        if quality['brightness'] < self.min_brightness:
+            reasons.append('too_dark')
+        elif quality['brightness'] > self.max_brightness:
+            reasons.append('too_bright')
+        if quality['contrast'] < self.min_contrast:
+            reasons.append('low_contrast')
+        if quality['asymmetry'] > self.max_asymmetry:
+            reasons.append('pose')
+
+        score = quality['sharpness'] * min(1.0, quality['size'] / (2.0 * self.min_size)) * (1.0 - quality['asymmetry'])
+        return score, reasons
+
+    def select(self, roi, track_id=None, now=None):
+        """
+        คืนภาพใบหน้าที่ควรส่งไประบุตัว: ภาพที่ดีที่สุดของ track ในช่วง window (รวมภาพนี้)
+        หรือ None ถ้ายังไม่มีภาพที่ผ่านเกณฑ์
+        """
+        now = time.time() if now is None else now
+        score, reasons = self.check(roi)
+
+        with self._lock:
+            if reasons:
+                self.rejections.update(reasons)
+            else:
+                self.passed += 1
+            self._maybe_log(now)
+
+            if track_id is None:
+                return None if reasons else roi
+
+            best = self._best.get(track_id)
+            if best is not None and now - best[2] > self.window:
+                best = None
+            if not reasons and (best is None or score > best[0]):
+                best = (score, roi.copy(), best[2] if best else now)
+            if best is None:
+                self._best.pop(track_id, None)
+                return None
+            self._best[track_id] = best
+
+            # ลบข้อมูลของ track ที่หมดช่วงเวลาแล้ว
+            for old_id in [tid for tid, (_, _, started) in self._best.items() if now - started > self.window * 2]:
+                del self._best[old_id]
+            return best[1]
+
+    def _maybe_log(self, now):
+        if now - self._last_log >= self.log_interval and (self.rejections or self.passed):
+            self._last_log = now
+            logger.info(f"คัดกรองคุณภาพใบหน้า: ผ่าน {self.passed} ไม่ผ่าน {dict(self.rejections)}")
+
+    def stats(self):
+        with self._lock:
+            return {'passed': self.passed, 'rejected': dict(self.rejections)}
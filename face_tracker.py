@@ -0,0 +1,111 @@
+"""
+ติดตามใบหน้าข้ามเฟรมด้วย IoU เพื่อไม่ต้องส่งใบหน้าคนเดิมไประบุตัวซ้ำทุกรอบการสแกน
+"""
+import itertools
+import threading
+import time
+
+
+def box_iou(a, b):
+    """คำนวณ Intersection over Union ของกรอบ (x, y, w, h) สองกรอบ"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    intersection = ix * iy
+    union = aw * ah + bw * bh - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class Track:
+    """ใบหน้าหนึ่งใบที่ติดตามอยู่ พร้อมผลการระบุตัวที่ cache ไว้"""
+
+    def __init__(self, track_id, box, now):
+        self.track_id = track_id
+        self.box = tuple(int(v) for v in box)
+        self.first_seen = now
+        self.last_seen = now
+        self.identity = None
+        self.identified_at = None
+        self.last_attempt = None
+
+
+class FaceTracker:
+    """
+    จับคู่กรอบใบหน้าในเฟรมใหม่กับ track เดิมด้วย IoU (greedy)
+
+    - track ที่ไม่ถูกพบเกิน max_age วินาทีจะถูกลบ
+    - ผลการระบุตัวของ track ใช้ได้นาน identity_ttl วินาที
+    - track ที่ระบุตัวไม่ได้จะลองใหม่ทุก retry_interval วินาที
+    """
+
+    def __init__(self, iou_threshold=0.3, max_age=3.0, identity_ttl=300.0, retry_interval=2.0):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.identity_ttl = identity_ttl
+        self.retry_interval = retry_interval
+        self.tracks = {}
+        self._next_id = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def update(self, boxes, now=None):
+        """อัพเดท track ด้วยกรอบใบหน้าชุดใหม่ คืนค่ารายการ Track ตามลำดับ boxes"""
+        now = time.time() if now is None else now
+        with self._lock:
+            # ลบ track ที่หายไปนานแล้ว
+            for track_id in [tid for tid, t in self.tracks.items() if now - t.last_seen > self.max_age]:
+                del self.tracks[track_id]
+
+            candidates = sorted(
+                ((box_iou(box, track.box), i, track_id)
+                 for i, box in enumerate(boxes)
+                 for track_id, track in self.tracks.items()),
+                reverse=True
+            )
+            assigned = [None] * len(boxes)
+            used_tracks = set()
+            for iou, i, track_id in candidates:
+                if iou < self.iou_threshold:
+                    break
+                if assigned[i] is not None or track_id in used_tracks:
+                    continue
+                track = self.tracks[track_id]
+                track.box = tuple(int(v) for v in boxes[i])
+                track.last_seen = now
+                assigned[i] = track
+                used_tracks.add(track_id)
+
+            for i, box in enumerate(boxes):
+                if assigned[i] is None:
+                    track = Track(next(self._next_id), box, now)
+                    self.tracks[track.track_id] = track
+                    assigned[i] = track
+            return assigned
+
+    def cached_identity(self, track, now=None):
+        """คืนค่า student_id ที่ cache ไว้ของ track ถ้ายังไม่หมดอายุ"""
+        now = time.time() if now is None else now
+        if track.identity and now - track.identified_at <= self.identity_ttl:
+            return track.identity
+        return None
+
+    def needs_recognition(self, track, now=None):
+        """track นี้ต้องส่งไประบุตัวหรือไม่ (ยังไม่รู้ตัวตน/cache หมดอายุ และพ้นช่วงรอลองใหม่)"""
+        now = time.time() if now is None else now
+        if self.cached_identity(track, now):
+            return False
+        return track.last_attempt is None or now - track.last_attempt >= self.retry_interval
+
+    def set_identity(self, track, student_id, now=None):
+        """บันทึกผลการระบุตัวของ track (student_id เป็น None ถ้าระบุตัวไม่ได้)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            track.last_attempt = now
+            if student_id:
+                track.identity = student_id
+                track.identified_at = now
+
+    def clear(self):
+        """ล้าง track ทั้งหมด (เช่น เมื่อรีเซ็ตการเช็คชื่อ)"""
+        with self._lock:
+            self.tracks.clear()
@@ -0,0 +1,39 @@
+"""
+metrics สำหรับ Prometheus ผ่าน prometheus_client (pip install prometheus_client)
+
+แต่ละโมดูลสร้าง Counter/Gauge/Histogram ของตัวเองตอน import ซึ่งลงทะเบียนใน prometheus_client.REGISTRY เอง เช่น
+
+    STAGE_SECONDS = Histogram('kiosk_stage_seconds', 'เวลาในแต่ละขั้นตอน', ['stage'])
+    STAGE_SECONDS.labels('detect').observe(0.012)
+
+ค่าที่อ่านจากสถานะของ object ตอนถูก scrape (ความยาวคิว, สถิติของกล้อง) ใช้ CallbackCollector
+กับฟังก์ชันที่ yield metric family (GaugeMetricFamily, CounterMetricFamily) แล้วลงทะเบียนด้วย REGISTRY.register()
+
+โปรแกรมกล้องเปิด endpoint ด้วย prometheus_client.start_http_server() ส่วน web app ให้บริการที่ /metrics
+ผ่าน generate_latest()
+"""
+import logging
+
+from prometheus_client.registry import Collector
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackCollector(Collector):
+    """collector ที่เรียก function() ทุกครั้งที่ถูก scrape (function คืนค่า metric family ของ prometheus_client)"""
+
+    def __init__(self, function):
+        self.function = function
+
+    def collect(self):
+        try:
+            # อ่านค่าทั้งหมดก่อน: ถ้าอ่านไม่สำเร็จกลางทางจะไม่ส่ง metric ครึ่ง ๆ กลาง ๆ
+            families = list(self.function())
+        except Exception as e:
+            logger.error(f"อ่านค่า metric จาก collector ไม่สำเร็จ: {e}")
+            return []
+        return families
+
+    def describe(self):
+        # ไม่เรียก function ตอนลงทะเบียน (สถานะของระบบอาจยังไม่พร้อม)
+        return []
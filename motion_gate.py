@@ -0,0 +1,83 @@
+"""
+ตรวจจับการเคลื่อนไหวบนภาพย่อขนาดเล็ก เพื่อสแกนเฉพาะเมื่อมีคนเข้ามาหน้ากล้อง
+"""
+import threading
+import cv2
+
+
+class MotionGate:
+    """
+    ตรวจการเปลี่ยนแปลงของฉากด้วย background subtraction (running average) บนภาพกว้าง width พิกเซล
+
+    - พิกเซลที่ต่างจาก background เกิน pixel_threshold นับเป็นพิกเซลที่เปลี่ยน
+    - ถ้าสัดส่วนพิกเซลที่เปลี่ยนเกิน motion_ratio ถือว่ามีการเคลื่อนไหว
+    - หลังการเคลื่อนไหวครั้งล่าสุด hold_seconds วินาทีถือว่ายัง active และสแกนทุก active_interval วินาที
+    - เมื่อ idle จะสแกนทุก idle_interval วินาที (0 = ไม่สแกนเลย)
+    """
+
+    def __init__(self, width=64, pixel_threshold=25, motion_ratio=0.01, learning_rate=0.05,
+                 hold_seconds=5.0, active_interval=0.5, idle_interval=0):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.motion_ratio = motion_ratio
+        self.learning_rate = learning_rate
+        self.hold_seconds = hold_seconds
+        self.active_interval = active_interval
+        self.idle_interval = idle_interval
+        self.background = None
+        self.last_motion = None
+        self.last_update = None
+        self.idle_seconds = 0.0
+        self.active_seconds = 0.0
+        self.motion_events = 0
+        self._lock = threading.Lock()
+
+    def update(self, frame, now):
+        """ป้อนเฟรมใหม่ คืนค่า True ถ้าพบการเคลื่อนไหวในเฟรมนี้"""
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, int(height * self.width / width))), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0).astype('float32')
+
+        with self._lock:
+            if self.last_update is not None:
+                elapsed = now - self.last_update
+                if self.is_active(self.last_update):
+                    self.active_seconds += elapsed
+                else:
+                    self.idle_seconds += elapsed
+            self.last_update = now
+
+            if self.background is None:
+                self.background = gray
+                self.last_motion = now
+                return True
+
+            diff = cv2.absdiff(gray, self.background)
+            changed = float((diff > self.pixel_threshold).mean())
+            cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+
+            if changed >= self.motion_ratio:
+                if not self.is_active(now):
+                    self.motion_events += 1
+                self.last_motion = now
+                return True
+            return False
+
+    def is_active(self, now):
+        return self.last_motion is not None and now - self.last_motion <= self.hold_seconds
+
+    def scan_interval(self, now):
+        """ระยะห่างระหว่างการสแกนที่ควรใช้ตอนนี้ (None = ไม่ต้องสแกน)"""
+        if self.is_active(now):
+            return self.active_interval
+        return self.idle_interval or None
+
+    def stats(self):
+        with self._lock:
+            total = self.idle_seconds + self.active_seconds
+            return {
+                'idle_seconds': round(self.idle_seconds, 1),
+                'active_seconds': round(self.active_seconds, 1),
+                'idle_ratio': round(self.idle_seconds / total, 3) if total else 0.0,
+                'motion_events': self.motion_events,
+            }
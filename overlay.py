@@ -0,0 +1,76 @@
+"""
+ชั้นภาพ (overlay) สำหรับวาดข้อความและกรอบทับบนเฟรมที่แสดงผล
+
+ข้อความบนหน้าจอ (เวลา, สถานะ AWS, รายชื่อที่เช็คชื่อแล้ว) เปลี่ยนช้ากว่าอัตราเฟรมมาก
+แต่ cv2.putText ทุกเฟรมกิน CPU ของ thread แสดงผลทุกครั้ง OverlayLayer จึงวาดรายการคำสั่งวาด
+ลงในชั้นภาพที่เก็บไว้เฉพาะเมื่อรายการเปลี่ยน แล้วคัดลอกเฉพาะพิกเซลของตัวอักษร/เส้นลงบนแต่ละเฟรม
+(ผลลัพธ์เหมือนการวาดตรงบนเฟรมทุกพิกเซล เพราะ putText/rectangle ไม่ได้ใช้ anti-aliasing)
+"""
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def draw_annotations(frame, annotations):
+    """วาดกรอบและข้อความผลการสแกนลงบนเฟรม"""
+    for annotation in annotations:
+        if annotation[0] == 'rect':
+            _, (x1, y1, x2, y2), color, thickness = annotation
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness)
+        else:
+            _, text, org, scale, color, thickness = annotation
+            cv2.putText(frame, text, org, cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness)
+    return frame
+
+
+def mask_annotations(annotations):
+    """คำสั่งวาดเดียวกันแต่ใช้สี 255 สำหรับวาดลง mask ช่องเดียว"""
+    return [annotation[:-2] + (255, annotation[-1]) for annotation in annotations]
+
+
+class OverlayLayer:
+    """
+    ชั้นภาพที่วาดไว้ล่วงหน้าของรายการคำสั่งวาดชุดหนึ่ง (รูปแบบเดียวกับ draw_annotations)
+
+    apply(frame, annotations) วาดใหม่เฉพาะเมื่อรายการหรือขนาดเฟรมเปลี่ยน นอกนั้นคัดลอกพิกเซลที่เก็บไว้
+    """
+
+    def __init__(self):
+        self.key = None
+        self.index = None
+        self.pixels = None
+        self.frames = 0
+        self.redraws = 0
+
+    def render(self, shape, annotations):
+        layer = draw_annotations(np.zeros(shape, dtype=np.uint8), annotations)
+        mask = draw_annotations(np.zeros(shape[:2], dtype=np.uint8), mask_annotations(annotations))
+        # เก็บเฉพาะตำแหน่งพิกเซลที่ถูกวาด (ข้อความมีพิกเซลน้อยกว่าทั้งเฟรมมาก)
+        self.index = np.flatnonzero(mask)
+        self.pixels = layer.reshape(len(mask.flat), -1)[self.index]
+        self.redraws += 1
+
+    def apply(self, frame, annotations):
+        key = (frame.shape, tuple(annotations))
+        if key != self.key:
+            self.render(frame.shape, annotations)
+            self.key = key
+        self.frames += 1
+        if not len(self.index):
+            return frame
+        if frame.flags.c_contiguous:
+            frame.reshape(-1, self.pixels.shape[1])[self.index] = self.pixels
+        else:
+            rows, cols = np.unravel_index(self.index, frame.shape[:2])
+            frame[rows, cols] = self.pixels.reshape((-1,) + frame.shape[2:])
+        return frame
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'redraws': self.redraws,
+            'pixels': int(self.index.size) if self.index is not None else 0,
+        }
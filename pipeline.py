@@ -0,0 +1,136 @@
+"""
+ส่วนประกอบของ pipeline ประมวลผลภาพ: คิวเฟรมล่าสุดและสถิติเวลาของแต่ละขั้นตอน
+"""
+import threading
+import time
+from collections import deque
+
+from prometheus_client import Counter, Histogram
+
+# เวลาของขั้นตอนส่วนใหญ่อยู่ในระดับมิลลิวินาที (อ่านภาพ, motion) ถึงวินาที (จับคู่ผ่าน Rekognition)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_SECONDS = Histogram('kiosk_stage_seconds', 'เวลาที่ใช้ในแต่ละขั้นตอนของ pipeline (วินาที)',
+                          ['stage'], buckets=STAGE_BUCKETS)
+PIPELINE_EVENTS = Counter('kiosk_pipeline_events_total',
+                          'ตัวนับเหตุการณ์ของ pipeline (recognition_calls, dropped_scans, ...)', ['event'])
+
+
+class LatestFrameQueue:
+    """
+    คิวเฟรมขนาดจำกัด ถ้าคิวเต็มจะทิ้งเฟรมที่เก่าที่สุด (drop-oldest)
+    เพื่อให้ worker ได้ประมวลผลภาพล่าสุดเสมอ
+
+    per_key จำกัดจำนวนเฟรมต่อ key (เช่นต่อกล้อง) เฟรมใหม่ของกล้องหนึ่งจะแทนที่เฟรมเก่าของกล้องเดียวกัน
+    แทนที่จะดันเฟรมของกล้องอื่นออกจากคิว
+    """
+
+    def __init__(self, maxsize=1, per_key=None):
+        self.maxsize = maxsize
+        self.per_key = per_key
+        self._items = deque()  # (key, item)
+        self._condition = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+        self.total = 0
+
+    def put(self, item, key=None):
+        """ใส่เฟรมลงคิว คืนค่า True ถ้าต้องทิ้งเฟรมเก่าออก"""
+        with self._condition:
+            if self._closed:
+                return False
+            dropped = False
+            if key is not None and self.per_key:
+                same_key = [entry for entry in self._items if entry[0] == key]
+                for entry in same_key[:max(0, len(same_key) - self.per_key + 1)]:
+                    self._items.remove(entry)
+                    self.dropped += 1
+                    dropped = True
+            while len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+                dropped = True
+            self._items.append((key, item))
+            self.total += 1
+            self._condition.notify()
+            return dropped
+
+    def get(self, timeout=None):
+        """ดึงเฟรมออกจากคิว คืนค่า None ถ้าคิวถูกปิดหรือหมดเวลา"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._items or self._closed, timeout):
+                return None
+            if not self._items:
+                return None
+            return self._items.popleft()[1]
+
+    def close(self):
+        """ปิดคิวและปลุก worker ทุกตัวให้ออกจากการรอ"""
+        with self._condition:
+            self._closed = True
+            self._items.clear()
+            self._condition.notify_all()
+
+    def qsize(self):
+        with self._condition:
+            return len(self._items)
+
+
+class PipelineStats:
+    """
+    เก็บเวลาที่ใช้ในแต่ละขั้นตอน (ล่าสุด window ครั้ง) และตัวนับต่าง ๆ ของ pipeline
+    ทุกค่าถูกส่งต่อเข้า kiosk_stage_seconds / kiosk_pipeline_events_total ของ metrics ด้วย
+    """
+
+    def __init__(self, window=500):
+        self.window = window
+        self._latencies = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            samples = self._latencies.setdefault(stage, deque(maxlen=self.window))
+            samples.append(seconds)
+            self._counters[f'{stage}_count'] = self._counters.get(f'{stage}_count', 0) + 1
+        STAGE_SECONDS.labels(stage).observe(seconds)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+        PIPELINE_EVENTS.labels(name).inc(amount)
+
+    def timer(self, stage):
+        """context manager สำหรับจับเวลาขั้นตอน"""
+        return _StageTimer(self, stage)
+
+    def snapshot(self):
+        """คืนค่าสรุปสถิติ: เวลาเฉลี่ย/p50/p95/สูงสุด (ms) ของแต่ละขั้นตอน และตัวนับ"""
+        with self._lock:
+            latencies = {stage: sorted(samples) for stage, samples in self._latencies.items()}
+            counters = dict(self._counters)
+
+        stages = {}
+        for stage, samples in latencies.items():
+            if not samples:
+                continue
+            stages[stage] = {
+                'avg_ms': round(sum(samples) / len(samples) * 1000, 2),
+                'p50_ms': round(samples[len(samples) // 2] * 1000, 2),
+                'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 2),
+                'max_ms': round(samples[-1] * 1000, 2),
+            }
+        return {'stages': stages, 'counters': counters}
+
+
+class _StageTimer:
+    def __init__(self, stats, stage):
+        self.stats = stats
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.record(self.stage, time.perf_counter() - self.started)
+        return False
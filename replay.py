@@ -0,0 +1,323 @@
+"""
+เล่นวิดีโอที่บันทึกไว้ (หรือโฟลเดอร์รูปภาพ) ผ่าน AttendanceSystem.process_frame เพื่อวัดประสิทธิภาพแบบ end-to-end
+โดยไม่ต้องมีกล้องและบัญชี AWS จริง
+
+python replay.py classroom.mp4 --speed 1 --rekognition-latency 0.15 --output run.json
+python replay.py frames/ --fps 10 --labels labels.csv --rekognition-error-rate 0.05
+
+Rekognition, S3 และ DynamoDB เป็น client จำลองจาก aws_stubs ที่หน่วงเวลาและสุ่มข้อผิดพลาดได้ (--seed กำหนดผลสุ่ม)
+ตัวตนของใบหน้าที่ Rekognition จำลองตอบมาจาก:
+  - --labels CSV (start,end,student_id หน่วยวินาทีของวิดีโอ) นอกช่วงเวลาที่กำหนดถือว่าไม่รู้จัก
+  - ชื่อโฟลเดอร์ย่อยของรูป (frames/student_001/0001.jpg)
+  - ถ้าไม่มีทั้งสองอย่าง ทุกใบหน้าคือ --student (ค่าเริ่มต้นคือนักศึกษาคนแรกในรายชื่อ)
+
+ทุกการตัดสินใจที่ขึ้นกับเวลาใช้นาฬิกาของวิดีโอ (เลขเฟรม / fps): รอบการสแกน ตัวจับการเคลื่อนไหว
+และเวลาที่ส่งให้ process_frame(now=...) สำหรับ TTL ของ track/cache, quality gate และช่วงเวลาเช็คชื่อซ้ำ
+ผลการเช็คชื่อจึงเหมือนกันทุกครั้งไม่ว่าจะเล่นที่ความเร็วจริง (--speed 1) หรือเร็วที่สุด (--speed 0)
+ที่ยังใช้เวลาจริงมีเพียงเวลาที่วัด (fps, เวลาแต่ละขั้นตอน) และ match_timeout ที่รอ thread ของการจับคู่
+(ให้ --rekognition-latency ต่ำกว่า match_timeout ใน config.ini เพื่อไม่ให้เกิด timeout แบบสุ่ม)
+
+ใช้ฐานข้อมูลและโฟลเดอร์ข้อมูลชั่วคราว จึงไม่กระทบข้อมูลการเช็คชื่อจริง ผลลัพธ์เป็น JSON
+(fps, เวลาแต่ละขั้นตอน, จำนวนการเรียกระบุตัวต่อการเช็คชื่อ, เวลาจนถึงการเช็คชื่อครั้งแรก) ใช้เทียบระหว่าง commit ได้
+"""
+import argparse
+import csv
+import json
+import logging
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+
+
+def read_labels(path):
+    """อ่าน CSV ช่วงเวลาของแต่ละคน (start,end,student_id) คืนค่ารายการ (start, end, student_id) เรียงตาม start"""
+    with open(path, 'r', encoding='utf-8') as f:
+        labels = [(float(row['start']), float(row['end']), row['student_id'].strip())
+                  for row in csv.DictReader(f) if (row.get('student_id') or '').strip()]
+    return sorted(labels)
+
+
+def read_frames(source, fps=None):
+    """
+    เฟรมจากไฟล์วิดีโอหรือโฟลเดอร์รูปภาพ yield (index, video_time, frame, label)
+    label คือชื่อโฟลเดอร์ย่อยของรูป (None สำหรับวิดีโอหรือรูปที่อยู่ในโฟลเดอร์หลัก)
+    """
+    source = Path(source)
+    if source.is_dir():
+        fps = fps or 10
+        paths = sorted(path for path in source.rglob('*') if path.suffix.lower() in IMAGE_EXTENSIONS)
+        index = 0
+        for path in paths:
+            frame = cv2.imread(str(path))
+            if frame is None:
+                logger.warning(f"อ่านรูป {path} ไม่ได้ ข้าม")
+                continue
+            label = path.parent.name if path.parent != source else None
+            yield index, index / fps, frame, label
+            index += 1
+        return
+
+    cap = cv2.VideoCapture(str(source))
+    if not cap.isOpened():
+        raise ValueError(f"ไม่สามารถเปิดวิดีโอ {source}")
+    fps = fps or cap.get(cv2.CAP_PROP_FPS) or 30
+    index = 0
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield index, index / fps, frame, None
+            index += 1
+    finally:
+        cap.release()
+
+
+class ReplayIdentities:
+    """
+    resolver ของ Rekognition จำลอง: ใบหน้าทุกใบในเฟรมที่กำลังประมวลผลคือ current
+    (process_frame รอผลการจับคู่ทั้งหมดก่อนคืนค่า จึงตั้ง current ก่อนเรียกแต่ละเฟรมได้)
+    """
+
+    def __init__(self, labels=None, default=None):
+        self.labels = labels or []
+        self.default = default
+        self.current = None
+
+    def at(self, video_time, path_label=None):
+        if path_label:
+            return path_label
+        if self.labels:
+            for start, end, student_id in self.labels:
+                if start <= video_time < end:
+                    return student_id
+            return None
+        return self.default
+
+    def appeared_at(self, student_id):
+        """เวลาในวิดีโอที่นักศึกษาปรากฏครั้งแรกตาม labels (None ถ้าไม่ทราบ)"""
+        starts = [start for start, _, label in self.labels if label == student_id]
+        return min(starts) if starts else None
+
+    def __call__(self, img_bytes):
+        return self.current
+
+
+def git_commit():
+    """commit ของโค้ดที่ใช้วัด (None ถ้าไม่ใช่ git repo)"""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent, timeout=5)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def apply_overrides(config, overrides):
+    """--set SECTION.key=value แก้ config ในหน่วยความจำ (ไม่เขียนลง config.ini)"""
+    for override in overrides:
+        name, sep, value = override.partition('=')
+        section, dot, key = name.partition('.')
+        if not sep or not dot:
+            raise ValueError(f"--set ต้องอยู่ในรูป SECTION.key=value: {override}")
+        if not config.has_section(section):
+            config.add_section(section)
+        config[section][key] = value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="เล่นวิดีโอ/รูปที่บันทึกไว้ผ่าน pipeline การสแกนและวัดประสิทธิภาพ")
+    parser.add_argument('source', help="ไฟล์วิดีโอ หรือโฟลเดอร์รูปภาพ (เรียงตามชื่อไฟล์)")
+    parser.add_argument('--speed', type=float, default=0,
+                        help="ความเร็วในการเล่น 1 = ความเร็วจริงของวิดีโอ, 0 = เร็วที่สุด (ค่าเริ่มต้น)")
+    parser.add_argument('--fps', type=float, default=None,
+                        help="fps ของแหล่งภาพ (ค่าเริ่มต้น: fps ของวิดีโอ หรือ 10 สำหรับโฟลเดอร์รูป)")
+    parser.add_argument('--max-frames', type=int, default=None, help="หยุดเมื่อเล่นครบจำนวนเฟรมนี้")
+    parser.add_argument('--labels', help="CSV start,end,student_id ของคนที่อยู่หน้ากล้องในแต่ละช่วงเวลา")
+    parser.add_argument('--student', help="ตัวตนของทุกใบหน้าเมื่อไม่มี labels (ค่าเริ่มต้น: นักศึกษาคนแรกในรายชื่อ)")
+    parser.add_argument('--roster', help="CSV รายชื่อนักศึกษา (id,name,class) ค่าเริ่มต้นคือ students.csv")
+    parser.add_argument('--photos', help="โฟลเดอร์รูปลงทะเบียน <student_id>.jpg ที่ใส่ใน S3 จำลอง (สำหรับ matcher local)")
+    parser.add_argument('--matcher', choices=['collection', 'compare_faces', 'local'], help="แทนค่า matcher ใน config")
+    parser.add_argument('--detector', help="แทนค่า backend ของ [DETECTOR] ใน config")
+    parser.add_argument('--set', dest='overrides', action='append', default=[], metavar='SECTION.key=value',
+                        help="แทนค่าใน config.ini เฉพาะการวัดครั้งนี้ (ใช้ซ้ำได้) เช่น --set TRACKING.enabled=False")
+    parser.add_argument('--rekognition-latency', type=float, default=0.0, help="วินาทีที่ Rekognition จำลองหน่วงต่อการเรียก")
+    parser.add_argument('--rekognition-error-rate', type=float, default=0.0, help="ความน่าจะเป็นที่ Rekognition จำลองล้มเหลว")
+    parser.add_argument('--s3-latency', type=float, default=0.0, help="วินาทีที่ S3 จำลองหน่วงต่อการเรียก")
+    parser.add_argument('--s3-error-rate', type=float, default=0.0, help="ความน่าจะเป็นที่ S3 จำลองล้มเหลว")
+    parser.add_argument('--dynamodb-latency', type=float, default=0.0, help="วินาทีที่ DynamoDB จำลองหน่วงต่อการเรียก")
+    parser.add_argument('--dynamodb-error-rate', type=float, default=0.0, help="ความน่าจะเป็นที่ DynamoDB จำลองล้มเหลว")
+    parser.add_argument('--seed', type=int, default=0, help="seed ของการสุ่มข้อผิดพลาด")
+    parser.add_argument('--output', help="เขียนผลลัพธ์ JSON ลงไฟล์ (ค่าเริ่มต้น: stdout)")
+    parser.add_argument('--log-level', default='WARNING', help="ระดับ log ระหว่างเล่น")
+    args = parser.parse_args()
+
+    # ฐานข้อมูล โฟลเดอร์ข้อมูล และ spool ของ DynamoDB อยู่ในโฟลเดอร์ชั่วคราวที่ลบทิ้งเมื่อเล่นจบ
+    with tempfile.TemporaryDirectory(prefix='replay_') as data_dir:
+        report = replay(args, Path(data_dir))
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + '\n', encoding='utf-8')
+    else:
+        print(output)
+
+
+def replay(args, data_dir):
+    """เล่น args.source ผ่าน AttendanceSystem โดยเก็บข้อมูลทั้งหมดไว้ใน data_dir คืนค่ารายงานผล (dict)"""
+    # face_recognition อ่าน config.ini และตั้งค่า logging ตอน import
+    import face_recognition as kiosk
+    from attendance_store import AttendanceStore
+    from aws_stubs import StubDynamoTable, StubRekognitionClient, StubS3Client
+    from pipeline import PipelineStats
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    config = kiosk.config
+    # config.ini ที่สร้างจากรุ่นก่อนอาจไม่มีบาง section จึงแทนค่าผ่าน apply_overrides ที่เพิ่ม section ให้
+    overrides = list(args.overrides)
+    if args.matcher:
+        overrides.append(f'SETTINGS.matcher={args.matcher}')
+    if args.detector:
+        overrides.append(f'DETECTOR.backend={args.detector}')
+    overrides.append(f"STORE.db_file={data_dir / 'attendance.db'}")
+    apply_overrides(config, overrides)
+    config['CAMERAS'] = {'replay': str(args.source)}
+    kiosk.LOCAL_DATA_DIR = data_dir
+    store = AttendanceStore(config['STORE']['db_file'])
+    store.import_legacy(args.roster or 'students.csv', data_dir=data_dir)
+    store.seed_sample_students()
+
+    labels = read_labels(args.labels) if args.labels else []
+    default_student = args.student or (None if labels else next(iter(store.student_ids()), None))
+    # คนใน labels ต้องอยู่ในรายชื่อจึงจะถูกจับคู่ได้
+    extra = ({label for _, _, label in labels} | {default_student}) - set(store.student_ids()) - {None}
+    store.upsert_students({'id': student_id, 'name': student_id, 'class': ''} for student_id in sorted(extra))
+    store.close()
+    identities = ReplayIdentities(labels, default_student)
+
+    rekognition = StubRekognitionClient(resolver=identities, latency=args.rekognition_latency,
+                                        error_rate=args.rekognition_error_rate, seed=args.seed)
+    s3 = StubS3Client(latency=args.s3_latency, error_rate=args.s3_error_rate, seed=args.seed + 1)
+    dynamo = StubDynamoTable(latency=args.dynamodb_latency, error_rate=args.dynamodb_error_rate, seed=args.seed + 2)
+    if args.photos:
+        for path in sorted(Path(args.photos).iterdir()):
+            if path.suffix.lower() in IMAGE_EXTENSIONS:
+                s3.objects[(config['AWS']['s3_bucket'], f'students/{path.stem}.jpg')] = path.read_bytes()
+    kiosk.s3, kiosk.AWS_CONNECTED = s3, True
+
+    system = kiosk.AttendanceSystem(rekognition_client=rekognition, dynamo_table=dynamo)
+    # เก็บเวลาทุกครั้งของการเล่น (ค่าเริ่มต้นเก็บแค่ 500 ครั้งล่าสุด)
+    system.stats = PipelineStats(window=1_000_000)
+    camera = system.cameras[0]
+    setup_calls = {'rekognition': dict(rekognition.calls), 's3': dict(s3.calls)}
+    rekognition.calls.clear()
+    s3.calls.clear()
+
+    frames = scans = 0
+    video_time = 0.0
+    # นาฬิกาของวิดีโอเริ่มที่วินาทีเต็มของเวลาที่เริ่มเล่น (การเช็คชื่อยังเป็นของวันนี้ และ int(now) ตัดเศษเหมือนกันทุกครั้ง)
+    clock_base = float(int(time.time()))
+    camera.last_scan_time = float('-inf')
+    max_lag = 0.0
+    check_ins = {}
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    try:
+        source = read_frames(args.source, args.fps)
+        while args.max_frames is None or frames < args.max_frames:
+            with system.stats.timer('capture'):
+                item = next(source, None)
+            if item is None:
+                break
+            index, video_time, frame, path_label = item
+            frames += 1
+
+            # เล่นตามเวลาของวิดีโอ (--speed 1) ถ้าประมวลผลช้ากว่าเวลาจริงจะบันทึกความล่าช้าไว้
+            if args.speed > 0:
+                lag = (time.perf_counter() - started) - video_time / args.speed
+                if lag < 0:
+                    time.sleep(-lag)
+                max_lag = max(max_lag, lag)
+
+            if camera.motion_gate is not None:
+                with system.stats.timer('motion'):
+                    camera.motion_gate.update(frame, video_time)
+                camera.current_scan_interval = camera.motion_gate.scan_interval(video_time)
+            if camera.current_scan_interval is None or video_time - camera.last_scan_time < camera.current_scan_interval:
+                continue
+
+            camera.last_scan_time = video_time
+            identities.current = identities.at(video_time, path_label)
+            before = set(system.checked_in_students)
+            with system.stats.timer('scan_total'):
+                system.process_frame(frame, camera, now=clock_base + video_time)
+            camera.record_scan()
+            scans += 1
+            for student_id in set(system.checked_in_students) - before:
+                appeared = identities.appeared_at(student_id)
+                check_ins[student_id] = {
+                    'frame': index,
+                    'video_s': round(video_time, 3),
+                    'wall_s': round(time.perf_counter() - started, 3),
+                    'since_appeared_s': round(video_time - appeared, 3) if appeared is not None else None,
+                }
+    finally:
+        elapsed = time.perf_counter() - started
+        cpu_seconds = time.process_time() - cpu_started
+        system.match_executor.shutdown(wait=True)
+        system.dynamo_writer.stop()
+        system.store.close()
+
+    snapshot = system.stats.snapshot()
+    counters = snapshot['counters']
+    recognition_calls = counters.get('recognition_calls', 0)
+    first = min(check_ins.items(), key=lambda item: item[1]['video_s']) if check_ins else None
+    api_calls = sum(rekognition.calls.values())
+    report = {
+        'source': str(args.source),
+        'git_commit': git_commit(),
+        'speed': args.speed or 'max',
+        'seed': args.seed,
+        'matcher': type(system.matcher).__name__,
+        'detector': system.detector.name,
+        'injected': {
+            'rekognition': {'latency_s': args.rekognition_latency, 'error_rate': args.rekognition_error_rate},
+            's3': {'latency_s': args.s3_latency, 'error_rate': args.s3_error_rate},
+            'dynamodb': {'latency_s': args.dynamodb_latency, 'error_rate': args.dynamodb_error_rate},
+        },
+        'frames': frames,
+        'scans': scans,
+        'video_s': round(video_time, 3),
+        'elapsed_s': round(elapsed, 3),
+        'fps': round(frames / elapsed, 2) if elapsed else None,
+        'scan_fps': round(scans / elapsed, 2) if elapsed else None,
+        'realtime_factor': round(video_time / elapsed, 2) if elapsed else None,
+        'max_lag_s': round(max_lag, 3) if args.speed > 0 else None,
+        'cores_used': round(cpu_seconds / elapsed, 2) if elapsed else None,
+        'stages': snapshot['stages'],
+        'counters': counters,
+        'check_ins': len(check_ins),
+        'recognition_calls': recognition_calls,
+        'recognition_calls_per_check_in': round(recognition_calls / len(check_ins), 2) if check_ins else None,
+        'rekognition_api_calls_per_check_in': round(api_calls / len(check_ins), 2) if check_ins else None,
+        'time_to_first_check_in': dict(first[1], student_id=first[0]) if first else None,
+        'check_in_detail': check_ins,
+        'stub_calls': {'rekognition': dict(rekognition.calls), 's3': dict(s3.calls), 'dynamodb': dict(dynamo.calls)},
+        'setup_calls': setup_calls,
+        'match_cache': system.match_cache.stats() if system.match_cache is not None else None,
+        'motion_gate': camera.motion_gate.stats() if camera.motion_gate is not None else None,
+        'quality_gate': camera.quality_gate.stats() if camera.quality_gate is not None else None,
+        'dynamodb': system.dynamo_writer.stats(),
+    }
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+ติดตามการเปลี่ยนแปลงรายชื่อนักศึกษาในฐานข้อมูล แล้วส่งเฉพาะส่วนที่เปลี่ยน (เพิ่ม/ลบ/ลงทะเบียนรูปใหม่)
+ให้ระบบที่กำลังทำงาน
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RosterWatcher:
+    """
+    ตรวจ roster_version ของ AttendanceStore ทุก interval วินาทีบน thread ของตัวเอง
+
+    เมื่อเวอร์ชันเปลี่ยนจะอ่านรายชื่อพร้อมเวอร์ชันของรูปลงทะเบียนของแต่ละคน (AttendanceStore.enrollment_versions)
+    เทียบกับครั้งก่อน แล้วเรียก on_change(versions, added, removed, changed) โดย changed คือนักศึกษาเดิม
+    ที่ลงทะเบียนรูปใหม่ การอัพเดทที่ใช้เวลานาน (เช่น index ใบหน้าใหม่) จึงไม่ไปหน่วง thread ที่สแกนใบหน้า
+
+    versions คือ {student_id: เวอร์ชันของรูป} ที่ระบบโหลดไว้แล้ว (ค่าเริ่มต้นอ่านจาก store)
+    """
+
+    def __init__(self, store, on_change, interval=2.0, versions=None):
+        self.store = store
+        self.on_change = on_change
+        self.interval = interval
+        self.versions = dict(versions) if versions is not None else store.enrollment_versions()
+        self.version = store.version('roster_version')
+        self.reloads = 0
+        self.last_reload_ms = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='roster-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"ไม่สามารถตรวจสอบการเปลี่ยนแปลงรายชื่อนักศึกษา: {e}")
+
+    def check(self):
+        """ตรวจและใช้การเปลี่ยนแปลงทันที คืนค่า (added, removed, changed) หรือ None ถ้าไม่มีอะไรเปลี่ยน"""
+        # _check_lock ให้ตรวจได้ทีละรอบ ส่วน _lock ป้องกันเฉพาะสถานะที่ stats() อ่าน
+        # on_change (reload matcher ที่อาจใช้เวลานาน) จึงถูกเรียกนอก _lock และไม่หน่วง stats() ของ thread แสดงผล
+        with self._check_lock:
+            # อ่านเวอร์ชันก่อนรายชื่อ: ถ้ามีการเขียนระหว่างนั้น รอบถัดไปจะเห็นเวอร์ชันใหม่อีกครั้ง
+            version = self.store.version('roster_version')
+            with self._lock:
+                if version == self.version:
+                    return None
+                previous = self.versions
+            started = time.perf_counter()
+            versions = self.store.enrollment_versions()
+            added = [student_id for student_id in versions if student_id not in previous]
+            removed = [student_id for student_id in previous if student_id not in versions]
+            changed = [student_id for student_id, photo_version in versions.items()
+                       if student_id in previous and previous[student_id] != photo_version]
+
+            if added or removed or changed:
+                self.on_change(versions, added, removed, changed)
+            reload_ms = round((time.perf_counter() - started) * 1000, 2)
+            with self._lock:
+                self.versions = versions
+                self.version = version
+                self.reloads += 1
+                self.last_reload_ms = reload_ms
+            if added or removed or changed:
+                logger.info(f"อัพเดทรายชื่อนักศึกษา: เพิ่ม {len(added)} คน ลบ {len(removed)} คน "
+                            f"รูปใหม่ {len(changed)} คน ({reload_ms} ms)")
+            return added, removed, changed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self.version,
+                'students': len(self.versions),
+                'reloads': self.reloads,
+                'last_reload_ms': self.last_reload_ms,
+            }
@@ -0,0 +1,124 @@
+"""
+cache รายการรูปนักศึกษาใน S3 และ presigned URL สำหรับหน้าเว็บ
+
+- S3Inventory       : รายการไฟล์ใต้ prefix (อ่านครบทุกหน้าด้วย paginator) เก็บไว้ ttl วินาที
+- PresignedUrlCache : ใช้ URL เดิมซ้ำจนใกล้หมดอายุ แทนการสร้างใหม่ทุกครั้งที่โหลดหน้า
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def student_id_from_key(key, prefix='students/'):
+    """students/student_378.jpg -> student_378 (None ถ้าไม่ใช่รูปนักศึกษา)"""
+    if not key.startswith(prefix + 'student_'):
+        return None
+    return key[len(prefix):].split('/', 1)[0].rsplit('.', 1)[0]
+
+
+class S3Inventory:
+    """
+    รายการรูปนักศึกษาใน bucket {student_id: key} แบบ cache
+
+    ttl=0 คือไม่ cache (อ่านจาก S3 ทุกครั้ง) การอัพโหลด/ลบผ่าน put()/discard() จะแก้ cache ทันที
+    ส่วน invalidate() บังคับให้อ่านใหม่ทั้งหมดในครั้งถัดไป
+    """
+
+    def __init__(self, s3, bucket, prefix='students/', ttl=300.0):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix
+        self.ttl = ttl
+        self.listings = 0
+        self._files = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _list(self):
+        files = {}
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get('Contents', []):
+                student_id = student_id_from_key(obj['Key'], self.prefix)
+                if student_id:
+                    files[student_id] = obj['Key']
+        self.listings += 1
+        return files
+
+    def files(self):
+        """คืนค่า dict {student_id: key} (สำเนา)"""
+        with self._lock:
+            if self._files is None or time.time() - self._loaded_at >= self.ttl:
+                self._files = self._list()
+                self._loaded_at = time.time()
+                logger.debug(f"อ่านรายการไฟล์จาก S3: {len(self._files)} ไฟล์")
+            return dict(self._files)
+
+    def put(self, student_id, key):
+        with self._lock:
+            if self._files is not None:
+                self._files[student_id] = key
+
+    def discard(self, student_id):
+        with self._lock:
+            if self._files is not None:
+                self._files.pop(student_id, None)
+
+    def invalidate(self):
+        with self._lock:
+            self._files = None
+
+
+class PresignedUrlCache:
+    """
+    presigned URL ของ get_object ที่ใช้ซ้ำได้จนเหลือเวลาก่อนหมดอายุน้อยกว่า refresh_margin วินาที
+
+    เก็บไม่เกิน max_entries รายการ (ลบรายการที่ใช้ล่าสุดนานที่สุดออกก่อน)
+    """
+
+    def __init__(self, s3, bucket, expiration=3600, refresh_margin=300, max_entries=10000):
+        self.s3 = s3
+        self.bucket = bucket
+        self.expiration = expiration
+        self.refresh_margin = refresh_margin
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._urls = OrderedDict()  # key -> (url, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._urls.get(key)
+            if entry is not None and entry[1] - now > self.refresh_margin:
+                self._urls.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        url = self.s3.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': key},
+            ExpiresIn=self.expiration
+        )
+        with self._lock:
+            self._urls[key] = (url, now + self.expiration)
+            self._urls.move_to_end(key)
+            while len(self._urls) > self.max_entries:
+                self._urls.popitem(last=False)
+        return url
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._urls.clear()
+            else:
+                self._urls.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._urls), 'hits': self.hits, 'misses': self.misses}
@@ -2,13 +2,31 @@ import boto3
 import os
 import json
 import csv
+import gzip
+import hashlib
+import io
+import math
+import queue
 import logging
+import tempfile
+import threading
+import time
+import zipfile
 from pathlib import Path
 from flask import Flask, request, render_template, redirect, url_for, flash
-from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 import datetime
-from flask import jsonify
+from flask import jsonify, Response, stream_with_context, g, abort
+from botocore.config import Config as BotoConfig
+from attendance_store import AttendanceStore
+from enrollment import BulkEnroller, EnrollmentError, PhotoSource, read_roster
+from face_detector import create_detector
+from face_matcher import FaceEmbedder, configured_embedding_model
+from s3_cache import S3Inventory, PresignedUrlCache
+from change_notifier import ChangeNotifier
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from metrics import CallbackCollector
 
 
 
@@ -33,11 +51,8 @@ app.secret_key = os.getenv('FLASK_SECRET_KEY', 'development-key')
 LOCAL_DATA_DIR = Path('local_data')
 LOCAL_DATA_DIR.mkdir(exist_ok=True)
 
-UPLOAD_FOLDER = 'uploads'
-Path(UPLOAD_FOLDER).mkdir(exist_ok=True)
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload size
 
 # ตั้งค่า AWS
@@ -49,7 +64,9 @@ def get_aws_clients():
             region_name=os.getenv('AWS_REGION_NAME', 'ap-southeast-2')
         )
         
-        s3 = session.client("s3")
+        # connection pool ใช้ร่วมกันระหว่าง request และการอัพโหลดรูปแบบขนานของ /bulk_import
+        s3 = session.client("s3", config=BotoConfig(
+            max_pool_connections=int(os.getenv('S3_MAX_POOL_CONNECTIONS', '32'))))
         return s3, True
     except Exception as e:
         logger.error(f"ไม่สามารถเชื่อมต่อกับ AWS: {e}")
@@ -58,77 +75,272 @@ def get_aws_clients():
 s3_client, aws_connected = get_aws_clients()
 s3_bucket = os.getenv('S3_BUCKET', 'face-recognition-classroom')
 
-def load_attendance_data():
-    """โหลดข้อมูลการเช็คชื่อจากไฟล์ JSON ตามวันที่ปัจจุบัน"""
-    today = datetime.date.today().strftime("%Y%m%d")
-    attendance_file = LOCAL_DATA_DIR / f'attendance_{today}.json'
-    
-    if not attendance_file.exists():
-        with open(attendance_file, 'w', encoding='utf-8') as f:
-            json.dump({}, f, ensure_ascii=False, indent=4)
-        logger.info(f"สร้างไฟล์ข้อมูลการเช็คชื่อใหม่ (JSON) สำหรับวันนี้: {today}")
+# cache รายการไฟล์ใน S3 และ presigned URL (หน้าแรกไม่ต้องเรียก S3 ทุกครั้งที่โหลด)
+PRESIGNED_URL_EXPIRATION = 3600
+
+def init_s3_caches():
+    global s3_inventory, presigned_urls
+    s3_inventory = S3Inventory(s3_client, s3_bucket, ttl=float(os.getenv('S3_INVENTORY_TTL', '300')))
+    presigned_urls = PresignedUrlCache(s3_client, s3_bucket, expiration=PRESIGNED_URL_EXPIRATION,
+                                       refresh_margin=float(os.getenv('PRESIGNED_URL_REFRESH_MARGIN', '300')))
+
+init_s3_caches()
+
+# ฐานข้อมูลนักศึกษาและการเช็คชื่อ (ไฟล์เดียวกับที่โปรแกรมกล้องใช้)
+store = AttendanceStore(os.getenv('ATTENDANCE_DB', str(LOCAL_DATA_DIR / 'attendance.db')))
+try:
+    store.import_legacy('students.csv', data_dir=LOCAL_DATA_DIR)
+except Exception as e:
+    logger.error(f"ไม่สามารถนำเข้าข้อมูลเดิม: {e}")
+
+# ติดตามการเช็คชื่อใหม่แบบ push (SSE / long-poll)
+STREAM_POLL_INTERVAL = 0.5  # วินาทีระหว่างการตรวจ version ในฐานข้อมูล (thread เดียวสำหรับทุก client)
+STREAM_HEARTBEAT = 15       # วินาทีระหว่าง heartbeat เพื่อไม่ให้ proxy ตัดการเชื่อมต่อ
+LONG_POLL_TIMEOUT = 25      # วินาทีสูงสุดที่ long-poll รอการเช็คชื่อใหม่
+# อายุสูงสุดของ SSE หนึ่งการเชื่อมต่อ (วินาที) ครบแล้วปิด stream ให้เบราว์เซอร์เชื่อมต่อใหม่ด้วย cursor ล่าสุด
+# thread ของ client ที่หายไปโดยไม่ปิดการเชื่อมต่อจึงไม่ค้างตลอดไป
+STREAM_MAX_DURATION = float(os.getenv('STREAM_MAX_DURATION', '300'))
+
+def read_change_state():
+    return (store.version('attendance_version'), store.version('attendance_epoch'),
+            store.version('roster_version'), datetime.date.today().strftime("%Y%m%d"))
+
+attendance_notifier = ChangeNotifier(read_change_state, interval=STREAM_POLL_INTERVAL)
+
+@app.teardown_request
+def release_store_connection(exc=None):
+    # request แต่ละครั้งอาจทำงานบน thread ใหม่ ปิด connection ของ thread นั้นเมื่อจบ request
+    store.release()
+
+# metrics สำหรับ Prometheus ที่ /metrics (ปิด endpoint ได้ด้วย METRICS_ENABLED=0)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') != '0'
+REQUEST_SECONDS = Histogram('web_request_seconds', 'เวลาตอบ request แยกตาม route, method และ status (วินาที)',
+                            ['route', 'method', 'status'])
+REQUESTS_IN_PROGRESS = Gauge('web_requests_in_progress', 'จำนวน request ที่กำลังทำงาน')
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    REQUESTS_IN_PROGRESS.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    # ใช้ rule ของ route (เช่น /delete_student/<student_id>) แทน path จริง เพื่อไม่ให้จำนวน label บวมตามรหัสนักศึกษา
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.labels(route, request.method, response.status_code).observe(time.perf_counter() - started)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc=None):
+    if g.pop('request_started', None) is not None:
+        REQUESTS_IN_PROGRESS.dec()
+
+def collect_metrics():
+    """ค่าวัดที่อ่านจากฐานข้อมูลและ cache ตอนถูก scrape"""
+    yield GaugeMetricFamily('web_students', 'จำนวนนักศึกษาในฐานข้อมูล', value=store.count_students())
+    yield GaugeMetricFamily('web_checked_in_students', 'จำนวนนักศึกษาที่เช็คชื่อแล้ววันนี้',
+                            value=len(store.attendance_for_date()))
+    cache = presigned_urls.stats()
+    yield CounterMetricFamily('web_presigned_url_cache_hits_total', 'จำนวน presigned URL ที่ใช้จาก cache',
+                              value=cache['hits'])
+    yield CounterMetricFamily('web_presigned_url_cache_misses_total', 'จำนวน presigned URL ที่สร้างใหม่',
+                              value=cache['misses'])
+    yield GaugeMetricFamily('web_stream_waiting_clients', 'จำนวน client SSE/long-poll ที่กำลังรอการเช็คชื่อใหม่',
+                            value=attendance_notifier.stats()['waiting'])
+    files = GaugeMetricFamily('web_data_file_bytes', 'ขนาดไฟล์ฐานข้อมูลและ WAL journal (byte)', labels=['file'])
+    for name, path in (('db', store.db_file), ('wal', Path(f'{store.db_file}-wal'))):
+        if path.exists():
+            files.add_metric([name], path.stat().st_size)
+    yield files
+
+REGISTRY.register(CallbackCollector(collect_metrics))
+
+@app.route('/metrics')
+def metrics():
+    if not METRICS_ENABLED:
+        abort(404)
+    return Response(generate_latest(REGISTRY), content_type=CONTENT_TYPE_LATEST)
+
+def attendance_state():
+    """สถานะปัจจุบันที่ใช้เริ่มติดตามการเช็คชื่อ (ต้องอ่านก่อนโหลดข้อมูลทั้งหมด เพื่อไม่ให้พลาดรายการที่เกิดระหว่างนั้น)"""
+    return {
+        "cursor": store.latest_event_id(),
+        "epoch": store.version('attendance_epoch'),
+        "roster_version": store.version('roster_version'),
+        "date": datetime.date.today().strftime("%Y%m%d"),
+    }
+
+def poll_attendance_changes(state):
+    """
+    ตรวจการเปลี่ยนแปลงนับจาก state คืนค่า (events, reload) และเลื่อน state ไปข้างหน้า
+    reload เป็น True เมื่อมีการรีเซ็ตการเช็คชื่อ เปลี่ยนรายชื่อ หรือขึ้นวันใหม่ (ต้องโหลดข้อมูลทั้งหมดใหม่)
+    """
+    current = {
+        "epoch": store.version('attendance_epoch'),
+        "roster_version": store.version('roster_version'),
+        "date": datetime.date.today().strftime("%Y%m%d"),
+    }
+    reload = any(state[key] != value for key, value in current.items())
+    state.update(current)
+    events = store.events_since(state["cursor"], date=state["date"])
+    if events:
+        state["cursor"] = events[-1]["event_id"]
+    return events, reload
 
+def load_attendance_data():
+    """โหลดข้อมูลการเช็คชื่อของวันปัจจุบันจากฐานข้อมูล"""
     try:
-        with open(attendance_file, 'r', encoding='utf-8') as f:
-            attendance_data = json.load(f)
-        return attendance_data
-    except FileNotFoundError:
-        return {}
+        return store.attendance_for_date()
     except Exception as e:
         logger.error(f"ไม่สามารถโหลดข้อมูลการเช็คชื่อ: {e}")
         return {}
 
-@app.route('/checked')
-def checked():
-    """แสดงผลหน้าเช็คชื่อและส่งข้อมูลไปให้"""
-    students_file = LOCAL_DATA_DIR / 'students.json'
-    attendance_data = load_attendance_data()
+# cache ข้อมูลรายชื่อและการเช็คชื่อในหน่วยความจำ อ่านใหม่เฉพาะเมื่อ version ในฐานข้อมูลเปลี่ยน
+CACHE_ENABLED = os.getenv('ATTENDANCE_CACHE', '1') != '0'
+GZIP_ENABLED = os.getenv('GZIP_RESPONSES', '1') != '0'
+GZIP_MIN_SIZE = 1024  # byte: response ที่เล็กกว่านี้ไม่คุ้มที่จะบีบอัด
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+def load_snapshot():
+    """
+    รายชื่อและการเช็คชื่อของวันนี้แบบ read-through cache ใช้ key เป็น (roster_version, attendance_version, วันที่)
+    ถ้าไม่มีอะไรเปลี่ยน request จะอ่านฐานข้อมูลแค่ตัวเลข version
+    """
+    global _snapshot
+    # อ่าน version ก่อนข้อมูล: ถ้ามีการเขียนระหว่างนั้น request ถัดไปจะเห็น version ใหม่แล้วโหลดใหม่
+    state = attendance_state()
+    key = (state['roster_version'], store.version('attendance_version'), state['date'])
+    snapshot = _snapshot
+    if CACHE_ENABLED and snapshot is not None and snapshot['key'] == key:
+        return snapshot
+
+    with _snapshot_lock:
+        if CACHE_ENABLED and _snapshot is not None and _snapshot['key'] == key:
+            return _snapshot
+        students = store.list_students()
+        snapshot = {
+            'key': key,
+            'etag': '{}-{}-{}'.format(*key),
+            'students': students,
+            'attendance': load_attendance_data(),
+            'class_name': students[0]['class'] if students else "ไม่พบข้อมูล",
+            'stream': state,
+            'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'bodies': {},  # response ที่ encode แล้ว (และที่บีบอัดแล้ว) ของแต่ละ route
+        }
+        if CACHE_ENABLED:
+            _snapshot = snapshot
+        return snapshot
+
+def snapshot_response(snapshot, name, build_payload):
+    """
+    ส่ง JSON ของ snapshot พร้อม ETag (ตอบ 304 ถ้า If-None-Match ตรง) และบีบอัดด้วย gzip ถ้า client รองรับ
+    body ถูก encode ครั้งเดียวต่อ snapshot แล้วใช้ซ้ำ
+    """
+    if not CACHE_ENABLED:
+        return jsonify(build_payload())
+
+    use_gzip = GZIP_ENABLED and 'gzip' in request.headers.get('Accept-Encoding', '')
+    variant = f"{name}.gz" if use_gzip else name
+    body = snapshot['bodies'].get(variant)
+    if body is None:
+        body = snapshot['bodies'].get(name)
+        if body is None:
+            body = jsonify(build_payload()).get_data()
+            snapshot['bodies'][name] = body
+        if use_gzip:
+            if len(body) >= GZIP_MIN_SIZE:
+                body = gzip.compress(body, compresslevel=6)
+            else:
+                use_gzip = False
+            snapshot['bodies'][variant] = body
 
-    try:
-        if not students_file.exists():
-            logger.warning("ไม่พบไฟล์ students.json")
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                return jsonify({"error": 'ไม่พบข้อมูลนักเรียน', "students": [], "attendance": {}, "aws_connected": aws_connected, "class_name": "10301203"})
-            return render_template('checked.html', students=[], attendance={}, aws_connected=aws_connected, class_name="10301203", error='ไม่พบข้อมูลนักเรียน')
+    response = Response(body, mimetype='application/json')
+    response.set_etag(f"{snapshot['etag']}-{name}" + ("-gz" if use_gzip else ""))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response.make_conditional(request)
 
-        with open(students_file, 'r', encoding='utf-8') as f:
-            students = json.load(f)
+@app.route('/checked')
+def checked():
+    """แสดงผลหน้าเช็คชื่อ (ข้อมูลโหลดทีละหน้าจาก /api/students และอัปเดตจาก /api/attendance/stream)"""
+    return render_template('checked.html')
+
+# แบ่งหน้ารายชื่อนักศึกษา: ?class=<รหัสชั้นเรียน>&status=checked|unchecked&q=<ค้นหา>&page=<หน้า>&per_page=<จำนวน>
+ROSTER_QUERY_ARGS = ('page', 'per_page', 'class', 'status', 'q')
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+def roster_query_args():
+    """อ่านเงื่อนไขการกรองและแบ่งหน้าจาก query string"""
+    status = request.args.get('status')
+    return {
+        'class_id': request.args.get('class') or None,
+        'status': status if status in ('checked', 'unchecked') else None,
+        'search': request.args.get('q') or None,
+        'page': max(1, request.args.get('page', 1, type=int) or 1),
+        'per_page': min(MAX_PER_PAGE, max(1, request.args.get('per_page', DEFAULT_PER_PAGE, type=int) or DEFAULT_PER_PAGE)),
+    }
 
-        # ค้นหา class_name
-        class_name = "ไม่พบข้อมูล"
-        if students and students[0]:
-            class_name = students[0]['class']
+def roster_page(query):
+    """ข้อมูลหนึ่งหน้าของรายชื่อ (query ผ่าน index ในฐานข้อมูล) พร้อมสรุปจำนวนและสถานะสำหรับติดตามการเช็คชื่อ"""
+    # อ่านทั้งหมดจาก snapshot เดียวกัน: การเช็คชื่อหลัง cursor จะไม่ถูกนับซ้ำในตัวเลขสรุปเมื่อหน้าเว็บได้รับจาก stream
+    with store.read_transaction():
+        state = attendance_state()
+        students, total = store.query_students(**query)
+        summary = store.attendance_summary(query['class_id'])
+        classes = store.list_classes()
+    return {
+        "students": students,
+        "attendance": {student['id']: student['checked_in_at'] for student in students if student['checked_in_at']},
+        "page": query['page'],
+        "per_page": query['per_page'],
+        "total": total,
+        "pages": max(1, math.ceil(total / query['per_page'])),
+        "summary": summary,
+        "classes": classes,
+        "stream": state,
+    }
 
-        # ตรวจสอบว่าเป็น AJAX request หรือไม่
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return jsonify({"students": students, "attendance": attendance_data, "aws_connected": aws_connected, "class_name": class_name})
-            
-        return render_template('checked.html', students=students, attendance=attendance_data, aws_connected=aws_connected, class_name=class_name)
-    except FileNotFoundError:
-        logger.error("ไม่พบไฟล์ students.json")
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return jsonify({"error": 'ไม่พบไฟล์ students.json', "students": [], "attendance": {}, "aws_connected": aws_connected, "class_name": "ไม่พบข้อมูล"})
-        return render_template('checked.html', error='ไม่พบไฟล์ students.json')
-    except json.JSONDecodeError as e:
-        logger.error(f"ไม่สามารถถอดรหัส JSON จากไฟล์ students.json: {e}")
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return jsonify({"error": f'ไม่สามารถถอดรหัส JSON จากไฟล์ students.json: {e}', "students": [], "attendance": {}, "aws_connected": aws_connected, "class_name": "ไม่พบข้อมูล"})
-        return render_template('checked.html', error=f'ไม่สามารถถอดรหัส JSON จากไฟล์ students.json: {e}')
-    except Exception as e:
-        logger.error(f"เกิดข้อผิดพลาดขณะดึงข้อมูล: {e}")
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            return jsonify({"error": f'เกิดข้อผิดพลาดขณะดึงข้อมูล: {e}', "students": [], "attendance": {}, "aws_connected": aws_connected, "class_name": "ไม่พบข้อมูล"})
-        return render_template('checked.html', error=f'เกิดข้อผิดพลาดขณะดึงข้อมูล: {e}')
+@app.route('/api/students')
+def api_students():
+    """รายชื่อนักศึกษาและเวลาเช็คชื่อวันนี้ทีละหน้า กรองตามชั้นเรียน สถานะ หรือค้นหารหัส/ชื่อได้"""
+    query = roster_query_args()
+    # ETag จาก version ของข้อมูลและเงื่อนไข: ถ้าไม่มีอะไรเปลี่ยนตอบ 304 โดยไม่ต้อง query รายชื่อ
+    versions = (store.version('roster_version'), store.version('attendance_version'),
+                datetime.date.today().strftime("%Y%m%d"))
+    query_key = hashlib.sha1(json.dumps(query, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    etag = '{}-{}-{}-'.format(*versions) + query_key
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        try:
+            response = jsonify({"success": True, "aws_connected": aws_connected, **roster_page(query)})
+        except Exception as e:
+            logger.error(f"API Error: {e}")
+            return jsonify({"success": False, "error": str(e), "students": [], "total": 0})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/api/attendance')
 def api_attendance():
-    """API สำหรับส่งข้อมูลการเช็คชื่อในรูปแบบ JSON"""
-    students_file = LOCAL_DATA_DIR / 'students.json'
-    attendance_data = load_attendance_data()
-
+    """
+    API สำหรับส่งข้อมูลการเช็คชื่อในรูปแบบ JSON (timestamp คือเวลาที่ข้อมูลชุดนี้ถูกโหลด)
+    ถ้าระบุ page/per_page/class/status/q จะคืนค่าทีละหน้าแบบเดียวกับ /api/students
+    """
+    if any(arg in request.args for arg in ROSTER_QUERY_ARGS):
+        return api_students()
     try:
-        if not students_file.exists():
-            logger.warning("ไม่พบไฟล์ students.json")
+        snapshot = load_snapshot()
+        if not snapshot['students']:
+            logger.warning("ไม่พบข้อมูลนักเรียน")
             return jsonify({
                 "success": False,
                 "error": 'ไม่พบข้อมูลนักเรียน', 
@@ -138,21 +350,13 @@ def api_attendance():
                 "class_name": "10301203"
             })
 
-        with open(students_file, 'r', encoding='utf-8') as f:
-            students = json.load(f)
-
-        # ค้นหา class_name
-        class_name = "ไม่พบข้อมูล"
-        if students and students[0]:
-            class_name = students[0]['class']
-
-        return jsonify({
+        return snapshot_response(snapshot, 'api', lambda: {
             "success": True,
-            "students": students, 
-            "attendance": attendance_data, 
+            "students": snapshot['students'], 
+            "attendance": snapshot['attendance'], 
             "aws_connected": aws_connected, 
-            "class_name": class_name,
-            "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "class_name": snapshot['class_name'],
+            "timestamp": snapshot['timestamp']
         })
             
     except Exception as e:
@@ -166,75 +370,101 @@ def api_attendance():
             "class_name": "ไม่พบข้อมูล"
         })
 
+@app.route('/api/attendance/stream')
+def attendance_stream():
+    """ส่งการเช็คชื่อใหม่แบบ Server-Sent Events (event: checkin) และ event: reload เมื่อต้องโหลดข้อมูลทั้งหมดใหม่"""
+    state = attendance_state()
+    # เชื่อมต่อใหม่หลังหลุด: เบราว์เซอร์ส่ง Last-Event-ID มาเอง
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    if since is not None:
+        try:
+            state["cursor"] = int(since)
+        except ValueError:
+            pass
+    for key in ('epoch', 'roster_version'):
+        if request.args.get(key) is not None:
+            state[key] = request.args.get(key, type=int)
+
+    def generate():
+        started = last_sent = time.time()
+        yield "retry: 3000\n\n"
+        while True:
+            # อ่าน generation ก่อน query: การเช็คชื่อที่เกิดหลังจากนี้จะปลุก wait() เสมอ
+            generation = attendance_notifier.current()
+            events, reload = poll_attendance_changes(state)
+            if reload:
+                yield f"event: reload\ndata: {json.dumps(state)}\n\n"
+                last_sent = time.time()
+            for event in events:
+                yield f"id: {event['event_id']}\nevent: checkin\ndata: {json.dumps(event)}\n\n"
+                last_sent = time.time()
+
+            now = time.time()
+            remaining = started + STREAM_MAX_DURATION - now
+            if remaining <= 0:
+                # ครบอายุ: ส่ง state ล่าสุดให้ client เปิด stream ใหม่ต่อจาก cursor นี้
+                yield f"id: {state['cursor']}\nevent: expire\ndata: {json.dumps(state)}\n\n"
+                return
+            timeout = min(last_sent + STREAM_HEARTBEAT - now, remaining)
+            if attendance_notifier.wait(generation, max(timeout, 0)) == generation \
+                    and time.time() - last_sent >= STREAM_HEARTBEAT:
+                yield ": heartbeat\n\n"
+                last_sent = time.time()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/attendance/events')
+def attendance_events():
+    """
+    long-poll สำหรับ client ที่ใช้ SSE ไม่ได้: ?since=<cursor>&epoch=<epoch>&roster_version=<version>
+    รอจนมีการเช็คชื่อใหม่หรือครบ timeout แล้วคืนค่าเฉพาะรายการใหม่พร้อม cursor ถัดไป
+    """
+    state = attendance_state()
+    for key in ('since', 'epoch', 'roster_version'):
+        if request.args.get(key) is not None:
+            state['cursor' if key == 'since' else key] = request.args.get(key, type=int)
+    timeout = min(request.args.get('timeout', LONG_POLL_TIMEOUT, type=float), LONG_POLL_TIMEOUT)
+
+    deadline = time.time() + timeout
+    while True:
+        generation = attendance_notifier.current()
+        events, reload = poll_attendance_changes(state)
+        remaining = deadline - time.time()
+        if events or reload or remaining <= 0:
+            break
+        attendance_notifier.wait(generation, remaining)
+    return jsonify({"events": events, "reload": reload, **state})
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def load_students_from_file():
-    """โหลดข้อมูลนักศึกษาจากไฟล์ CSV"""
+def import_students_from_csv():
+    """แทนที่รายชื่อนักศึกษาในฐานข้อมูลด้วยข้อมูลจากไฟล์ students.csv (ใช้เมื่อแก้ไข CSV เอง)"""
     students_file = Path('students.csv')
-    
     if not students_file.exists():
-        # สร้างไฟล์ตัวอย่าง
-        with open(students_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['id', 'name', 'class'])
-            writer.writerow(['student_378', 'นายสมศรี มีใจ', '10301203'])
-            writer.writerow(['student_002', 'นางสาวอัศนีย์ ผิวดี', '10301203'])
-            writer.writerow(['student_402', 'นายใจดี มีไหม', '10301203'])
-        logger.info("สร้างไฟล์ข้อมูลนักศึกษาตัวอย่าง (CSV) สำเร็จ")
+        logger.error("ไม่พบไฟล์ students.csv")
+        return False
     
-    # อ่านข้อมูลจากไฟล์
-    students = []
     try:
         with open(students_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                students.append(row)
-        logger.info(f"โหลดข้อมูลนักศึกษาจาก CSV สำเร็จ: {len(students)} คน")
-    except Exception as e:
-        logger.error(f"ไม่สามารถโหลดข้อมูลนักศึกษาจาก CSV: {e}")
-        students = []
-    
-    return students
-
-def update_student_json():
-    """อัพเดทไฟล์ students.json จากข้อมูล CSV"""
-    students = load_students_from_file()
-    json_path = LOCAL_DATA_DIR / 'students.json'
-    
-    try:
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(students, f, ensure_ascii=False, indent=4)
-        logger.info(f"อัพเดทไฟล์ students.json สำเร็จ: {len(students)} รายการ")
+            students = list(csv.DictReader(f))
+        count = store.replace_students(students)
+        logger.info(f"นำเข้าข้อมูลนักศึกษาจาก CSV สำเร็จ: {count} รายการ")
         return True
     except Exception as e:
-        logger.error(f"ไม่สามารถอัพเดทไฟล์ students.json: {e}")
+        logger.error(f"ไม่สามารถนำเข้าข้อมูลนักศึกษาจาก CSV: {e}")
         return False
 
-def save_student_to_csv(student_data):
-    """บันทึกข้อมูลนักศึกษาลงในไฟล์ CSV"""
-    students_file = Path('students.csv')
-    exists = students_file.exists()
-    
+def save_student(student_data):
+    """บันทึกข้อมูลนักศึกษาลงฐานข้อมูล"""
     try:
-        mode = 'a' if exists else 'w'
-        with open(students_file, mode, newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            
-            if not exists:
-                writer.writerow(['id', 'name', 'class'])
-            
-            writer.writerow([
-                student_data['id'],
-                student_data['name'],
-                student_data['class']
-            ])
-        
-        logger.info(f"บันทึกข้อมูลนักศึกษา {student_data['id']} ลงในไฟล์ CSV สำเร็จ")
+        store.add_student(student_data['id'], student_data['name'], student_data['class'])
+        logger.info(f"บันทึกข้อมูลนักศึกษา {student_data['id']} สำเร็จ")
         return True
     except Exception as e:
-        logger.error(f"ไม่สามารถบันทึกข้อมูลนักศึกษาลงในไฟล์ CSV: {e}")
+        logger.error(f"ไม่สามารถบันทึกข้อมูลนักศึกษา: {e}")
         return False
 
 def get_s3_files():
@@ -244,71 +474,44 @@ def get_s3_files():
         return {}
     
     try:
-        response = s3_client.list_objects_v2(Bucket=s3_bucket, Prefix="students/")
-        
-        if 'Contents' not in response:
-            return {}
-        
-        # สร้าง dict โดยใช้ student_id เป็น key
-        files = {}
-        for obj in response['Contents']:
-            file_key = obj['Key']
-            if file_key.startswith('students/student_'):
-                student_id = file_key.split('/')[1].split('.')[0]  # ดึง student_id จากชื่อไฟล์
-                files[student_id] = file_key
-        
-        return files
+        # อ่านครบทุกหน้า (เกิน 1000 ไฟล์ได้) และ cache ไว้ S3_INVENTORY_TTL วินาที
+        return s3_inventory.files()
     except Exception as e:
         logger.error(f"ไม่สามารถดึงรายการไฟล์จาก S3: {e}")
         return {}
 
 def delete_student(student_id):
-    """ลบข้อมูลนักศึกษาจากไฟล์ CSV และรูปภาพจาก S3"""
-    # ลบจาก CSV
-    students_file = Path('students.csv')
-    if not students_file.exists():
-        return False
-    
+    """ลบข้อมูลนักศึกษาจากฐานข้อมูลและรูปภาพจาก S3"""
     try:
-        # อ่านข้อมูลทั้งหมด
-        students = []
-        with open(students_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['id'] != student_id:
-                    students.append(row)
+        if not store.delete_student(student_id):
+            return False
         
-        # เขียนข้อมูลกลับไปยังไฟล์
-        with open(students_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['id', 'name', 'class'])
-            for student in students:
-                writer.writerow([student['id'], student['name'], student['class']])
-        
-        logger.info(f"ลบข้อมูลนักศึกษา {student_id} จากไฟล์ CSV สำเร็จ")
+        logger.info(f"ลบข้อมูลนักศึกษา {student_id} จากฐานข้อมูลสำเร็จ")
         
         # ลบไฟล์จาก S3
         if aws_connected:
-            # ตรวจสอบว่ามีไฟล์นี้ใน S3 หรือไม่
+            # ตรวจสอบว่ามีไฟล์นี้ใน S3 หรือไม่ (อ่านรายการใหม่: process อื่นอาจอัพโหลดรูปหลังจาก cache ถูกอ่านไว้)
+            s3_inventory.invalidate()
             s3_files = get_s3_files()
             if student_id in s3_files:
                 s3_client.delete_object(Bucket=s3_bucket, Key=s3_files[student_id])
+                s3_inventory.discard(student_id)
+                presigned_urls.invalidate(s3_files[student_id])
                 logger.info(f"ลบไฟล์ {s3_files[student_id]} จาก S3 สำเร็จ")
         
-        # อัพเดทไฟล์ JSON
-        update_student_json()
-        
         return True
     except Exception as e:
         logger.error(f"ไม่สามารถลบข้อมูลนักศึกษา: {e}")
         return False
 
-def generate_presigned_url(file_key, expiration=3600):
-    """สร้าง presigned URL สำหรับเข้าถึงไฟล์ใน S3"""
+def generate_presigned_url(file_key, expiration=PRESIGNED_URL_EXPIRATION):
+    """สร้าง presigned URL สำหรับเข้าถึงไฟล์ใน S3 (ใช้ URL เดิมซ้ำจนใกล้หมดอายุ)"""
     if not aws_connected:
         return None
     
     try:
+        if expiration == PRESIGNED_URL_EXPIRATION:
+            return presigned_urls.get(file_key)
         url = s3_client.generate_presigned_url(
             'get_object',
             Params={'Bucket': s3_bucket, 'Key': file_key},
@@ -321,17 +524,38 @@ def generate_presigned_url(file_key, expiration=3600):
 
 @app.route('/')
 def index():
-    students = load_students_from_file()
+    store.seed_sample_students()
+    query = roster_query_args()
+    students, total = store.query_students(**query)
     s3_files = get_s3_files()
     
-    # สร้าง presigned URL สำหรับไฟล์แต่ละไฟล์
+    # สร้าง presigned URL เฉพาะนักศึกษาในหน้านี้
     image_urls = {}
-    for student_id, file_key in s3_files.items():
-        url = generate_presigned_url(file_key)
+    for student in students:
+        file_key = s3_files.get(student['id'])
+        url = generate_presigned_url(file_key) if file_key else None
         if url:
-            image_urls[student_id] = url
+            image_urls[student['id']] = url
     
-    return render_template('index.html', students=students, aws_connected=aws_connected, image_urls=image_urls)
+    pagination = {
+        'page': query['page'],
+        'pages': max(1, math.ceil(total / query['per_page'])),
+        'per_page': query['per_page'],
+        'total': total,
+        'class': query['class_id'] or '',
+        'q': query['search'] or '',
+    }
+    return render_template('index.html', students=students, aws_connected=aws_connected, image_urls=image_urls,
+                           pagination=pagination, classes=store.list_classes())
+
+# ตรวจใบหน้าและคำนวณ embedding ของรูปลงทะเบียน (ใช้ร่วมกันทุก request, detector แยก backend ต่อ thread เอง)
+photo_detector = create_detector('haar', detect_width=640, min_size=40)
+# โมเดลเดียวกับ embedding_model ใน config.ini ของโปรแกรมกล้อง (KIOSK_CONFIG คือไฟล์ config.ini ของโปรแกรมกล้อง)
+photo_embedder = FaceEmbedder(configured_embedding_model(os.getenv('KIOSK_CONFIG', 'config.ini')))
+
+def create_enroller(**options):
+    return BulkEnroller(store, s3_client if aws_connected else None, s3_bucket,
+                        detector=photo_detector, embedder=photo_embedder, **options)
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -353,30 +577,30 @@ def upload_file():
     if not student_id.startswith('student_'):
         student_id = f"student_{student_id}"
     
+    if not store.get_student(student_id):
+        flash(f'ไม่พบนักศึกษา {student_id} กรุณาเพิ่มข้อมูลนักศึกษาก่อนอัพโหลดรูป', 'error')
+        return redirect(url_for('index'))
+    
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        file_ext = filename.rsplit('.', 1)[1].lower()
-        s3_filename = f"{student_id}.{file_ext}"
-        local_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
         try:
-            # บันทึกไฟล์ไว้ในเครื่อง
-            file.save(local_path)
-            
-            # อัพโหลดไฟล์ไปยัง S3
-            if aws_connected:
-                s3_client.upload_file(
-                    local_path, 
-                    s3_bucket, 
-                    f"students/{s3_filename}"
-                )
-                logger.info(f"อัพโหลดไฟล์ {s3_filename} ไปยัง S3 สำเร็จ")
-                flash(f"อัพโหลดไฟล์ {s3_filename} ไปยัง S3 สำเร็จ", 'success')
+            # ประมวลผลในหน่วยความจำ: ตัดใบหน้า ย่อเป็นขนาดมาตรฐาน แล้วอัพโหลดเฉพาะรูปที่ได้ (ไม่เก็บไฟล์ต้นฉบับไว้ในเครื่อง)
+            data = file.read()
+            result = create_enroller().enroll_photo(student_id, data)
+            if result is None:
+                flash(f"รูปของ {student_id} เหมือนรูปเดิม ไม่ต้องอัพโหลดซ้ำ", 'info')
+            elif result['key']:
+                s3_inventory.put(student_id, result['key'])
+                presigned_urls.invalidate(result['key'])
+                logger.info(f"อัพโหลดรูปของ {student_id} ไปยัง S3 สำเร็จ "
+                            f"({len(data) // 1024} KB -> {result['size'] // 1024} KB)")
+                flash(f"อัพโหลดไฟล์ {result['key'].rsplit('/', 1)[-1]} ไปยัง S3 สำเร็จ", 'success')
             else:
                 logger.warning("ไม่สามารถอัพโหลดไปยัง S3 เนื่องจากไม่ได้เชื่อมต่อกับ AWS")
-                flash("บันทึกไฟล์ไว้ในเครื่องเท่านั้น เนื่องจากไม่ได้เชื่อมต่อกับ AWS", 'warning')
+                flash("บันทึกข้อมูลใบหน้าไว้ในเครื่องเท่านั้น เนื่องจากไม่ได้เชื่อมต่อกับ AWS", 'warning')
             
             return redirect(url_for('index'))
+        except EnrollmentError as e:
+            flash(f"ไม่สามารถใช้รูปนี้ได้: {e}", 'error')
         except Exception as e:
             logger.error(f"เกิดข้อผิดพลาดในการอัพโหลดไฟล์: {e}")
             flash(f"เกิดข้อผิดพลาด: {str(e)}", 'error')
@@ -385,6 +609,85 @@ def upload_file():
     
     return redirect(url_for('index'))
 
+# นำเข้ารูปจำนวนมาก: ZIP ใหญ่กว่าขีดจำกัดปกติได้ (werkzeug เก็บไฟล์ใหญ่ไว้ใน temp file ไม่ใช่หน่วยความจำ)
+BULK_IMPORT_MAX_SIZE = int(os.getenv('BULK_IMPORT_MAX_SIZE', str(1024 * 1024 * 1024)))
+BULK_IMPORT_WORKERS = int(os.getenv('BULK_IMPORT_WORKERS', '8'))
+BULK_IMPORT_PROGRESS_INTERVAL = 0.5
+
+@app.route('/bulk_import', methods=['POST'])
+def bulk_import():
+    """
+    นำเข้า ZIP รูปลงทะเบียน (archive) พร้อม CSV รายชื่อ (csv หรือ students.csv ใน ZIP)
+    ตอบกลับเป็น NDJSON: บรรทัด progress ระหว่างประมวลผล และบรรทัด report เมื่อเสร็จ
+    """
+    request.max_content_length = BULK_IMPORT_MAX_SIZE
+    archive = request.files.get('archive')
+    if archive is None or archive.filename == '':
+        return jsonify({"error": "ไม่พบไฟล์ ZIP ในการอัพโหลด"}), 400
+    # ไฟล์ของ request ถูกปิดเมื่อ view คืนค่า จึงคัดลอกลง temp file ที่ thread นำเข้าเป็นผู้ปิดเอง
+    # (ถ้าเกิดข้อผิดพลาดก่อน thread เริ่มทำงาน view ปิดเองใน finally)
+    archive_file = tempfile.TemporaryFile()
+    source = None
+    started = False
+    try:
+        archive.save(archive_file)
+        archive_file.seek(0)
+        try:
+            source = PhotoSource(archive_file)
+        except zipfile.BadZipFile:
+            return jsonify({"error": "ไฟล์ที่อัพโหลดไม่ใช่ ZIP"}), 400
+
+        roster = None
+        roster_file = request.files.get('csv')
+        if roster_file is not None and roster_file.filename:
+            roster = read_roster(io.TextIOWrapper(roster_file.stream, encoding='utf-8-sig', newline=''))
+
+        updates = queue.Queue()
+        last_progress = [0.0]
+
+        def progress(report):
+            now = time.time()
+            if now - last_progress[0] >= BULK_IMPORT_PROGRESS_INTERVAL or report['processed'] == report['total']:
+                last_progress[0] = now
+                updates.put({"type": "progress", **report})
+
+        def run():
+            try:
+                enroller = create_enroller(workers=BULK_IMPORT_WORKERS, progress=progress)
+                report = enroller.run(source, roster)
+                for student_id, key in report.pop('uploaded_keys').items():
+                    s3_inventory.put(student_id, key)
+                    presigned_urls.invalidate(key)
+                updates.put({"type": "report", **report})
+            except Exception as e:
+                logger.error(f"ไม่สามารถนำเข้ารูปลงทะเบียน: {e}")
+                updates.put({"type": "error", "error": str(e)})
+            finally:
+                source.close()
+                archive_file.close()
+                store.release()
+                updates.put(None)
+
+        worker = threading.Thread(target=run, name='bulk-import', daemon=True)
+        worker.start()
+        started = True
+    finally:
+        if not started:
+            if source is not None:
+                source.close()
+            archive_file.close()
+
+    def generate():
+        while True:
+            update = updates.get()
+            if update is None:
+                break
+            yield json.dumps(update, ensure_ascii=False) + "\n"
+        worker.join()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/add_student', methods=['POST'])
 def add_student():
     student_id = request.form.get('student_id', '')
@@ -404,8 +707,7 @@ def add_student():
         'class': student_class
     }
     
-    if save_student_to_csv(student_data):
-        update_student_json()
+    if save_student(student_data):
         flash('เพิ่มข้อมูลนักศึกษาสำเร็จ', 'success')
     else:
         flash('ไม่สามารถบันทึกข้อมูลนักศึกษา', 'error')
@@ -414,10 +716,10 @@ def add_student():
 
 @app.route('/update_json', methods=['POST'])
 def update_json():
-    if update_student_json():
-        flash('อัพเดทไฟล์ students.json สำเร็จ', 'success')
+    if import_students_from_csv():
+        flash('นำเข้าข้อมูลจากไฟล์ students.csv สำเร็จ', 'success')
     else:
-        flash('ไม่สามารถอัพเดทไฟล์ students.json', 'error')
+        flash('ไม่สามารถนำเข้าข้อมูลจากไฟล์ students.csv', 'error')
     
     return redirect(url_for('index'))
 
@@ -537,7 +839,7 @@ if __name__ == '__main__':
                     </div>
                     <div class="card-body">
                         <form action="/update_json" method="POST">
-                            <button type="submit" class="btn btn-warning">อัพเดทไฟล์ students.json</button>
+                            <button type="submit" class="btn btn-warning">นำเข้าจากไฟล์ students.csv</button>
                             <div class="form-text mt-2">ใช้เมื่อมีการแก้ไขไฟล์ students.csv โดยตรง</div>
                         </form>
                     </div>
@@ -599,7 +901,4 @@ if __name__ == '__main__':
 </body>
 </html>""")
     
-    # อัพเดทไฟล์ students.json เมื่อเริ่มต้นแอพ
-    update_student_json()
-    
     app.run(debug=True)
\ No newline at end of file
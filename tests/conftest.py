@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# โมดูลของระบบอยู่ที่ระดับบนสุดของ repository
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
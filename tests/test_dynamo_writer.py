@@ -0,0 +1,96 @@
+import json
+import time
+
+from aws_stubs import StubDynamoTable
+from dynamo_writer import AttendanceWriter
+
+
+def make_item(n):
+    return {'student_id': f'student_{n}', 'date': '2024-01-01', 'time': f'08:00:{n:02d}'}
+
+
+def make_writer(table, spool_file, **kwargs):
+    options = dict(batch_size=2, flush_interval=0.05, max_retries=1, backoff_base=0.01, replay_interval=3600)
+    options.update(kwargs)
+    return AttendanceWriter(table, spool_file, **options)
+
+
+def read_spool(spool_file):
+    with open(spool_file, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_failed_batch_is_spooled(tmp_path):
+    table = StubDynamoTable()
+    table.available = False
+    spool_file = tmp_path / 'spool.jsonl'
+    writer = make_writer(table, spool_file).start()
+    for n in range(3):
+        writer.put(make_item(n))
+    writer.stop()
+
+    assert table.items == []
+    assert read_spool(spool_file) == [make_item(n) for n in range(3)]
+    stats = writer.stats()
+    assert stats['sent'] == 0
+    assert stats['spooled'] == 3
+    assert stats['spool_backlog'] == 3
+    assert stats['failed_batches'] >= 1
+
+
+def test_replay_sends_spool_and_empties_it(tmp_path):
+    table = StubDynamoTable()
+    table.available = False
+    spool_file = tmp_path / 'spool.jsonl'
+    writer = make_writer(table, spool_file)
+    writer._spool([make_item(n) for n in range(5)])
+
+    writer._replay_spool()
+    assert table.items == []
+    assert writer.stats()['spool_backlog'] == 5
+
+    table.available = True
+    writer._replay_spool()
+    assert table.items == [make_item(n) for n in range(5)]
+    assert read_spool(spool_file) == []
+    assert writer.stats()['spool_backlog'] == 0
+    assert writer.stats()['sent'] == 5
+
+
+def test_replay_keeps_unsent_items(tmp_path):
+    table = StubDynamoTable()
+    spool_file = tmp_path / 'spool.jsonl'
+    writer = make_writer(table, spool_file)
+    writer._spool([make_item(n) for n in range(5)])
+
+    # batch แรกส่งได้ batch ที่สองล้มเหลว
+    original_store = table._store
+
+    def store_once(items):
+        table.available = False
+        original_store(items)
+
+    table._store = store_once
+    writer._replay_spool()
+
+    assert table.items == [make_item(0), make_item(1)]
+    assert read_spool(spool_file) == [make_item(n) for n in range(2, 5)]
+    assert writer.stats()['spool_backlog'] == 3
+
+
+def test_spool_backlog_counted_at_startup(tmp_path):
+    spool_file = tmp_path / 'spool.jsonl'
+    spool_file.write_text(''.join(json.dumps(make_item(n)) + '\n' for n in range(4)) + '\n', encoding='utf-8')
+
+    table = StubDynamoTable()
+    writer = make_writer(table, spool_file, replay_interval=0).start()
+    assert writer.stats()['spool_backlog'] == 4
+    writer.put(make_item(9))
+    deadline = time.time() + 5
+    while writer.stats()['spool_backlog'] and time.time() < deadline:
+        time.sleep(0.01)
+    writer.stop()
+
+    assert sorted(item['student_id'] for item in table.items) == sorted(f'student_{n}' for n in (0, 1, 2, 3, 9))
+    assert read_spool(spool_file) == []
+    assert writer.stats()['spool_backlog'] == 0
@@ -0,0 +1,223 @@
+import cv2
+import numpy as np
+import pytest
+
+from attendance_store import AttendanceStore
+from aws_stubs import StubRekognitionClient, StubS3Client
+from enrollment import BulkEnroller
+from face_matcher import (DEFAULT_EMBEDDING_MODEL, CollectionMatcher, FaceEmbedder, LocalEmbeddingMatcher,
+                          configured_embedding_model, decode_embedding, make_photo_loader, short_version)
+from roster_watcher import RosterWatcher
+
+BUCKET = 'test-bucket'
+STUDENT = 'student_1'
+
+
+class CenterDetector:
+    """พบใบหน้าเดียวที่กลางภาพเสมอ"""
+    name = 'center'
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        return [(width // 4, height // 4, width // 2, height // 2)]
+
+
+def make_photo(seed):
+    """รูปทดสอบ 200x200 ที่แต่ละ seed ได้ลวดลายต่างกัน (ลายหยาบพอที่ JPEG ไม่ทำให้ embedding เปลี่ยนมาก)"""
+    pattern = np.random.default_rng(seed).integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    image = cv2.resize(pattern, (200, 200), interpolation=cv2.INTER_NEAREST)
+    return image, cv2.imencode('.png', image)[1].tobytes()
+
+
+def same_photo(photo, image):
+    """รูปที่อัพโหลดผ่าน JPEG แล้ว ต่างจากภาพต้นฉบับเล็กน้อย"""
+    return photo is not None and np.abs(photo.astype(int) - image).mean() < 20
+
+
+def face_of(image):
+    x, y, w, h = CenterDetector().detect(image)[0]
+    return image[y:y + h, x:x + w]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = AttendanceStore(tmp_path / 'attendance.db')
+    store.add_student(STUDENT, 'Test Student', 'c1')
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def s3():
+    return StubS3Client()
+
+
+class OtherModelEmbedder:
+    """embedding จากโมเดลอื่น (เวกเตอร์เดียวกันทุกภาพ)"""
+    name = 'other-model'
+
+    def embed(self, face):
+        return np.ones(1024, dtype=np.float32) / 32
+
+
+def make_enroller(store, s3=None, embedder=None):
+    return BulkEnroller(store, s3=s3, s3_bucket=BUCKET, detector=CenterDetector(),
+                        embedder=embedder or FaceEmbedder(), workers=1)
+
+
+def stored_embeddings(store):
+    def load(model, versions):
+        return {student_id: decode_embedding(vector)
+                for student_id, vector in store.load_embeddings(model, versions).items()}
+    return load
+
+
+def test_photo_saved_without_upload_is_uploaded_later(store, s3):
+    _, data = make_photo(1)
+    result = make_enroller(store).enroll_photo(STUDENT, data)
+    assert result['key'] is None
+    assert store.photo_hashes() == {}
+
+    # รูปเดิมที่เคยบันทึกตอนไม่ได้เชื่อมต่อ S3 ต้องถูกอัพโหลดเมื่อนำเข้าซ้ำ
+    result = make_enroller(store, s3).enroll_photo(STUDENT, data)
+    assert result is not None
+    assert (BUCKET, result['key']) in s3.objects
+    assert store.photo_hashes() == {STUDENT: result['sha256']}
+
+    assert make_enroller(store, s3).enroll_photo(STUDENT, data) is None
+    assert s3.calls['put_object'] == 1
+
+
+def test_reenroll_replaces_local_embedding(store, s3, tmp_path):
+    old_image, old_data = make_photo(1)
+    new_image, new_data = make_photo(2)
+    enroller = make_enroller(store, s3)
+    enroller.enroll_photo(STUDENT, old_data)
+
+    matcher = LocalEmbeddingMatcher(FaceEmbedder(), make_photo_loader(tmp_path / 'faces', s3, BUCKET),
+                                    CenterDetector(), 90.0, tmp_path / 'embeddings.npz')
+    matcher.sync(store.student_ids(), store.enrollment_versions())
+    assert matcher.match(face_of(old_image)) == STUDENT
+    assert matcher.match(face_of(new_image)) is None
+
+    watcher = RosterWatcher(store, lambda versions, added, removed, changed:
+                            matcher.update(added, removed, changed, versions))
+    new_version = enroller.enroll_photo(STUDENT, new_data)['sha256']
+    assert watcher.check() == ([], [], [STUDENT])
+
+    # รูปที่เก็บไว้ในเครื่องเป็นรูปเก่า matcher ต้องดาวน์โหลดรูปใหม่จาก S3
+    assert matcher.match(face_of(new_image)) == STUDENT
+    assert matcher.match(face_of(old_image)) is None
+    assert matcher.versions == {STUDENT: new_version}
+
+
+def test_restart_replaces_embedding_from_old_photo(store, s3, tmp_path):
+    old_image, old_data = make_photo(1)
+    new_image, new_data = make_photo(2)
+    enroller = make_enroller(store, s3)
+    enroller.enroll_photo(STUDENT, old_data)
+
+    def create_matcher():
+        return LocalEmbeddingMatcher(FaceEmbedder(), lambda student_id, refresh=False, version=None: None, CenterDetector(),
+                                     90.0, tmp_path / 'embeddings.npz', stored_embeddings=stored_embeddings(store))
+
+    create_matcher().sync(store.student_ids(), store.enrollment_versions())
+    # ลงทะเบียนรูปใหม่ระหว่างที่ระบบปิดอยู่
+    enroller.enroll_photo(STUDENT, new_data)
+
+    matcher = create_matcher()
+    assert matcher.match(face_of(old_image)) == STUDENT
+    matcher.sync(store.student_ids(), store.enrollment_versions())
+    assert matcher.match(face_of(new_image)) == STUDENT
+    assert matcher.match(face_of(old_image)) is None
+
+
+def test_reenroll_replaces_collection_face(store, s3):
+    _, old_data = make_photo(1)
+    _, new_data = make_photo(2)
+    enroller = make_enroller(store, s3)
+    old_version = enroller.enroll_photo(STUDENT, old_data)['sha256']
+
+    rekognition = StubRekognitionClient(resolver=lambda img_bytes: STUDENT)
+    matcher = CollectionMatcher(rekognition, 'students', BUCKET, 90.0)
+    matcher.ensure_collection()
+    matcher.sync(store.student_ids(), store.enrollment_versions())
+    assert list(rekognition.collections['students'].values()) == [f'{STUDENT}:{short_version(old_version)}']
+
+    watcher = RosterWatcher(store, lambda versions, added, removed, changed:
+                            matcher.update(added, removed, changed, versions))
+    new_version = enroller.enroll_photo(STUDENT, new_data)['sha256']
+    assert watcher.check() == ([], [], [STUDENT])
+
+    # ใบหน้าจากรูปเก่าถูกลบออกจาก collection เหลือเฉพาะใบหน้าจากรูปใหม่
+    faces = rekognition.collections['students']
+    assert list(faces.values()) == [f'{STUDENT}:{short_version(new_version)}']
+    assert matcher.face_ids == {STUDENT: list(faces)}
+    assert matcher.match(face_of(make_photo(2)[0])) == STUDENT
+
+
+def test_restart_replaces_stale_collection_face(store, s3):
+    _, old_data = make_photo(1)
+    _, new_data = make_photo(2)
+    enroller = make_enroller(store, s3)
+    enroller.enroll_photo(STUDENT, old_data)
+
+    rekognition = StubRekognitionClient(resolver=lambda img_bytes: STUDENT)
+    matcher = CollectionMatcher(rekognition, 'students', BUCKET, 90.0)
+    matcher.ensure_collection()
+    matcher.sync(store.student_ids(), store.enrollment_versions())
+    new_version = enroller.enroll_photo(STUDENT, new_data)['sha256']
+
+    matcher = CollectionMatcher(rekognition, 'students', BUCKET, 90.0)
+    matcher.ensure_collection()
+    matcher.sync(store.student_ids(), store.enrollment_versions())
+    assert list(rekognition.collections['students'].values()) == [f'{STUDENT}:{short_version(new_version)}']
+
+
+def test_stored_embedding_tied_to_model_and_photo(store, s3):
+    _, data = make_photo(1)
+    version = make_enroller(store, s3).enroll_photo(STUDENT, data)['sha256']
+    model = FaceEmbedder().name
+    assert list(store.load_embeddings(model, {STUDENT: version})) == [STUDENT]
+    assert store.load_embeddings('other-model', {STUDENT: version}) == {}
+    assert store.load_embeddings(model, {STUDENT: 'f' * 64}) == {}
+
+    # รูปถูกแทนที่โดยไม่มี embedding ใหม่: embedding ที่บันทึกไว้มาจากรูปเก่าจึงไม่ถูกใช้
+    store.enroll([], photos={STUDENT: {'sha256': 'f' * 64, 'key': f'students/{STUDENT}.jpg', 'size': 1}})
+    assert store.load_embeddings(model, store.enrollment_versions()) == {}
+
+
+def test_matcher_recomputes_embedding_from_other_model(store, s3, tmp_path):
+    image, data = make_photo(1)
+    make_enroller(store, s3, embedder=OtherModelEmbedder()).enroll_photo(STUDENT, data)
+
+    matcher = LocalEmbeddingMatcher(FaceEmbedder(), make_photo_loader(tmp_path / 'faces', s3, BUCKET),
+                                    CenterDetector(), 90.0, tmp_path / 'embeddings.npz',
+                                    stored_embeddings=stored_embeddings(store))
+    matcher.sync(store.student_ids(), store.enrollment_versions())
+    assert matcher.match(face_of(image)) == STUDENT
+    assert matcher.match(face_of(make_photo(2)[0])) is None
+
+
+def test_photo_loader_replaces_cached_photo_of_old_version(store, s3, tmp_path):
+    old_image, old_data = make_photo(1)
+    new_image, new_data = make_photo(2)
+    enroller = make_enroller(store, s3)
+    enroller.enroll_photo(STUDENT, old_data)
+    load_photo = make_photo_loader(tmp_path / 'faces', s3, BUCKET)
+    assert same_photo(load_photo(STUDENT), old_image)
+
+    new_version = enroller.enroll_photo(STUDENT, new_data)['sha256']
+    # ไม่ได้เชื่อมต่อ S3: ไม่ใช้รูปเก่าที่เก็บไว้
+    assert make_photo_loader(tmp_path / 'faces')(STUDENT, version=new_version) is None
+    assert same_photo(load_photo(STUDENT, version=new_version), new_image)
+    assert s3.calls['get_object'] == 2
+    assert same_photo(load_photo(STUDENT, version=new_version), new_image)
+    assert s3.calls['get_object'] == 2
+
+
+def test_configured_embedding_model(tmp_path):
+    config_file = tmp_path / 'config.ini'
+    assert configured_embedding_model(config_file) == DEFAULT_EMBEDDING_MODEL
+    config_file.write_text('[SETTINGS]\nembedding_model = models/custom.onnx\n', encoding='utf-8')
+    assert configured_embedding_model(config_file) == 'models/custom.onnx'
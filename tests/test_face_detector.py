@@ -0,0 +1,44 @@
+import numpy as np
+
+import face_detector
+from face_detector import YuNetBackend
+
+
+class FakeYuNet:
+    """แทน cv2.FaceDetectorYN: คืนแถว [x, y, w, h, ...landmarks, score] ที่กำหนด"""
+
+    def __init__(self, boxes):
+        self.faces = np.array([list(box) + [0.0] * 10 + [0.9] for box in boxes], dtype=np.float32)
+
+    def setInputSize(self, size):
+        pass
+
+    def detect(self, image):
+        return 1, self.faces
+
+
+def make_backend(monkeypatch, tmp_path, boxes):
+    model = tmp_path / 'yunet.onnx'
+    model.write_bytes(b'')
+    monkeypatch.setattr(face_detector.cv2, 'FaceDetectorYN', type('FaceDetectorYN', (), {
+        'create': staticmethod(lambda *args: FakeYuNet(boxes))}))
+    return YuNetBackend(model)
+
+
+def test_yunet_boxes_clamped_to_frame(monkeypatch, tmp_path):
+    backend = make_backend(monkeypatch, tmp_path, [
+        (-10, -5, 50, 40),    # เกินมุมซ้ายบน
+        (300, 230, 40, 40),   # เกินมุมขวาล่าง
+        (-60, 10, 50, 50),    # อยู่นอกภาพทั้งหมด
+        (10, 10, 30, 30),
+    ])
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    boxes = backend.detect(frame, 1)
+    assert boxes == [(0, 0, 40, 35), (300, 230, 20, 10), (10, 10, 30, 30)]
+    for x, y, w, h in boxes:
+        assert frame[y:y + h, x:x + w].size > 0
+
+
+def test_yunet_min_size_applies_after_clamping(monkeypatch, tmp_path):
+    backend = make_backend(monkeypatch, tmp_path, [(300, 10, 40, 40), (10, 10, 40, 40)])
+    assert backend.detect(np.zeros((240, 320, 3), dtype=np.uint8), 30) == [(10, 10, 40, 40)]
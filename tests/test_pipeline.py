@@ -0,0 +1,63 @@
+import threading
+
+from pipeline import LatestFrameQueue
+
+
+def drain(frames):
+    items = []
+    while True:
+        item = frames.get(timeout=0)
+        if item is None:
+            return items
+        items.append(item)
+
+
+def test_full_queue_drops_oldest():
+    frames = LatestFrameQueue(maxsize=2)
+    assert frames.put('f1') is False
+    assert frames.put('f2') is False
+    assert frames.put('f3') is True
+    assert drain(frames) == ['f2', 'f3']
+    assert frames.dropped == 1
+    assert frames.total == 3
+
+
+def test_per_key_replaces_frame_of_same_camera_only():
+    frames = LatestFrameQueue(maxsize=3, per_key=1)
+    assert frames.put('cam0-1', key='cam0') is False
+    assert frames.put('cam1-1', key='cam1') is False
+    assert frames.put('cam0-2', key='cam0') is True
+    assert frames.put('cam0-3', key='cam0') is True
+    # กล้องที่ส่งเฟรมถี่กว่าไม่ดันเฟรมของกล้องอื่นออกจากคิว
+    assert drain(frames) == ['cam1-1', 'cam0-3']
+    assert frames.dropped == 2
+
+
+def test_per_key_keeps_latest_frames_per_camera():
+    frames = LatestFrameQueue(maxsize=10, per_key=2)
+    for n in range(4):
+        frames.put(f'cam0-{n}', key='cam0')
+    frames.put('cam1-0', key='cam1')
+    assert drain(frames) == ['cam0-2', 'cam0-3', 'cam1-0']
+    assert frames.dropped == 2
+
+
+def test_per_key_still_bounded_by_maxsize():
+    frames = LatestFrameQueue(maxsize=2, per_key=1)
+    frames.put('cam0-0', key='cam0')
+    frames.put('cam1-0', key='cam1')
+    assert frames.put('cam2-0', key='cam2') is True
+    assert drain(frames) == ['cam1-0', 'cam2-0']
+
+
+def test_close_wakes_waiting_worker():
+    frames = LatestFrameQueue()
+    results = []
+    worker = threading.Thread(target=lambda: results.append(frames.get(timeout=5)))
+    worker.start()
+    frames.close()
+    worker.join(1)
+    assert not worker.is_alive()
+    assert results == [None]
+    assert frames.put('late') is False
+    assert frames.qsize() == 0
@@ -0,0 +1,137 @@
+import pytest
+
+import s3_cache
+from aws_stubs import StubS3Client
+from s3_cache import PresignedUrlCache, S3Inventory, student_id_from_key
+
+BUCKET = 'test-bucket'
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(s3_cache, 'time', clock)
+    return clock
+
+
+def upload(s3, key):
+    s3.put_object(Bucket=BUCKET, Key=key, Body=b'jpeg')
+
+
+def test_student_id_from_key():
+    assert student_id_from_key('students/student_378.jpg') == 'student_378'
+    assert student_id_from_key('students/student_378.png') == 'student_378'
+    assert student_id_from_key('students/readme.txt') is None
+    assert student_id_from_key('other/student_378.jpg') is None
+
+
+def test_inventory_reads_every_page():
+    s3 = StubS3Client()
+    for n in range(1005):
+        upload(s3, f'students/student_{n}.jpg')
+    upload(s3, 'students/readme.txt')
+
+    files = S3Inventory(s3, BUCKET).files()
+    assert len(files) == 1005
+    assert files['student_1004'] == 'students/student_1004.jpg'
+    assert s3.calls['list_objects_v2'] == 2
+
+
+def test_inventory_cached_until_ttl(clock):
+    s3 = StubS3Client()
+    upload(s3, 'students/student_1.jpg')
+    inventory = S3Inventory(s3, BUCKET, ttl=300)
+    assert inventory.files() == {'student_1': 'students/student_1.jpg'}
+
+    # process อื่นอัพโหลดรูประหว่างที่ cache ยังไม่หมดอายุ
+    upload(s3, 'students/student_2.jpg')
+    clock.now += 299
+    assert 'student_2' not in inventory.files()
+    assert inventory.listings == 1
+
+    clock.now += 1
+    assert 'student_2' in inventory.files()
+    assert inventory.listings == 2
+
+
+def test_inventory_invalidate_lists_again(clock):
+    s3 = StubS3Client()
+    inventory = S3Inventory(s3, BUCKET, ttl=300)
+    assert inventory.files() == {}
+    upload(s3, 'students/student_1.jpg')
+
+    inventory.invalidate()
+    assert inventory.files() == {'student_1': 'students/student_1.jpg'}
+    assert inventory.listings == 2
+
+
+def test_inventory_put_and_discard_update_cache(clock):
+    s3 = StubS3Client()
+    upload(s3, 'students/student_1.jpg')
+    inventory = S3Inventory(s3, BUCKET, ttl=300)
+    inventory.files()
+
+    inventory.put('student_2', 'students/student_2.jpg')
+    inventory.discard('student_1')
+    assert inventory.files() == {'student_2': 'students/student_2.jpg'}
+    assert inventory.listings == 1
+
+
+def test_inventory_ttl_zero_always_lists(clock):
+    s3 = StubS3Client()
+    inventory = S3Inventory(s3, BUCKET, ttl=0)
+    inventory.files()
+    inventory.files()
+    assert inventory.listings == 2
+
+
+def test_presigned_url_reused_until_refresh_margin(clock, monkeypatch):
+    s3 = StubS3Client()
+    urls = PresignedUrlCache(s3, BUCKET, expiration=3600, refresh_margin=300)
+    first = urls.get('students/student_1.jpg')
+    # URL จริงมีเวลาหมดอายุต่างกันตามเวลาที่สร้าง ให้ stub คืนค่าที่ต่างกันทุกครั้ง
+    monkeypatch.setattr(s3, 'generate_presigned_url', lambda *args, **kwargs: f'url-{clock.now}')
+
+    clock.now += 3299
+    assert urls.get('students/student_1.jpg') == first
+    clock.now += 1
+    refreshed = urls.get('students/student_1.jpg')
+    assert refreshed != first
+    assert urls.get('students/student_1.jpg') == refreshed
+    assert urls.stats() == {'entries': 1, 'hits': 2, 'misses': 2}
+
+
+def test_presigned_url_invalidate(clock):
+    s3 = StubS3Client()
+    urls = PresignedUrlCache(s3, BUCKET)
+    urls.get('students/student_1.jpg')
+    urls.get('students/student_2.jpg')
+
+    urls.invalidate('students/student_1.jpg')
+    urls.get('students/student_1.jpg')
+    urls.get('students/student_2.jpg')
+    assert s3.calls['generate_presigned_url'] == 3
+
+    urls.invalidate()
+    assert urls.stats()['entries'] == 0
+
+
+def test_presigned_url_evicts_least_recently_used(clock):
+    s3 = StubS3Client()
+    urls = PresignedUrlCache(s3, BUCKET, max_entries=2)
+    urls.get('a')
+    urls.get('b')
+    urls.get('a')
+    urls.get('c')
+    assert urls.stats()['entries'] == 2
+    urls.get('a')
+    urls.get('b')
+    assert s3.calls['generate_presigned_url'] == 4